@@ -67,6 +67,8 @@ echo "   GRANT ALL PRIVILEGES ON ProyectoReservas.* TO 'reservas_app'@'localhost
 echo "   FLUSH PRIVILEGES;"
 echo "5. Ejecuta el script de esquema SQL para crear las tablas:"
 echo "   mysql -u tu_usuario -p tu_base_de_datos < ../$DB_SCHEMA_FILE" # Ruta relativa desde el repo
+echo "   Luego aplica las migraciones pendientes (la app ya no crea tablas al arrancar):"
+echo "   python -m app.database.migrations upgrade"
 echo "6. (Opcional) Si deseas cargar datos de ejemplo:"
 echo "   mysql -u tu_usuario -p tu_base_de_datos < ../$EXAMPLE_DB_FILE" # Ruta relativa desde el repo
 echo "   ¡Recuerda cambiar 'tu_usuario' y 'tu_base_de_datos' por los tuyos (si no usas 'reservas_app')!"
@@ -91,5 +93,5 @@ echo ""
 echo "Configuración inicial completada. Para ejecutar la aplicación:"
 echo "1. Asegúrate de que tu base de datos esté configurada y tu archivo '.env' esté creado."
 echo "2. Activa el entorno virtual: source venv/bin/activate"
-echo "3. Luego, puedes ejecutar la aplicación FastAPI (ej: uvicorn app.main:app --reload)"
+echo "3. Luego, puedes ejecutar la aplicación FastAPI (ej: uvicorn app.main:create_app --factory --reload)"
 echo "4. Para desactivar el entorno virtual: deactivate"
\ No newline at end of file
@@ -0,0 +1,246 @@
+# app/analytics.py
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import calendar
+import logging
+import os
+
+from sqlalchemy import delete, extract, func, insert, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .database.database import async_session_maker
+from .models.models import (
+    Reserva, Escenario, Elemento, ReservaElemento, ResumenMensualEscenario, ResumenMensualElemento,
+)
+
+# --- Configuración ---
+# Cada cuántos segundos se recalculan las tablas de resumen (0 = solo bajo demanda)
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "0"))
+# Meses hacia adelante que cubre el refresco periódico (las reservas son para fechas futuras)
+ANALYTICS_REFRESH_MONTHS_AHEAD = int(os.getenv("ANALYTICS_REFRESH_MONTHS_AHEAD", "12"))
+
+logger = logging.getLogger("app.analytics")
+
+
+# --- Periodos AAAAMM ---
+# Todas las agregaciones se hacen en SQL con GROUP BY: nunca se traen reservas a Python.
+def periodo(d: date) -> int:
+    return d.year * 100 + d.month
+
+def periodo_expr(columna):
+    return extract("year", columna) * 100 + extract("month", columna)
+
+def _etiqueta(p: int) -> str:
+    return f"{p // 100:04d}-{p % 100:02d}"
+
+def _meses(desde: date, hasta: date) -> List[Tuple[int, int]]:
+    """
+    [(periodo, días del mes dentro del rango)] para cada mes que toca [desde, hasta].
+    """
+    meses = []
+    actual = desde.replace(day=1)
+    while actual <= hasta:
+        ultimo = actual.replace(day=calendar.monthrange(actual.year, actual.month)[1])
+        dias = (min(ultimo, hasta) - max(actual, desde)).days + 1
+        meses.append((periodo(actual), dias))
+        actual = ultimo + timedelta(days=1)
+    return meses
+
+def _mes_completo(desde: date, hasta: date) -> Tuple[date, date]:
+    inicio = desde.replace(day=1)
+    fin = hasta.replace(day=calendar.monthrange(hasta.year, hasta.month)[1])
+    return inicio, fin
+
+
+# --- Ocupación por escenario y mes ---
+async def ocupacion_mensual(db: AsyncSession, desde: date, hasta: date, resumen: bool = False) -> List[dict]:
+    if resumen:
+        # Las tablas de resumen guardan meses completos
+        desde, hasta = _mes_completo(desde, hasta)
+        result = await db.execute(
+            select(ResumenMensualEscenario.ID_Escenario, ResumenMensualEscenario.Periodo, ResumenMensualEscenario.Reservas)
+            .where(ResumenMensualEscenario.Periodo.between(periodo(desde), periodo(hasta)))
+        )
+    else:
+        p = periodo_expr(Reserva.Fecha)
+        result = await db.execute(
+            select(Reserva.ID_Escenario, p, func.count())
+            .where(Reserva.Fecha.between(desde, hasta))
+            .group_by(Reserva.ID_Escenario, p)
+        )
+    conteos: Dict[Tuple[int, int], int] = {(row[0], int(row[1])): row[2] for row in result.all()}
+
+    # Escenarios activos (aunque no tengan reservas: su ocupación es 0) y los que tuvieron reservas
+    con_reservas = {escenario_id for escenario_id, _ in conteos}
+    result = await db.execute(
+        select(Escenario.ID_Escenario, Escenario.Direccion)
+        .where((Escenario.Activo == True) | Escenario.ID_Escenario.in_(con_reservas)) # noqa: E712
+        .order_by(Escenario.ID_Escenario)
+    )
+    escenarios = result.all()
+
+    filas = []
+    for escenario_id, direccion in escenarios:
+        for p, dias in _meses(desde, hasta):
+            reservas = conteos.get((escenario_id, p), 0)
+            filas.append({
+                "ID_Escenario": escenario_id,
+                "Direccion": direccion,
+                "periodo": _etiqueta(p),
+                "reservas": reservas,
+                "dias": dias,
+                "tasa_ocupacion": round(reservas / dias, 4),
+            })
+    return filas
+
+
+# --- Ingresos por escenario ---
+async def ingresos_por_escenario(db: AsyncSession, desde: date, hasta: date, resumen: bool = False) -> List[dict]:
+    if resumen:
+        desde, hasta = _mes_completo(desde, hasta)
+        agregado = (
+            select(
+                ResumenMensualEscenario.ID_Escenario.label("ID_Escenario"),
+                func.sum(ResumenMensualEscenario.Reservas).label("reservas"),
+                func.sum(ResumenMensualEscenario.Ingresos).label("ingresos"),
+            )
+            .where(ResumenMensualEscenario.Periodo.between(periodo(desde), periodo(hasta)))
+            .group_by(ResumenMensualEscenario.ID_Escenario)
+        )
+    else:
+        # Precio_Total está persistido en cada reserva: basta con sumarlo
+        agregado = (
+            select(
+                Reserva.ID_Escenario.label("ID_Escenario"),
+                func.count().label("reservas"),
+                func.coalesce(func.sum(Reserva.Precio_Total), 0).label("ingresos"),
+            )
+            .where(Reserva.Fecha.between(desde, hasta))
+            .group_by(Reserva.ID_Escenario)
+        )
+    agregado = agregado.subquery()
+    result = await db.execute(
+        select(Escenario.ID_Escenario, Escenario.Direccion, agregado.c.reservas, agregado.c.ingresos)
+        .join(agregado, agregado.c.ID_Escenario == Escenario.ID_Escenario)
+        .order_by(agregado.c.ingresos.desc(), Escenario.ID_Escenario)
+    )
+    return [
+        {"ID_Escenario": row[0], "Direccion": row[1], "reservas": int(row[2]), "ingresos": int(row[3] or 0)}
+        for row in result.all()
+    ]
+
+
+# --- Ingresos y cantidades por elemento (top N) ---
+async def ingresos_por_elemento(
+    db: AsyncSession,
+    desde: date,
+    hasta: date,
+    resumen: bool = False,
+    orden: str = "ingresos",
+    top: Optional[int] = None,
+) -> List[dict]:
+    if resumen:
+        desde, hasta = _mes_completo(desde, hasta)
+        agregado = (
+            select(
+                ResumenMensualElemento.Codigo_Elemento.label("Codigo"),
+                func.sum(ResumenMensualElemento.Reservas).label("reservas"),
+                func.sum(ResumenMensualElemento.Cantidad).label("cantidad"),
+                func.sum(ResumenMensualElemento.Ingresos).label("ingresos"),
+            )
+            .where(ResumenMensualElemento.Periodo.between(periodo(desde), periodo(hasta)))
+            .group_by(ResumenMensualElemento.Codigo_Elemento)
+        )
+    else:
+        agregado = (
+            select(
+                ReservaElemento.Codigo_Elemento.label("Codigo"),
+                func.count().label("reservas"), # La PK (ID_Reserva, Codigo_Elemento) hace que cada fila sea una reserva distinta
+                func.sum(ReservaElemento.Cantidad).label("cantidad"),
+                func.sum(ReservaElemento.Cantidad * Elemento.Precio).label("ingresos"),
+            )
+            .join(Reserva, Reserva.ID_Reserva == ReservaElemento.ID_Reserva)
+            .join(Elemento, Elemento.Codigo == ReservaElemento.Codigo_Elemento)
+            .where(Reserva.Fecha.between(desde, hasta))
+            .group_by(ReservaElemento.Codigo_Elemento)
+        )
+    agregado = agregado.subquery()
+    columna_orden = agregado.c.cantidad if orden == "cantidad" else agregado.c.ingresos
+    stmt = (
+        select(Elemento.Codigo, Elemento.Nombre, agregado.c.reservas, agregado.c.cantidad, agregado.c.ingresos)
+        .join(agregado, agregado.c.Codigo == Elemento.Codigo)
+        .order_by(columna_orden.desc(), Elemento.Codigo)
+    )
+    if top:
+        stmt = stmt.limit(top)
+    result = await db.execute(stmt)
+    return [
+        {"Codigo": row[0], "Nombre": row[1], "reservas": int(row[2]), "cantidad": int(row[3] or 0), "ingresos": int(row[4] or 0)}
+        for row in result.all()
+    ]
+
+
+# --- Tablas de resumen: recálculo por meses completos ---
+async def refrescar_resumenes(db: AsyncSession, desde: date, hasta: date) -> dict:
+    """
+    Recalcula en SQL (DELETE + INSERT ... SELECT con GROUP BY) los resúmenes de los meses
+    que tocan [desde, hasta], en una sola transacción.
+    """
+    desde, hasta = _mes_completo(desde, hasta)
+    p_desde, p_hasta = periodo(desde), periodo(hasta)
+    ahora = datetime.utcnow()
+
+    await db.execute(delete(ResumenMensualEscenario).where(ResumenMensualEscenario.Periodo.between(p_desde, p_hasta)))
+    await db.execute(delete(ResumenMensualElemento).where(ResumenMensualElemento.Periodo.between(p_desde, p_hasta)))
+
+    p = periodo_expr(Reserva.Fecha)
+    escenarios = await db.execute(
+        insert(ResumenMensualEscenario).from_select(
+            ["ID_Escenario", "Periodo", "Reservas", "Ingresos", "Actualizado"],
+            select(Reserva.ID_Escenario, p, func.count(), func.coalesce(func.sum(Reserva.Precio_Total), 0), literal(ahora))
+            .where(Reserva.Fecha.between(desde, hasta))
+            .group_by(Reserva.ID_Escenario, p),
+        )
+    )
+    elementos = await db.execute(
+        insert(ResumenMensualElemento).from_select(
+            ["Codigo_Elemento", "Periodo", "Reservas", "Cantidad", "Ingresos", "Actualizado"],
+            select(
+                ReservaElemento.Codigo_Elemento, p, func.count(), func.sum(ReservaElemento.Cantidad),
+                func.sum(ReservaElemento.Cantidad * Elemento.Precio), literal(ahora),
+            )
+            .join(Reserva, Reserva.ID_Reserva == ReservaElemento.ID_Reserva)
+            .join(Elemento, Elemento.Codigo == ReservaElemento.Codigo_Elemento)
+            .where(Reserva.Fecha.between(desde, hasta))
+            .group_by(ReservaElemento.Codigo_Elemento, p),
+        )
+    )
+    await db.commit()
+    return {
+        "desde": desde,
+        "hasta": hasta,
+        "filas_escenarios": escenarios.rowcount,
+        "filas_elementos": elementos.rowcount,
+    }
+
+
+async def refrescar_periodicamente(intervalo: float = ANALYTICS_REFRESH_SECONDS) -> None:
+    """
+    Tarea de fondo: recalcula desde el mes anterior hasta ANALYTICS_REFRESH_MONTHS_AHEAD
+    meses adelante cada `intervalo` segundos. Los errores se registran y no detienen el ciclo.
+    """
+    while True:
+        try:
+            hoy = date.today()
+            desde = (hoy.replace(day=1) - timedelta(days=1)).replace(day=1)
+            hasta = hoy.replace(day=1) + timedelta(days=31 * ANALYTICS_REFRESH_MONTHS_AHEAD)
+            async with async_session_maker() as db:
+                await refrescar_resumenes(db, desde, hasta)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Error refrescando las tablas de resumen de analíticas")
+        await asyncio.sleep(intervalo)
@@ -0,0 +1,251 @@
+# app/audit.py
+
+from datetime import date, datetime
+from typing import List, Optional
+import asyncio
+import json
+import logging
+import os
+
+from sqlalchemy import delete, event, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .database.database import get_engine
+from .metrics import metrics_registry
+from .models.models import AuditoriaOutbox, AuditoriaReserva
+
+logger = logging.getLogger("app.audit")
+
+# --- Configuración de la auditoría ---
+# Antes la escribían los triggers de sqldb.sql dentro de cada transacción de Reservas. Ahora los
+# routers escriben el evento en Auditoria_Outbox dentro de la misma transacción que el cambio
+# (o se guardan los dos o ninguno) y una tarea de fondo lo traslada a AuditoriaReservas en
+# lotes (INSERT ... SELECT). AUDIT_MODE: "async" (por defecto) u "off".
+AUDIT_MODE = os.getenv("AUDIT_MODE", "async").strip().lower()
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500")) # Filas por traslado
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "1")) # Espera máxima antes de trasladar un lote incompleto
+AUDIT_OUTBOX_RELAY_SECONDS = float(os.getenv("AUDIT_OUTBOX_RELAY_SECONDS", "60")) # Revisión del outbox (otros workers)
+
+_COLUMNAS = ["ID_Reserva", "Accion", "Usuario", "Fecha", "Datos_anteriores", "Entidad", "Referencia", "Datos_nuevos"]
+_PENDIENTES = "auditoria_pendientes" # Clave en Session.info: eventos escritos en la transacción en curso
+
+
+def _json(datos: Optional[dict]) -> Optional[str]:
+    if datos is None:
+        return None
+    return json.dumps(datos, default=lambda v: v.isoformat() if isinstance(v, (date, datetime)) else str(v), ensure_ascii=False)
+
+
+class AuditPipeline:
+    """
+    Outbox transaccional + tarea de fondo que lo traslada a AuditoriaReservas en lotes.
+    registrar() inserta el evento en Auditoria_Outbox con la sesión del llamador: se guarda
+    con el commit del cambio y desaparece con su rollback, así que una caída del proceso
+    no pierde eventos (quedan en el outbox hasta el siguiente traslado). El commit solo
+    despierta a la tarea de fondo; en memoria no se guarda ningún evento.
+    """
+    def __init__(
+        self,
+        enabled: bool = AUDIT_MODE != "off",
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_seconds: float = AUDIT_FLUSH_SECONDS,
+        relay_seconds: float = AUDIT_OUTBOX_RELAY_SECONDS,
+    ):
+        self._enabled = enabled
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.relay_seconds = relay_seconds
+        self._aviso: Optional[asyncio.Event] = None # Un commit dejó eventos en el outbox
+        self._lote_lleno: Optional[asyncio.Event] = None # Ya hay batch_size eventos sin trasladar
+        self._tarea: Optional[asyncio.Task] = None
+        self._cerrando = False
+        self.pendientes = 0 # Eventos confirmados por este proceso y aún no trasladados (aproximado)
+        self.registrados = 0
+        self.trasladados = 0
+        self.lotes = 0
+        self.errores = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    # --- Productores (routers): dentro de la transacción, antes del commit ---
+    def evento(
+        self,
+        accion: str,
+        usuario: Optional[str],
+        id_reserva: Optional[int] = None,
+        entidad: str = "Reserva",
+        referencia: Optional[str] = None,
+        antes: Optional[dict] = None,
+        despues: Optional[dict] = None,
+    ) -> dict:
+        return {
+            "ID_Reserva": id_reserva,
+            "Accion": accion,
+            "Usuario": usuario,
+            "Fecha": datetime.utcnow(),
+            "Datos_anteriores": _json(antes),
+            "Entidad": entidad,
+            "Referencia": referencia,
+            "Datos_nuevos": _json(despues),
+        }
+
+    async def registrar(
+        self,
+        db: AsyncSession,
+        accion: str,
+        usuario: Optional[str],
+        id_reserva: Optional[int] = None,
+        entidad: str = "Reserva",
+        referencia: Optional[str] = None,
+        antes: Optional[dict] = None,
+        despues: Optional[dict] = None,
+    ) -> None:
+        """
+        Escribe un evento en el outbox con la sesión del llamador, que hace el commit después:
+        un cambio revertido no deja auditoría y uno confirmado siempre la deja.
+        """
+        await self.registrar_lote(db, [self.evento(accion, usuario, id_reserva, entidad, referencia, antes, despues)])
+
+    async def registrar_lote(self, db: AsyncSession, eventos: List[dict]) -> None:
+        if not self._enabled or not eventos:
+            return
+        await db.execute(insert(AuditoriaOutbox), eventos)
+        sesion = db.sync_session
+        if _PENDIENTES not in sesion.info:
+            # Una vez por sesión: el commit avisa a la tarea de fondo, el rollback descarta la cuenta
+            event.listen(sesion, "after_commit", self._tras_commit)
+            event.listen(sesion, "after_rollback", self._tras_rollback)
+            sesion.info[_PENDIENTES] = 0
+        sesion.info[_PENDIENTES] += len(eventos)
+
+    def _tras_commit(self, sesion) -> None:
+        confirmados = sesion.info.get(_PENDIENTES, 0)
+        if not confirmados:
+            return
+        sesion.info[_PENDIENTES] = 0
+        self.registrados += confirmados
+        self.pendientes += confirmados
+        if self._aviso is not None: # Sin tarea de fondo (scripts) los traslada el próximo proceso
+            self._aviso.set()
+            if self.pendientes >= self.batch_size:
+                self._lote_lleno.set()
+
+    def _tras_rollback(self, sesion) -> None:
+        sesion.info[_PENDIENTES] = 0
+
+    # --- Traslado del outbox a AuditoriaReservas ---
+    async def _trasladar_outbox(self) -> int:
+        """
+        Mueve un lote del outbox a AuditoriaReservas (INSERT ... SELECT y DELETE en una
+        transacción). SKIP LOCKED evita que dos workers trasladen las mismas filas.
+        """
+        async with get_engine().begin() as conn:
+            ids = (await conn.execute(
+                select(AuditoriaOutbox.ID_Outbox)
+                .order_by(AuditoriaOutbox.ID_Outbox)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not ids:
+                return 0
+            await conn.execute(
+                insert(AuditoriaReserva).from_select(
+                    _COLUMNAS,
+                    select(*[getattr(AuditoriaOutbox, c) for c in _COLUMNAS]).where(AuditoriaOutbox.ID_Outbox.in_(ids)),
+                )
+            )
+            await conn.execute(delete(AuditoriaOutbox).where(AuditoriaOutbox.ID_Outbox.in_(ids)))
+        self.trasladados += len(ids)
+        self.lotes += 1
+        return len(ids)
+
+    async def trasladar(self) -> int:
+        """
+        Vacía el outbox en lotes de batch_size. Devuelve los eventos trasladados; si la base
+        falla, los que queden se reintentan en el próximo ciclo (siguen en el outbox).
+        """
+        total = 0
+        try:
+            while True:
+                movidos = await self._trasladar_outbox()
+                total += movidos
+                if movidos < self.batch_size:
+                    break
+            self.pendientes = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.errores += 1
+            logger.exception("Error trasladando el outbox de auditoría")
+        return total
+
+    # --- Tarea de fondo ---
+    async def _esperar(self, evento: asyncio.Event, segundos: float) -> None:
+        try:
+            await asyncio.wait_for(evento.wait(), timeout=segundos)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _ciclo(self) -> None:
+        while not self._cerrando:
+            # Sin commits, revisa cada relay_seconds (eventos de otros workers o de un proceso caído)
+            await self._esperar(self._aviso, self.relay_seconds)
+            if not self._cerrando and self.pendientes < self.batch_size:
+                await self._esperar(self._lote_lleno, self.flush_seconds) # Junta los commits cercanos en un lote
+            self._aviso.clear()
+            self._lote_lleno.clear()
+            await self.trasladar()
+
+    def iniciar(self) -> None:
+        if self._enabled and self._tarea is None:
+            # Los eventos se crean dentro del event loop que los usa (uno nuevo en cada arranque)
+            self._aviso = asyncio.Event()
+            self._lote_lleno = asyncio.Event()
+            self._aviso.set() # Al arrancar puede haber eventos de un proceso anterior
+            self._cerrando = False
+            self._tarea = asyncio.create_task(self._ciclo())
+
+    async def detener(self) -> None:
+        """
+        Cierre ordenado: detiene la tarea y hace un último traslado. Lo que no se pueda
+        trasladar sigue en el outbox para el próximo arranque.
+        """
+        if self._tarea is None:
+            return
+        # Sin cancel(): el lote que se esté trasladando termina antes de salir del ciclo
+        self._cerrando = True
+        self._aviso.set()
+        self._lote_lleno.set()
+        await self._tarea
+        self._tarea = None
+        await self.trasladar()
+        self._aviso = None
+        self._lote_lleno = None
+
+    def snapshot(self) -> dict:
+        return {
+            "modo": AUDIT_MODE if self._enabled else "off",
+            "tam_lote": self.batch_size,
+            "registrados": self.registrados,
+            "pendientes": self.pendientes,
+            "trasladados": self.trasladados,
+            "lotes": self.lotes,
+            "errores_traslado": self.errores,
+        }
+
+
+auditoria = AuditPipeline()
+
+
+def _audit_metrics():
+    return [
+        ("audit_events_recorded_total", "Eventos de auditoría confirmados en el outbox.", "counter", auditoria.registrados),
+        ("audit_events_written_total", "Eventos de auditoría trasladados a AuditoriaReservas.", "counter", auditoria.trasladados),
+        ("audit_relay_errors_total", "Traslados del outbox fallidos (se reintentan).", "counter", auditoria.errores),
+        ("audit_outbox_pending", "Eventos confirmados por este proceso y aún no trasladados.", "gauge", auditoria.pendientes),
+    ]
+
+metrics_registry.register_collector(_audit_metrics)
@@ -0,0 +1,368 @@
+# app/bulk.py
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+import codecs
+import csv
+import json
+import os
+
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+from sqlalchemy import insert, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from . import schemas
+from .audit import auditoria
+from .inventory import reservado_por_fecha, reservar_inventario
+from .models.models import Reserva, Escenario, Elemento, ReservaElemento
+
+# --- Configuración de la carga masiva ---
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "20000"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500")) # Filas por transacción
+
+
+# --- Lectura del cuerpo: JSON (arreglo), NDJSON o CSV, leído en streaming ---
+async def _lineas(request: Request) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")() # Tolera BOM y caracteres partidos entre chunks
+    pendiente = ""
+    async for chunk in request.stream():
+        pendiente += decoder.decode(chunk)
+        *lineas, pendiente = pendiente.split("\n")
+        for linea in lineas:
+            yield linea.rstrip("\r")
+    pendiente += decoder.decode(b"", final=True)
+    if pendiente:
+        yield pendiente.rstrip("\r")
+
+def _parse_elementos_csv(valor: str) -> List[dict]:
+    # Formato de la columna Elementos: "codigo:cantidad;codigo:cantidad"
+    elementos = []
+    for parte in (valor or "").split(";"):
+        parte = parte.strip()
+        if not parte:
+            continue
+        codigo, _, cantidad = parte.partition(":")
+        elementos.append({"Codigo_Elemento": codigo.strip(), "Cantidad": (cantidad or "1").strip()})
+    return elementos
+
+async def leer_filas(request: Request) -> List[object]:
+    """
+    Devuelve una lista de dicts (una por fila) o de mensajes de error (str) para las filas ilegibles.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    filas: List[object] = []
+
+    def _agregar(fila: object):
+        if len(filas) >= BULK_MAX_ROWS:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Máximo {BULK_MAX_ROWS} filas por carga.")
+        filas.append(fila)
+
+    if content_type in ("text/csv", "application/csv"):
+        cabecera: Optional[List[str]] = None
+        async for linea in _lineas(request):
+            if not linea.strip():
+                continue
+            valores = next(csv.reader([linea]))
+            if cabecera is None:
+                cabecera = [c.strip() for c in valores]
+                continue
+            registro = dict(zip(cabecera, valores))
+            _agregar({
+                "Fecha": registro.get("Fecha"),
+                "ID_Escenario": registro.get("ID_Escenario"),
+                "elementos_seleccionados": _parse_elementos_csv(registro.get("Elementos", "")),
+            })
+    elif content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        async for linea in _lineas(request):
+            if not linea.strip():
+                continue
+            try:
+                _agregar(json.loads(linea))
+            except json.JSONDecodeError as e:
+                _agregar(f"JSON inválido: {e.msg}")
+    else:
+        try:
+            datos = json.loads(await request.body())
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"JSON inválido: {e.msg}")
+        if not isinstance(datos, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Se esperaba un arreglo JSON de reservas.")
+        for fila in datos:
+            _agregar(fila)
+
+    return filas
+
+
+# --- Planificación: validación contra conjuntos pre-cargados ---
+@dataclass
+class FilaPlan:
+    fila: int
+    reserva: schemas.ReservaCreate
+    cantidades: Dict[int, int]
+
+def _validar(filas: List[object]) -> Tuple[List[FilaPlan], Dict[int, schemas.ResultadoFilaBulk]]:
+    validas, errores = [], {}
+    for i, fila in enumerate(filas, start=1):
+        if isinstance(fila, str):
+            errores[i] = schemas.ResultadoFilaBulk(fila=i, ok=False, error=fila)
+            continue
+        try:
+            reserva = schemas.ReservaCreate.model_validate(fila)
+        except ValidationError as e:
+            primero = e.errors()[0]
+            campo = ".".join(str(p) for p in primero["loc"])
+            errores[i] = schemas.ResultadoFilaBulk(fila=i, ok=False, error=f"{campo}: {primero['msg']}")
+            continue
+        cantidades: Dict[int, int] = {}
+        for elem in reserva.elementos_seleccionados or []:
+            cantidades[elem.Codigo_Elemento] = cantidades.get(elem.Codigo_Elemento, 0) + elem.Cantidad
+        validas.append(FilaPlan(fila=i, reserva=reserva, cantidades=dict(sorted(cantidades.items()))))
+    return validas, errores
+
+async def _precargar(db: AsyncSession, plan: List[FilaPlan]):
+    escenario_ids = {p.reserva.ID_Escenario for p in plan}
+    codigos = {codigo for p in plan for codigo in p.cantidades}
+    fechas = [p.reserva.Fecha for p in plan]
+
+    escenarios: Dict[int, Tuple[str, int]] = {}
+    elementos: Dict[int, Tuple[str, int, int]] = {} # Codigo -> (Nombre, Stock, Precio)
+    ocupadas: Set[Tuple[int, date]] = set()
+    reservado: Dict[Tuple[int, date], int] = {} # (Codigo, Fecha) -> unidades ya reservadas ese día
+    if not plan:
+        return escenarios, elementos, ocupadas, reservado
+
+    result = await db.execute(
+        select(Escenario.ID_Escenario, Escenario.Direccion, Escenario.Precio).where(Escenario.ID_Escenario.in_(escenario_ids))
+    )
+    escenarios = {row[0]: (row[1], row[2]) for row in result.all()}
+
+    if codigos:
+        result = await db.execute(select(Elemento.Codigo, Elemento.Nombre, Elemento.Stock, Elemento.Precio).where(Elemento.Codigo.in_(codigos)))
+        elementos = {row[0]: (row[1], row[2], row[3]) for row in result.all()}
+        reservado = await reservado_por_fecha(db, elementos, fechas)
+
+    result = await db.execute(
+        select(Reserva.ID_Escenario, Reserva.Fecha).where(
+            Reserva.ID_Escenario.in_(escenario_ids),
+            Reserva.Fecha.between(min(fechas), max(fechas)),
+        )
+    )
+    ocupadas = {(row[0], row[1]) for row in result.all()}
+    return escenarios, elementos, ocupadas, reservado
+
+
+# --- Inserción por bloques ---
+class ConflictoStock(Exception):
+    """
+    Otro proceso reservó los elementos de alguna fecha entre la pre-carga y la inserción del bloque.
+    """
+
+async def _insertar_bloque(
+    db: AsyncSession, bloque: List[FilaPlan], escenarios, elementos, correo: str, datos_auditoria: Callable[[FilaPlan], dict]
+) -> Dict[Tuple[int, date], int]:
+    ahora = datetime.utcnow()
+    await db.execute(insert(Reserva), [
+        {
+            "Correo_Usuario": correo,
+            "Lugar": escenarios[p.reserva.ID_Escenario][0],
+            "Precio": escenarios[p.reserva.ID_Escenario][1],
+            "Fecha": p.reserva.Fecha,
+            "ID_Escenario": p.reserva.ID_Escenario,
+            "Estado": "Pendiente",
+            "Fecha_creacion": ahora,
+            "Precio_Total": escenarios[p.reserva.ID_Escenario][1] + sum(
+                elementos[codigo][2] * cantidad for codigo, cantidad in p.cantidades.items()
+            ),
+        }
+        for p in bloque
+    ])
+
+    # (ID_Escenario, Fecha) es único: así recuperamos los IDs generados sin RETURNING
+    claves = [(p.reserva.ID_Escenario, p.reserva.Fecha) for p in bloque]
+    result = await db.execute(
+        select(Reserva.ID_Escenario, Reserva.Fecha, Reserva.ID_Reserva)
+        .where(tuple_(Reserva.ID_Escenario, Reserva.Fecha).in_(claves))
+    )
+    ids = {(row[0], row[1]): row[2] for row in result.all()}
+
+    vinculos = [
+        {"ID_Reserva": ids[(p.reserva.ID_Escenario, p.reserva.Fecha)], "Codigo_Elemento": codigo, "Cantidad": cantidad}
+        for p in bloque for codigo, cantidad in p.cantidades.items()
+    ]
+    if vinculos:
+        await db.execute(insert(ReservaElemento), vinculos)
+
+    # Inventario por fecha: las fechas con las mismas cantidades totales van en un solo UPDATE
+    # (una serie entera es un grupo)
+    por_fecha: Dict[date, Dict[int, int]] = {}
+    for p in bloque:
+        totales = por_fecha.setdefault(p.reserva.Fecha, {})
+        for codigo, cantidad in p.cantidades.items():
+            totales[codigo] = totales.get(codigo, 0) + cantidad
+    grupos: Dict[Tuple[Tuple[int, int], ...], List[date]] = {}
+    for fecha, totales in sorted(por_fecha.items()):
+        if totales:
+            grupos.setdefault(tuple(sorted(totales.items())), []).append(fecha)
+    for totales, fechas in grupos.items():
+        if not await reservar_inventario(db, fechas, dict(totales)):
+            raise ConflictoStock(fechas)
+
+    # Auditoría en la misma transacción que el bloque (un INSERT de varias filas en el outbox)
+    await auditoria.registrar_lote(db, [
+        auditoria.evento("INSERT", correo, ids[(p.reserva.ID_Escenario, p.reserva.Fecha)], despues=datos_auditoria(p))
+        for p in bloque
+    ])
+    await db.commit()
+    return ids
+
+async def importar_reservas(db: AsyncSession, filas: List[object], correo: str) -> Tuple[schemas.ResultadoBulk, List[Tuple[int, date]]]:
+    """
+    Valida e inserta las filas. Devuelve (resultado, reservas creadas como (ID_Escenario, Fecha)).
+    """
+    plan, resultados = _validar(filas)
+    escenarios, elementos, ocupadas, reservado = await _precargar(db, plan)
+
+    aceptadas: List[FilaPlan] = []
+    for p in plan:
+        clave = (p.reserva.ID_Escenario, p.reserva.Fecha)
+        error = None
+        if p.reserva.ID_Escenario not in escenarios:
+            error = "Escenario no encontrado."
+        elif clave in ocupadas:
+            error = "Este escenario ya está reservado para la fecha especificada."
+        else:
+            for codigo, cantidad in p.cantidades.items():
+                if codigo not in elementos:
+                    error = f"Elemento con código {codigo} no encontrado."
+                    break
+                disponible = elementos[codigo][1] - reservado.get((codigo, p.reserva.Fecha), 0)
+                if disponible < cantidad:
+                    error = f"Stock insuficiente para el elemento '{elementos[codigo][0]}' el {p.reserva.Fecha.isoformat()}. Stock disponible: {max(disponible, 0)}"
+                    break
+        if error:
+            resultados[p.fila] = schemas.ResultadoFilaBulk(fila=p.fila, ok=False, error=error)
+            continue
+        ocupadas.add(clave) # Las filas siguientes del mismo archivo ven esta fecha ocupada
+        for codigo, cantidad in p.cantidades.items():
+            # Las filas siguientes del mismo archivo y fecha ven estas unidades reservadas
+            reservado[(codigo, p.reserva.Fecha)] = reservado.get((codigo, p.reserva.Fecha), 0) + cantidad
+        aceptadas.append(p)
+
+    def _auditoria_fila(p: FilaPlan) -> dict:
+        return {"origen": "bulk", "fila": p.fila}
+
+    creadas: List[Tuple[int, date]] = []
+    for inicio in range(0, len(aceptadas), BULK_CHUNK_SIZE):
+        bloque = aceptadas[inicio:inicio + BULK_CHUNK_SIZE]
+        try:
+            ids = await _insertar_bloque(db, bloque, escenarios, elementos, correo, _auditoria_fila)
+            pendientes = []
+        except (IntegrityError, ConflictoStock):
+            # Conflicto con una transacción concurrente: se reintenta fila por fila
+            await db.rollback()
+            ids, pendientes = {}, bloque
+        for p in pendientes:
+            try:
+                ids.update(await _insertar_bloque(db, [p], escenarios, elementos, correo, _auditoria_fila))
+            except (IntegrityError, ConflictoStock):
+                await db.rollback()
+                resultados[p.fila] = schemas.ResultadoFilaBulk(fila=p.fila, ok=False, error="Conflicto: la fecha o el stock ya no están disponibles.")
+        for p in bloque:
+            clave = (p.reserva.ID_Escenario, p.reserva.Fecha)
+            if clave in ids:
+                resultados[p.fila] = schemas.ResultadoFilaBulk(fila=p.fila, ok=True, ID_Reserva=ids[clave])
+                creadas.append(clave)
+
+    ordenados = [resultados[i] for i in sorted(resultados)]
+    n_creadas = sum(1 for r in ordenados if r.ok)
+    resultado = schemas.ResultadoBulk(total=len(filas), creadas=n_creadas, errores=len(ordenados) - n_creadas, resultados=ordenados)
+    return resultado, creadas
+
+
+# --- Series: varias fechas del mismo escenario en una sola transacción ---
+SERIE_REINTENTOS = 3 # Reintentos si una reserva concurrente ocupa alguna fecha durante la inserción
+
+class ConflictoSerie(Exception):
+    """
+    todo_o_nada=True y alguna fecha de la serie está ocupada o sin stock de los elementos.
+    """
+    def __init__(self, conflictos: Dict[date, str]):
+        super().__init__(conflictos)
+        self.conflictos = conflictos
+
+async def _fechas_ocupadas(db: AsyncSession, escenario_id: int, fechas: List[date]) -> Set[date]:
+    # Búsquedas puntuales sobre el índice único (ID_Escenario, Fecha)
+    result = await db.execute(select(Reserva.Fecha).where(Reserva.ID_Escenario == escenario_id, Reserva.Fecha.in_(fechas)))
+    return set(result.scalars().all())
+
+async def _conflictos(db: AsyncSession, escenario_id: int, fechas: List[date], cantidades: Dict[int, int], elementos) -> Dict[date, str]:
+    # Fechas ocupadas y fechas en las que algún elemento no alcanza (dos consultas por rango de PK/índice)
+    conflictos = {fecha: "Este escenario ya está reservado para la fecha especificada." for fecha in await _fechas_ocupadas(db, escenario_id, fechas)}
+    reservado = await reservado_por_fecha(db, cantidades, fechas)
+    for fecha in fechas:
+        for codigo, cantidad in cantidades.items():
+            disponible = elementos[codigo][1] - reservado.get((codigo, fecha), 0)
+            if fecha not in conflictos and disponible < cantidad:
+                conflictos[fecha] = f"Stock insuficiente para el elemento '{elementos[codigo][0]}' en esta fecha. Stock disponible: {max(disponible, 0)}"
+    return conflictos
+
+async def reservar_serie(
+    db: AsyncSession,
+    escenario_id: int,
+    fechas: List[date],
+    cantidades: Dict[int, int],
+    correo: str,
+    todo_o_nada: bool = False,
+) -> Tuple[Dict[date, int], Dict[date, str], int]:
+    """
+    Reserva el escenario en todas las fechas libres con un número fijo de consultas:
+    escenario, elementos, fechas ocupadas e inventario de esas fechas (una consulta cada uno)
+    y un único bloque de inserción (_insertar_bloque) con su commit. Devuelve (Fecha -> ID_Reserva creadas,
+    Fecha -> motivo de las no reservadas, precio total de la serie creada).
+    """
+    result = await db.execute(
+        select(Escenario.ID_Escenario, Escenario.Direccion, Escenario.Precio).where(Escenario.ID_Escenario == escenario_id)
+    )
+    escenarios = {row[0]: (row[1], row[2]) for row in result.all()}
+    if escenario_id not in escenarios:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Escenario no encontrado.")
+
+    elementos: Dict[int, Tuple[str, int, int]] = {}
+    if cantidades:
+        result = await db.execute(select(Elemento.Codigo, Elemento.Nombre, Elemento.Stock, Elemento.Precio).where(Elemento.Codigo.in_(cantidades)))
+        elementos = {row[0]: (row[1], row[2], row[3]) for row in result.all()}
+        faltantes = sorted(set(cantidades) - set(elementos))
+        if faltantes:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Elemento con código {faltantes[0]} no encontrado.")
+
+    # Cada fecha de la serie reserva las mismas cantidades en el inventario de ese día
+    plan = [
+        FilaPlan(fila=i, reserva=schemas.ReservaCreate.model_construct(Fecha=fecha, ID_Escenario=escenario_id), cantidades=cantidades)
+        for i, fecha in enumerate(fechas, start=1)
+    ]
+    precio_reserva = escenarios[escenario_id][1] + sum(elementos[codigo][2] * cantidad for codigo, cantidad in cantidades.items())
+
+    def _auditoria_fecha(p: FilaPlan) -> dict:
+        return {"origen": "serie", "ID_Escenario": escenario_id, "Fecha": p.reserva.Fecha, "elementos": cantidades}
+
+    for _ in range(SERIE_REINTENTOS):
+        conflictos = await _conflictos(db, escenario_id, fechas, cantidades, elementos)
+        if conflictos and todo_o_nada:
+            raise ConflictoSerie(conflictos)
+        libres = [p for p in plan if p.reserva.Fecha not in conflictos]
+        if not libres:
+            return {}, conflictos, 0
+        try:
+            ids = await _insertar_bloque(db, libres, escenarios, elementos, correo, _auditoria_fecha)
+        except (IntegrityError, ConflictoStock):
+            # Una reserva concurrente tomó alguna fecha o sus elementos: se vuelve a consultar y se reintenta
+            await db.rollback()
+            continue
+        creadas = {fecha: reserva_id for (_, fecha), reserva_id in ids.items()}
+        return creadas, conflictos, precio_reserva * len(creadas)
+
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Otras reservas concurrentes ocuparon fechas de la serie. Intenta de nuevo.")
@@ -0,0 +1,221 @@
+# app/cache.py
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+# --- Configuración de la caché de catálogos (Escenario / Elementos) ---
+# CATALOG_CACHE_BACKEND: "memory" (por proceso), "redis" (compartida entre workers) o "none".
+CATALOG_CACHE_BACKEND = os.getenv("CATALOG_CACHE_BACKEND", "memory").strip().lower()
+CATALOG_CACHE_URL = os.getenv("CATALOG_CACHE_URL", "redis://localhost:6379/0")
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300")) # segundos
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "1024"))
+
+
+# --- Backends ---
+class MemoryCacheBackend:
+    """
+    LRU con TTL en memoria del proceso. Los contadores de versión se guardan aparte
+    para que nunca se expulsen (si se perdieran, podrían reaparecer entradas viejas).
+    """
+    def __init__(self, maxsize: int = CATALOG_CACHE_SIZE, ttl: float = CATALOG_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._counters: dict = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    async def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisCacheBackend:
+    """
+    Backend compartido para despliegues con varios workers. Acepta cualquier cliente
+    con la API de redis.asyncio (get/set/delete/incr), p. ej. fakeredis en pruebas locales.
+    """
+    def __init__(self, client, ttl: float = CATALOG_CACHE_TTL, prefix: str = "reservas:catalogo:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisCacheBackend":
+        try:
+            import redis.asyncio as redis_asyncio # Dependencia opcional
+        except ImportError:
+            raise RuntimeError("CATALOG_CACHE_BACKEND=redis requiere el paquete 'redis' (pip install redis).")
+        return cls(redis_asyncio.from_url(url), **kwargs)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode()
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        await self.client.set(self.prefix + key, value, ex=max(1, int(self.ttl)))
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+    async def get_counter(self, key: str) -> int:
+        value = await self.client.get(self.prefix + key)
+        return int(value) if value is not None else 0
+
+    async def incr(self, key: str) -> int:
+        return int(await self.client.incr(self.prefix + key))
+
+
+# --- Entradas cacheadas: el cuerpo JSON ya serializado más sus validadores HTTP ---
+@dataclass
+class CachedEntry:
+    body: bytes
+    etag: str
+    last_modified: float
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "CachedEntry":
+        return cls(body=body, etag='"' + hashlib.sha1(body).hexdigest() + '"', last_modified=time.time())
+
+    def dumps(self) -> str:
+        return json.dumps({"b": self.body.decode(), "e": self.etag, "m": self.last_modified})
+
+    @classmethod
+    def loads(cls, raw: str) -> "CachedEntry":
+        data = json.loads(raw)
+        return cls(body=data["b"].encode(), etag=data["e"], last_modified=data["m"])
+
+
+class CatalogCache:
+    """
+    Caché read-through por catálogo. Cada catálogo tiene un número de versión que forma
+    parte de todas sus claves: invalidar = incrementar la versión, así que los listados
+    (con cualquier skip/limit/cursor) quedan obsoletos de una sola vez.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def _key(self, catalogo: str, partes: tuple) -> str:
+        version = await self.backend.get_counter(f"{catalogo}:version")
+        return f"{catalogo}:v{version}:" + ":".join(str(p) for p in partes)
+
+    async def get_or_load(self, catalogo: str, partes: tuple, loader: Callable[[], Awaitable[bytes]]) -> CachedEntry:
+        if self.backend is None:
+            return CachedEntry.from_body(await loader())
+
+        key = await self._key(catalogo, partes)
+        raw = await self.backend.get(key)
+        if raw is not None:
+            self.hits += 1
+            return CachedEntry.loads(raw)
+
+        self.misses += 1
+        entry = CachedEntry.from_body(await loader())
+        await self.backend.set(key, entry.dumps())
+        return entry
+
+    async def invalidate(self, catalogo: str) -> None:
+        if self.backend is not None:
+            await self.backend.incr(f"{catalogo}:version")
+
+    async def write_through(self, catalogo: str, partes: tuple, body: bytes) -> None:
+        """
+        Invalida el catálogo y deja ya cacheada la nueva versión del recurso modificado.
+        """
+        if self.backend is None:
+            return
+        await self.invalidate(catalogo)
+        key = await self._key(catalogo, partes)
+        await self.backend.set(key, CachedEntry.from_body(body).dumps())
+
+    def snapshot(self) -> dict:
+        return {"backend": type(self.backend).__name__ if self.backend else None, "hits": self.hits, "misses": self.misses}
+
+
+def _build_backend():
+    if CATALOG_CACHE_BACKEND == "none":
+        return None
+    if CATALOG_CACHE_BACKEND == "redis":
+        return RedisCacheBackend.from_url(CATALOG_CACHE_URL)
+    return MemoryCacheBackend()
+
+
+catalog_cache = CatalogCache(_build_backend())
+
+
+# --- Serialización y respuestas condicionales ---
+@lru_cache(maxsize=None)
+def _adapter(tipo) -> TypeAdapter:
+    return TypeAdapter(tipo)
+
+def dump_json(tipo, data: Any) -> bytes:
+    """
+    Valida data (objetos ORM o dicts) contra el esquema tipo y lo serializa a JSON.
+    """
+    adapter = _adapter(tipo)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+def _not_modified(request: Request, entry: CachedEntry) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = [etag.strip() for etag in if_none_match.split(",")]
+        return "*" in etags or entry.etag in etags or ("W/" + entry.etag) in etags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(entry.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def cached_json_response(request: Request, entry: CachedEntry) -> Response:
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": formatdate(entry.last_modified, usegmt=True),
+        "Cache-Control": "no-cache", # El cliente puede guardar la respuesta, pero debe revalidarla
+    }
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
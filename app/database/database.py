@@ -1,21 +1,313 @@
-from sqlalchemy import create_engine
+from sqlalchemy import event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from dotenv import load_dotenv
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from fastapi import Request
+from jose import JWTError, jwt
+import asyncio
 import os
+import random
+import threading
+import time
+from typing import Optional
 
-load_dotenv()
+from ..metrics import instrument_engine, metrics_registry, record_pool_wait
+from ..nplusone import nplusone_detector
+from ..settings import Settings
+from .routing import USAR_REPLICA, ReplicaSet, routing_session_class
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-   raise ValueError("La variable de entorno DATABASE_URL no está configurada.")
 
-engine = create_async_engine(DATABASE_URL)
-async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+class PoolWaitStats:
+    """
+    Acumula el tiempo que las peticiones esperan para obtener una conexión del pool.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.timeouts = 0
+
+    def record(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += seconds
+            if seconds > self.max_wait:
+                self.max_wait = seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_total_ms": round(self.total_wait * 1000, 3),
+                "wait_avg_ms": round(self.total_wait * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool que mide el tiempo de espera de cada checkout.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            pool_wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        waited = time.perf_counter() - start
+        pool_wait_stats.record(waited)
+        record_pool_wait(waited)
+        return conn
+
+
+def create_db_engine(
+    url: str,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout: float = 30,
+    pool_recycle: int = 1800,
+    pool_pre_ping: bool = True,
+    echo: bool = False,
+):
+    """
+    Fábrica única de engines asíncronos: toda la aplicación comparte el mismo pool.
+    """
+    return create_async_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+        echo=echo,
+    )
+
+
+class Database:
+    """
+    Engine primario, réplicas y fábrica de sesiones de la aplicación. Ya no se crean al
+    importar el módulo: se construyen con la configuración la primera vez que se piden
+    (get_database) o al arrancar la aplicación (init_database, desde el lifespan).
+    """
+    def __init__(self, settings: Settings):
+        if not settings.database_url:
+            raise ValueError("La variable de entorno DATABASE_URL no está configurada.")
+        self.settings = settings
+        self.engine = create_db_engine(
+            settings.database_url,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=settings.db_pool_pre_ping,
+            echo=settings.db_echo,
+        )
+        instrument_engine(self.engine.sync_engine) # Consultas y tiempo de DB por petición (ver app/metrics.py)
+        if nplusone_detector.enabled:
+            nplusone_detector.instrument_engine(self.engine.sync_engine) # Solo en desarrollo/pruebas (NPLUSONE_MODE)
+
+        replica_pool_size = settings.replica_pool_size or settings.db_pool_size
+        self.replica_engines = [
+            create_db_engine(
+                url,
+                pool_size=replica_pool_size,
+                max_overflow=settings.db_max_overflow,
+                pool_timeout=settings.db_pool_timeout,
+                pool_recycle=settings.db_pool_recycle,
+                pool_pre_ping=settings.db_pool_pre_ping,
+                echo=settings.db_echo,
+            )
+            for url in settings.replica_urls
+        ]
+        for replica_engine in self.replica_engines:
+            instrument_engine(replica_engine.sync_engine)
+        self.replica_set = ReplicaSet(
+            self.replica_engines,
+            timeout=settings.replica_health_timeout,
+            sticky_seconds=settings.replica_sticky_seconds,
+        )
+
+        self.session_maker = sessionmaker(
+            self.engine,
+            class_=AsyncSession,
+            sync_session_class=routing_session_class(self.engine, self.replica_set), # Sin réplicas, todo va a engine
+            expire_on_commit=False,
+        )
+
+    async def prewarm(self, conexiones: int) -> int:
+        """
+        Abre a la vez hasta `conexiones` conexiones en cada pool (primaria y réplicas) y las
+        devuelve: las primeras peticiones no pagan el connect + handshake. Devuelve cuántas
+        conexiones quedaron en los pools.
+        """
+        abiertas = 0
+        pools = [(self.engine, self.settings.db_pool_size)]
+        pools += [(r, self.settings.replica_pool_size or self.settings.db_pool_size) for r in self.replica_engines]
+        for engine, pool_size in pools:
+            conns = [engine.connect() for _ in range(min(conexiones, pool_size))]
+            try:
+                await asyncio.gather(*(conn.start() for conn in conns))
+                abiertas += len(conns)
+            finally:
+                await asyncio.gather(*(conn.close() for conn in conns), return_exceptions=True)
+        return abiertas
+
+    async def dispose(self) -> None:
+        # Cierra las conexiones de todos los pools (al apagar la aplicación)
+        await self.engine.dispose()
+        for replica_engine in self.replica_engines:
+            await replica_engine.dispose()
+
+
+_database: Optional[Database] = None
+
+def get_database() -> Database:
+    """
+    Base de datos de la aplicación; si nadie la configuró (scripts, benchmarks), se crea con
+    Settings.from_env().
+    """
+    global _database
+    if _database is None:
+        _database = Database(Settings.from_env())
+    return _database
+
+async def init_database(settings: Settings) -> Database:
+    # Sustituye (y cierra) la que hubiera: una por proceso
+    global _database
+    await dispose_database()
+    _database = Database(settings)
+    return _database
+
+async def dispose_database() -> None:
+    global _database
+    if _database is not None:
+        database, _database = _database, None
+        await database.dispose()
+
+def get_engine():
+    return get_database().engine
+
+def get_replica_set() -> ReplicaSet:
+    return get_database().replica_set
+
+def async_session_maker(**kw) -> AsyncSession:
+    return get_database().session_maker(**kw)
+
+def read_session():
+    """
+    Sesión de solo lectura fuera de una petición (exportaciones, informes): usa una réplica si hay.
+    """
+    return async_session_maker(info={USAR_REPLICA: True})
 
 Base = declarative_base()
 
-async def get_db():
-    async with async_session_maker() as session:
+def _clave_cliente(request: Request) -> Optional[str]:
+    """
+    Clave de read-your-writes: el usuario del token (claim ``sub``) o la IP si no hay token.
+    Va por el principal y no por el token crudo para que refrescar el token no la cambie.
+    No se verifica la firma: la clave solo decide a qué base van las lecturas y la
+    autenticación la sigue haciendo get_current_principal.
+    """
+    esquema, _, token = request.headers.get("authorization", "").partition(" ")
+    if esquema.lower() == "bearer" and token:
+        try:
+            sub = jwt.get_unverified_claims(token).get("sub")
+        except JWTError:
+            sub = None
+        if sub:
+            return f"sub:{sub}"
+    return request.client.host if request.client else None
+
+async def get_db(request: Request):
+    replica_set = get_replica_set()
+    cliente = _clave_cliente(request)
+    lectura = request.method in ("GET", "HEAD") and not replica_set.escribio_hace_poco(cliente)
+    async with async_session_maker(info={USAR_REPLICA: lectura}) as session:
+        # Se marca al confirmar y no al cerrar la dependencia: el cierre puede ocurrir después
+        # de enviar la respuesta y la siguiente lectura del cliente llegaría antes que la marca
+        def _tras_commit(sync_session):
+            if sync_session.info.get("escribio"):
+                replica_set.registrar_escritura(cliente)
+
+        event.listen(session.sync_session, "after_commit", _tras_commit)
         yield session
+
+def get_pool_stats() -> dict:
+    """
+    Estadísticas en vivo del pool compartido (para dimensionarlo según los workers).
+    """
+    database = get_database()
+    settings = database.settings
+    pool = database.engine.sync_engine.pool
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        **pool_wait_stats.snapshot(),
+        **(database.replica_set.snapshot() if database.replica_set.enabled else {}),
+    }
+
+def _pool_metrics():
+    if _database is None:
+        return [] # Un scrape de /metrics no debe crear el engine
+    stats = get_pool_stats()
+    return [
+        ("db_pool_size", "Conexiones permanentes del pool.", "gauge", stats["pool_size"]),
+        ("db_pool_checked_out", "Conexiones en uso.", "gauge", stats["checked_out"]),
+        ("db_pool_overflow", "Conexiones de overflow abiertas.", "gauge", stats["overflow"]),
+        ("db_pool_checkouts_total", "Conexiones entregadas por el pool.", "counter", stats["checkouts"]),
+        ("db_pool_timeouts_total", "Checkouts que agotaron DB_POOL_TIMEOUT.", "counter", stats["timeouts"]),
+        ("db_pool_wait_seconds_total", "Tiempo total esperando una conexión.", "counter", stats["wait_total_ms"] / 1000),
+    ]
+
+metrics_registry.register_collector(_pool_metrics)
+
+
+# --- Reintentos ante deadlocks / timeouts de bloqueo ---
+# Códigos de MySQL/MariaDB: 1213 = deadlock, 1205 = lock wait timeout
+RETRYABLE_DB_ERROR_CODES = {1213, 1205}
+DB_RETRY_ATTEMPTS = int(os.getenv("DB_RETRY_ATTEMPTS", "3"))
+DB_RETRY_BACKOFF = float(os.getenv("DB_RETRY_BACKOFF", "0.05")) # segundos
+
+def is_retryable_error(exc: DBAPIError) -> bool:
+    orig = getattr(exc, "orig", None)
+    args = getattr(orig, "args", ())
+    if args and args[0] in RETRYABLE_DB_ERROR_CODES:
+        return True
+    # SQLite (desarrollo local) señala la contención como "database is locked"
+    return "database is locked" in str(orig)
+
+async def run_with_retry(db: AsyncSession, operation, attempts: int = DB_RETRY_ATTEMPTS):
+    """
+    Ejecuta operation() (una corrutina que hace commit) y la repite con backoff
+    si la transacción falla por deadlock o timeout de bloqueo.
+    """
+    for intento in range(1, attempts + 1):
+        try:
+            return await operation()
+        except DBAPIError as e:
+            await db.rollback()
+            if intento >= attempts or not is_retryable_error(e):
+                raise
+            await asyncio.sleep(DB_RETRY_BACKOFF * (2 ** (intento - 1)) * (0.5 + random.random()))
@@ -0,0 +1,442 @@
+# app/database/migrations.py
+#
+# Migraciones versionadas del esquema. Sustituyen al create_all que se ejecutaba en cada
+# arranque: los workers solo verifican que la base esté en la versión esperada y las
+# migraciones se aplican una vez, de forma explícita:
+#
+#   python -m app.database.migrations upgrade   # aplica las pendientes
+#   python -m app.database.migrations status    # versión actual / esperada
+#
+# Cada migración es idempotente (comprueba antes de crear), así que sirve tanto para una
+# base vacía como para una creada con sqldb.sql o con el create_all de versiones anteriores.
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Sequence
+import asyncio
+import sys
+
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, ForeignKey, Integer, MetaData, String, Table, Text, column, func, inspect, insert,
+    table, text, update,
+)
+from sqlalchemy.future import select
+from sqlalchemy.schema import CreateColumn, Index
+
+_version_metadata = MetaData()
+schema_version_table = Table(
+    "Schema_Version", _version_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("descripcion", String(255), nullable=False),
+    Column("aplicada", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    descripcion: str
+    aplicar: Callable # aplicar(conn) síncrono, se ejecuta con conn.run_sync
+
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, descripcion: str):
+    def registrar(fn):
+        MIGRATIONS.append(Migration(version, descripcion, fn))
+        return fn
+    return registrar
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+class MigrationError(RuntimeError):
+    """
+    Una migración no puede aplicarse con los datos actuales (hay que corregirlos a mano).
+    """
+    pass
+
+
+# --- Esquema congelado: las tablas tal como las crea cada migración ---
+# Las migraciones no usan Base.metadata ni los __table__ de los modelos: si un modelo cambia
+# después, una base nueva tiene que pasar por las mismas versiones que una antigua, y el
+# cambio llega con su propia migración. Estas definiciones no se editan nunca.
+_esquema_metadata = MetaData()
+
+# v1: el esquema de los modelos originales (el que dejaba el create_all del arranque)
+_v1_usuarios = Table(
+    "Usuarios", _esquema_metadata,
+    Column("correo", String(255), primary_key=True, unique=True, index=True),
+    Column("nombres", String(255)),
+    Column("apellidos", String(255)),
+    Column("contrasenia", String(255)),
+    Column("rango", String(50)),
+    Column("intentos_login", Integer),
+    Column("bloqueado", Boolean),
+    Column("fecha_creacion", DateTime),
+    Column("ultimo_login", DateTime, nullable=True),
+)
+_v1_escenario = Table(
+    "Escenario", _esquema_metadata,
+    Column("ID_Escenario", Integer, primary_key=True, index=True),
+    Column("Direccion", String(255)),
+    Column("Capacidad", Integer),
+    Column("Precio", Integer),
+    Column("Activo", Boolean),
+    Column("Fecha_creacion", DateTime),
+)
+_v1_elementos = Table(
+    "Elementos", _esquema_metadata,
+    Column("Codigo", Integer, primary_key=True, index=True),
+    Column("Nombre", String(255)),
+    Column("Precio", Integer),
+    Column("Stock", Integer),
+    Column("Fecha_creacion", DateTime),
+)
+_v1_reservas = Table(
+    "Reservas", _esquema_metadata,
+    Column("ID_Reserva", Integer, primary_key=True, index=True),
+    Column("Correo_Usuario", String(255), ForeignKey("Usuarios.correo")),
+    Column("Lugar", String(255)),
+    Column("Precio", Integer),
+    Column("Fecha", Date),
+    Column("ID_Escenario", Integer, ForeignKey("Escenario.ID_Escenario")),
+    Column("Estado", String(50)),
+    Column("Fecha_creacion", DateTime),
+)
+_v1_reservas_elementos = Table(
+    "Reservas_Elementos", _esquema_metadata,
+    Column("ID_Reserva", Integer, ForeignKey("Reservas.ID_Reserva"), primary_key=True),
+    Column("Codigo_Elemento", Integer, ForeignKey("Elementos.Codigo"), primary_key=True),
+    Column("Cantidad", Integer),
+)
+
+# v4: Reservas.Precio_Total. Reservas ya está en _esquema_metadata con sus columnas v1, así
+# que la vista v4 es una construcción ligera con solo las columnas que usa el relleno
+_v4_reservas = table("Reservas", column("ID_Reserva"), column("ID_Escenario"), column("Precio_Total"))
+
+# v7: resúmenes mensuales para analíticas
+_v7_resumen_escenario = Table(
+    "Resumen_Mensual_Escenario", _esquema_metadata,
+    Column("ID_Escenario", Integer, ForeignKey("Escenario.ID_Escenario"), primary_key=True),
+    Column("Periodo", Integer, primary_key=True),
+    Column("Reservas", Integer, nullable=False),
+    Column("Ingresos", Integer, nullable=False),
+    Column("Actualizado", DateTime),
+)
+_v7_resumen_elemento = Table(
+    "Resumen_Mensual_Elemento", _esquema_metadata,
+    Column("Codigo_Elemento", Integer, ForeignKey("Elementos.Codigo"), primary_key=True),
+    Column("Periodo", Integer, primary_key=True),
+    Column("Reservas", Integer, nullable=False),
+    Column("Cantidad", Integer, nullable=False),
+    Column("Ingresos", Integer, nullable=False),
+    Column("Actualizado", DateTime),
+)
+
+# v9: auditoría escrita por la aplicación
+def _tabla_auditoria(nombre: str, pk: str) -> Table:
+    return Table(
+        nombre, _esquema_metadata,
+        Column(pk, Integer, primary_key=True, autoincrement=True),
+        Column("ID_Reserva", Integer, nullable=True),
+        Column("Accion", String(10)),
+        Column("Usuario", String(255)),
+        Column("Fecha", DateTime),
+        Column("Datos_anteriores", Text, nullable=True),
+        Column("Entidad", String(20), nullable=True),
+        Column("Referencia", String(255), nullable=True),
+        Column("Datos_nuevos", Text, nullable=True),
+    )
+
+_v9_auditoria = _tabla_auditoria("AuditoriaReservas", "ID_Auditoria")
+_v9_outbox = _tabla_auditoria("Auditoria_Outbox", "ID_Outbox")
+
+# v10: inventario de elementos por fecha
+_v10_inventario = Table(
+    "Inventario_Elementos", _esquema_metadata,
+    Column("Codigo_Elemento", Integer, ForeignKey("Elementos.Codigo", ondelete="CASCADE"), primary_key=True),
+    Column("Fecha", Date, primary_key=True),
+    Column("Reservado", Integer, nullable=False),
+)
+
+
+# --- Utilidades de inspección (síncronas, dentro de run_sync) ---
+def _columnas(conn, tabla: str) -> dict:
+    return {col["name"]: col for col in inspect(conn).get_columns(tabla)}
+
+def _tiene_indice(conn, tabla: str, columnas: Sequence[str]) -> bool:
+    """
+    True si algún índice, restricción única o la PK de la tabla empieza por esas columnas
+    (en ese orden), es decir, si ya puede usarse para buscar por ellas.
+    """
+    inspector = inspect(conn)
+    candidatos = [ix["column_names"] for ix in inspector.get_indexes(tabla)]
+    candidatos += [uq["column_names"] for uq in inspector.get_unique_constraints(tabla)]
+    candidatos.append(inspector.get_pk_constraint(tabla).get("constrained_columns") or [])
+    return any(list(c[:len(columnas)]) == list(columnas) for c in candidatos)
+
+def _agregar_columna(conn, tabla: str, columna: Column) -> bool:
+    # MariaDB no distingue mayúsculas en los nombres de columna (sqldb.sql crea Token_version)
+    if columna.name.lower() in {nombre.lower() for nombre in _columnas(conn, tabla)}:
+        return False
+    Table(tabla, MetaData(), columna) # CreateColumn necesita que la columna pertenezca a una tabla
+    ddl = CreateColumn(columna).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {conn.dialect.identifier_preparer.quote(tabla)} ADD COLUMN {ddl}"))
+    return True
+
+def _crear_indice(conn, tabla: str, nombre: str, columnas: Sequence[str], unique: bool = False) -> bool:
+    inspector = inspect(conn)
+    if unique:
+        existentes = [uq["column_names"] for uq in inspector.get_unique_constraints(tabla)]
+        existentes += [ix["column_names"] for ix in inspector.get_indexes(tabla) if ix.get("unique")]
+        if any(list(c) == list(columnas) for c in existentes):
+            return False
+    elif _tiene_indice(conn, tabla, columnas):
+        return False
+    reflejada = Table(tabla, MetaData(), autoload_with=conn)
+    Index(nombre, *[reflejada.c[c] for c in columnas], unique=unique).create(conn)
+    return True
+
+def _es_mysql(conn) -> bool:
+    return conn.dialect.name in ("mysql", "mariadb")
+
+
+# --- Migraciones (en orden; nunca editar una ya publicada, agregar una nueva) ---
+@migration(1, "Esquema base (Usuarios, Escenario, Elementos, Reservas, Reservas_Elementos)")
+def _m001_esquema_base(conn):
+    tablas = [_v1_usuarios, _v1_escenario, _v1_elementos, _v1_reservas, _v1_reservas_elementos]
+    _esquema_metadata.create_all(conn, tables=tablas, checkfirst=True)
+
+@migration(2, "Usuarios.token_version para invalidar tokens al cambiar rango/bloqueo")
+def _m002_token_version(conn):
+    _agregar_columna(conn, "Usuarios", Column("token_version", Integer, nullable=False, server_default="0"))
+
+@migration(3, "Restricción única (ID_Escenario, Fecha) en Reservas")
+def _m003_reserva_unica(conn):
+    # Con reservas dobles ya guardadas el CREATE UNIQUE INDEX fallaría con un error poco claro:
+    # se listan antes para que un administrador decida cuál conservar
+    duplicados = (
+        select(_v1_reservas.c.ID_Escenario, _v1_reservas.c.Fecha)
+        .group_by(_v1_reservas.c.ID_Escenario, _v1_reservas.c.Fecha)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    filas = conn.execute(
+        select(_v1_reservas.c.ID_Escenario, _v1_reservas.c.Fecha, _v1_reservas.c.ID_Reserva)
+        .join(duplicados, (duplicados.c.ID_Escenario == _v1_reservas.c.ID_Escenario) & (duplicados.c.Fecha == _v1_reservas.c.Fecha))
+        .order_by(_v1_reservas.c.ID_Escenario, _v1_reservas.c.Fecha, _v1_reservas.c.ID_Reserva)
+    ).all()
+    if filas:
+        conflictos = {}
+        for escenario, fecha, id_reserva in filas:
+            conflictos.setdefault((escenario, fecha), []).append(id_reserva)
+        detalle = "\n".join(
+            f"  escenario {escenario}, fecha {fecha}: reservas {', '.join(map(str, ids))}"
+            for (escenario, fecha), ids in conflictos.items()
+        )
+        raise MigrationError(
+            f"No se puede crear uq_reserva_escenario_fecha: hay {len(conflictos)} escenario(s) reservados "
+            f"más de una vez en la misma fecha.\n{detalle}\n"
+            "Cancela o mueve las reservas sobrantes y vuelve a ejecutar: python -m app.database.migrations upgrade"
+        )
+    # Como índice único: equivalente a la restricción y soportado también por SQLite
+    _crear_indice(conn, "Reservas", "uq_reserva_escenario_fecha", ["ID_Escenario", "Fecha"], unique=True)
+
+@migration(4, "Reservas.Precio_Total persistido, con relleno inicial")
+def _m004_precio_total(conn):
+    _agregar_columna(conn, "Reservas", Column("Precio_Total", Integer, nullable=True))
+    reservas, escenario, elementos, vinculos = _v4_reservas, _v1_escenario, _v1_elementos, _v1_reservas_elementos
+    precio_escenario = (
+        select(escenario.c.Precio)
+        .where(escenario.c.ID_Escenario == reservas.c.ID_Escenario)
+        .correlate(reservas)
+        .scalar_subquery()
+    )
+    precio_elementos = (
+        select(func.sum(elementos.c.Precio * vinculos.c.Cantidad))
+        .select_from(vinculos.join(elementos, elementos.c.Codigo == vinculos.c.Codigo_Elemento))
+        .where(vinculos.c.ID_Reserva == reservas.c.ID_Reserva)
+        .correlate(reservas)
+        .scalar_subquery()
+    )
+    conn.execute(
+        update(reservas)
+        .where(reservas.c.Precio_Total.is_(None))
+        .values(Precio_Total=precio_escenario + func.coalesce(precio_elementos, 0))
+    )
+
+@migration(5, "Índices para las consultas por usuario y por elemento")
+def _m005_indices(conn):
+    # /reservas/me filtra por Correo_Usuario y las búsquedas por elemento usan
+    # Reservas_Elementos.Codigo_Elemento (no es la primera columna de la PK).
+    # (ID_Escenario, Fecha) ya está cubierto por uq_reserva_escenario_fecha (migración 3).
+    _crear_indice(conn, "Reservas", "ix_reservas_correo_usuario", ["Correo_Usuario"])
+    _crear_indice(conn, "Reservas_Elementos", "ix_reservas_elementos_codigo", ["Codigo_Elemento"])
+
+@migration(6, "Alinear sqldb.sql con los modelos: Hora opcional y precios enteros")
+def _m006_alinear_sqldb(conn):
+    if not _es_mysql(conn):
+        return # Solo las bases creadas con sqldb.sql (MariaDB) tienen estas diferencias
+    reservas = _columnas(conn, "Reservas")
+    if "Hora" in reservas and not reservas["Hora"]["nullable"]:
+        # La API no maneja horas: con NOT NULL cualquier INSERT de la API fallaría
+        conn.execute(text("ALTER TABLE Reservas MODIFY Hora TIME NULL"))
+    for tabla in ("Escenario", "Elementos", "Reservas"):
+        precio = _columnas(conn, tabla).get("Precio")
+        if precio is not None and "DECIMAL" in str(precio["type"]).upper():
+            # Pesos colombianos: sin decimales, como declara el modelo (Integer)
+            conn.execute(text(f"ALTER TABLE {tabla} MODIFY Precio INT NOT NULL"))
+
+@migration(7, "Índice cubriente por fecha y tablas de resumen mensual para analíticas")
+def _m007_analiticas(conn):
+    _crear_indice(conn, "Reservas", "ix_reservas_fecha_escenario_total", ["Fecha", "ID_Escenario", "Precio_Total"])
+    _esquema_metadata.create_all(conn, tables=[_v7_resumen_escenario, _v7_resumen_elemento], checkfirst=True)
+
+@migration(8, "Índice para la búsqueda de escenarios disponibles")
+def _m008_busqueda_escenarios(conn):
+    # El anti-join contra Reservas usa uq_reserva_escenario_fecha (ID_Escenario, Fecha)
+    _crear_indice(conn, "Escenario", "ix_escenario_activo_capacidad_precio", ["Activo", "Capacidad", "Precio"])
+
+@migration(9, "Auditoría desde la aplicación: columnas nuevas, outbox y sin triggers")
+def _m009_auditoria_asincrona(conn):
+    # Las bases creadas con sqldb.sql ya tienen AuditoriaReservas (sin las columnas nuevas)
+    _esquema_metadata.create_all(conn, tables=[_v9_auditoria, _v9_outbox], checkfirst=True)
+    _agregar_columna(conn, "AuditoriaReservas", Column("Entidad", String(20), nullable=True))
+    _agregar_columna(conn, "AuditoriaReservas", Column("Referencia", String(255), nullable=True))
+    _agregar_columna(conn, "AuditoriaReservas", Column("Datos_nuevos", Text, nullable=True))
+    if _es_mysql(conn):
+        # Ahora la auditoría la escribe app/audit.py (Auditoria_Outbox) en la transacción de la reserva
+        conn.execute(text("DROP TRIGGER IF EXISTS after_reserva_insert"))
+        conn.execute(text("DROP TRIGGER IF EXISTS before_reserva_delete"))
+
+@migration(10, "Inventario de elementos por fecha (Stock pasa a ser la cantidad total)")
+def _m010_inventario_por_fecha(conn):
+    # En las bases migradas cuando la v1 todavía era un create_all de los modelos la tabla ya
+    # existe: lo que indica si falta convertir es que esté vacía, no que exista
+    _v10_inventario.create(conn, checkfirst=True)
+    if conn.execute(select(func.count()).select_from(_v10_inventario)).scalar_one():
+        return
+    reservas, vinculos, elementos = _v1_reservas, _v1_reservas_elementos, _v1_elementos
+    # Lo ya reservado, agrupado por elemento y fecha
+    conn.execute(
+        insert(_v10_inventario).from_select(
+            ["Codigo_Elemento", "Fecha", "Reservado"],
+            select(vinculos.c.Codigo_Elemento, reservas.c.Fecha, func.sum(vinculos.c.Cantidad))
+            .join(reservas, reservas.c.ID_Reserva == vinculos.c.ID_Reserva)
+            .group_by(vinculos.c.Codigo_Elemento, reservas.c.Fecha),
+        )
+    )
+    # Las versiones con migraciones descontaban las cantidades de cada reserva de Elementos.Stock
+    # (y las cancelaciones las devolvían): solo esas se suman de vuelta para que Stock sea otra
+    # vez la cantidad total. Las reservas anteriores a la v1 (esquema original, sin descuento)
+    # no tocaron Stock; en una base que llega aquí desde la v0 la v1 se acaba de aplicar y no
+    # se suma nada.
+    # Limitación: no hay ninguna marca por reserva de si descontó, así que se decide por
+    # Fecha_creacion >= fecha en que se aplicó la v1. Una reserva importada o corregida a mano
+    # con una Fecha_creacion anterior (o posterior) a la real, o un reloj de la aplicación
+    # desfasado respecto al del servidor que aplicó la v1, queda mal clasificada y el Stock
+    # resultante difiere en su cantidad. Antes de migrar una base así conviene revisar las
+    # reservas creadas cerca de esa fecha (SELECT aplicada FROM Schema_Version WHERE version = 1)
+    # y, después, corregir Elementos.Stock a la cantidad física real.
+    desde_v1 = conn.execute(
+        select(schema_version_table.c.aplicada).where(schema_version_table.c.version == 1)
+    ).scalar_one_or_none()
+    if desde_v1 is None:
+        return
+    descontado = (
+        select(func.coalesce(func.sum(vinculos.c.Cantidad), 0))
+        .select_from(vinculos.join(reservas, reservas.c.ID_Reserva == vinculos.c.ID_Reserva))
+        .where(vinculos.c.Codigo_Elemento == elementos.c.Codigo, reservas.c.Fecha_creacion >= desde_v1)
+        .scalar_subquery()
+    )
+    conn.execute(update(elementos).values(Stock=elementos.c.Stock + descontado))
+
+
+LATEST_VERSION = max(m.version for m in MIGRATIONS)
+
+
+# --- Aplicación y verificación ---
+def _version_actual(conn) -> int:
+    if not inspect(conn).has_table(schema_version_table.name):
+        return 0
+    return conn.execute(select(func.coalesce(func.max(schema_version_table.c.version), 0))).scalar_one()
+
+def _aplicar_pendientes(conn) -> List[int]:
+    _version_metadata.create_all(conn, checkfirst=True)
+    actual = _version_actual(conn)
+    aplicadas = []
+    for m in sorted(MIGRATIONS, key=lambda m: m.version):
+        if m.version <= actual:
+            continue
+        m.aplicar(conn)
+        # Se registra cada una por separado: en MariaDB el DDL hace commit implícito,
+        # así que si una falla las anteriores ya quedan aplicadas y registradas
+        conn.execute(insert(schema_version_table).values(version=m.version, descripcion=m.descripcion, aplicada=datetime.utcnow()))
+        conn.commit()
+        aplicadas.append(m.version)
+    return aplicadas
+
+async def upgrade(engine) -> List[int]:
+    """
+    Aplica las migraciones pendientes y devuelve sus versiones. En MariaDB toma un
+    bloqueo con nombre para que dos procesos no migren a la vez.
+    """
+    async with engine.connect() as conn:
+        mysql = _es_mysql(conn)
+        if mysql:
+            await conn.execute(text("SELECT GET_LOCK('reservas_migraciones', 300)"))
+        try:
+            return await conn.run_sync(_aplicar_pendientes)
+        finally:
+            if mysql:
+                await conn.execute(text("SELECT RELEASE_LOCK('reservas_migraciones')"))
+
+async def current_version(engine) -> int:
+    async with engine.connect() as conn:
+        return await conn.run_sync(_version_actual)
+
+async def verify(engine) -> int:
+    """
+    Comprobación de arranque: una sola consulta, sin DDL. Falla si la base está detrás.
+    """
+    version = await current_version(engine)
+    if version < LATEST_VERSION:
+        raise SchemaVersionError(
+            f"El esquema de la base está en la versión {version} y la aplicación necesita la {LATEST_VERSION}. "
+            "Ejecuta: python -m app.database.migrations upgrade"
+        )
+    return version
+
+
+def main(argv: List[str]) -> int:
+    from .database import get_engine
+    engine = get_engine()
+
+    comando = argv[0] if argv else "status"
+    if comando not in ("upgrade", "status"):
+        print("Uso: python -m app.database.migrations [upgrade|status]")
+        return 2
+
+    async def _run():
+        try:
+            if comando == "upgrade":
+                aplicadas = await upgrade(engine)
+                print(f"Migraciones aplicadas: {aplicadas or 'ninguna'}. Versión actual: {await current_version(engine)}")
+            else:
+                print(f"Versión actual: {await current_version(engine)}. Versión esperada: {LATEST_VERSION}")
+        finally:
+            await engine.dispose()
+
+    try:
+        asyncio.run(_run())
+    except MigrationError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
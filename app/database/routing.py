@@ -0,0 +1,166 @@
+# app/database/routing.py
+#
+# Enrutamiento de lecturas a réplicas. Las sesiones marcadas con info["usar_replica"]
+# (peticiones GET/HEAD, ver get_db) leen de una réplica sana; todo lo demás va a la primaria:
+# INSERT/UPDATE/DELETE, los flush del ORM, SELECT ... FOR UPDATE y cualquier lectura
+# posterior a una escritura dentro de la misma sesión (read-your-writes).
+
+from typing import Dict, List, Optional
+import asyncio
+import itertools
+import logging
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger("app.database.replicas")
+
+USAR_REPLICA = "usar_replica" # Clave en Session.info
+
+
+class Replica:
+    def __init__(self, nombre: str, engine):
+        self.nombre = nombre
+        self.engine = engine
+        self.sana = True
+        self.fallos = 0
+        self.ultimo_error: Optional[str] = None
+        self.ultima_revision: Optional[float] = None
+        self.lecturas = 0
+
+
+class ReplicaSet:
+    """
+    Réplicas de solo lectura con revisión de salud periódica. Una réplica que falla
+    (SELECT 1 con timeout, o una desconexión detectada por el engine) deja de recibir
+    lecturas hasta que una revisión posterior la encuentre sana: mientras tanto las
+    lecturas van a la primaria.
+    """
+    def __init__(self, engines: List = (), timeout: float = 2.0, sticky_seconds: float = 0.0, max_sticky: int = 100000):
+        self.replicas = [Replica(engine.url.render_as_string(hide_password=True), engine) for engine in engines]
+        self.timeout = timeout
+        self.sticky_seconds = sticky_seconds
+        self.max_sticky = max_sticky
+        self.lecturas_primaria = 0 # Lecturas que querían réplica pero fueron a la primaria (failover)
+        self._ciclo = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._escrituras: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        for replica in self.replicas:
+            self._vigilar_desconexiones(replica)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def _vigilar_desconexiones(self, replica: Replica) -> None:
+        @event.listens_for(replica.engine.sync_engine, "handle_error")
+        def _on_error(context):
+            if context.is_disconnect:
+                self._marcar(replica, False, str(context.original_exception))
+
+    def _marcar(self, replica: Replica, sana: bool, error: Optional[str] = None) -> None:
+        if replica.sana and not sana:
+            logger.warning("Réplica %s fuera de servicio: %s", replica.nombre, error)
+        elif not replica.sana and sana:
+            logger.info("Réplica %s de nuevo en servicio", replica.nombre)
+        replica.sana = sana
+        if not sana:
+            replica.fallos += 1
+            replica.ultimo_error = error
+
+    def elegir(self) -> Optional[Replica]:
+        """
+        Siguiente réplica sana (round-robin) o None si no hay ninguna.
+        """
+        if not self.replicas:
+            return None
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[next(self._ciclo)]
+                if replica.sana:
+                    replica.lecturas += 1
+                    return replica
+            self.lecturas_primaria += 1
+        return None
+
+    # --- Salud ---
+    async def revisar(self) -> None:
+        async def _una(replica: Replica):
+            try:
+                async with replica.engine.connect() as conn:
+                    await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout=self.timeout)
+                self._marcar(replica, True)
+            except Exception as e: # Cualquier fallo (timeout, conexión rechazada...) la saca de servicio
+                self._marcar(replica, False, repr(e))
+            replica.ultima_revision = time.time()
+        await asyncio.gather(*(_una(replica) for replica in self.replicas))
+
+    async def vigilar(self, intervalo: float) -> None:
+        while True:
+            await self.revisar()
+            await asyncio.sleep(intervalo)
+
+    # --- Read-your-writes entre peticiones ---
+    # Tras una escritura, las lecturas del mismo cliente (clave = token) van a la primaria
+    # durante sticky_seconds, para no leer de una réplica que aún no recibió el cambio.
+    def registrar_escritura(self, clave: Optional[str]) -> None:
+        if not clave or self.sticky_seconds <= 0:
+            return
+        with self._lock:
+            if len(self._escrituras) >= self.max_sticky:
+                limite = time.monotonic() - self.sticky_seconds
+                self._escrituras = {k: t for k, t in self._escrituras.items() if t > limite}
+            self._escrituras[clave] = time.monotonic()
+
+    def escribio_hace_poco(self, clave: Optional[str]) -> bool:
+        if not clave or self.sticky_seconds <= 0:
+            return False
+        with self._lock:
+            instante = self._escrituras.get(clave)
+        return instante is not None and time.monotonic() - instante < self.sticky_seconds
+
+    def snapshot(self) -> dict:
+        return {
+            "replicas": [
+                {
+                    "url": replica.nombre,
+                    "sana": replica.sana,
+                    "lecturas": replica.lecturas,
+                    "fallos": replica.fallos,
+                    "ultimo_error": replica.ultimo_error,
+                    "ultima_revision": replica.ultima_revision,
+                }
+                for replica in self.replicas
+            ],
+            "lecturas_en_primaria_por_failover": self.lecturas_primaria,
+            "sticky_seconds": self.sticky_seconds,
+        }
+
+
+def routing_session_class(primary_engine, replica_set: ReplicaSet):
+    """
+    Clase de sesión síncrona (para AsyncSession(sync_session_class=...)) que elige el
+    engine de cada sentencia.
+    """
+    class RoutingSession(Session):
+        def get_bind(self, mapper=None, clause=None, **kw):
+            escritura = (
+                self._flushing
+                or isinstance(clause, UpdateBase)
+                or getattr(clause, "_for_update_arg", None) is not None
+            )
+            if escritura:
+                self.info["escribio"] = True # También lo usa get_db para el read-your-writes entre peticiones
+            elif self.info.get(USAR_REPLICA) and replica_set.enabled and not self.info.get("escribio"):
+                # Una réplica por sesión: todas las lecturas de la petición ven el mismo estado
+                replica = self.info.get("replica")
+                if replica is None or not replica.sana:
+                    replica = self.info["replica"] = replica_set.elegir()
+                if replica is not None:
+                    return replica.engine.sync_engine
+            return primary_engine.sync_engine
+
+    return RoutingSession
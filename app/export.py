@@ -0,0 +1,75 @@
+# app/export.py
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import AsyncIterator, Optional
+import csv
+import io
+import json
+import os
+
+from sqlalchemy.future import select
+
+from .database.database import read_session
+from .models.models import Reserva, Escenario
+from .pricing import precio_total_expr
+
+# Filas que se leen del cursor del servidor y se envían al cliente en cada bloque
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+EXPORT_COLUMNS = [
+    "ID_Reserva", "Correo_Usuario", "Lugar", "Precio", "Fecha",
+    "ID_Escenario", "Estado", "Fecha_creacion", "Precio_Total",
+]
+
+
+def export_query(desde: Optional[date] = None, hasta: Optional[date] = None):
+    stmt = (
+        select(
+            Reserva.ID_Reserva, Reserva.Correo_Usuario, Reserva.Lugar, Reserva.Precio, Reserva.Fecha,
+            Reserva.ID_Escenario, Reserva.Estado, Reserva.Fecha_creacion, precio_total_expr(),
+        )
+        .join(Escenario, Escenario.ID_Escenario == Reserva.ID_Escenario)
+        .order_by(Reserva.ID_Reserva)
+    )
+    if desde:
+        stmt = stmt.where(Reserva.Fecha >= desde)
+    if hasta:
+        stmt = stmt.where(Reserva.Fecha <= hasta)
+    return stmt
+
+
+def _valor(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    if isinstance(v, Decimal): # Columnas DECIMAL de MariaDB (Precio)
+        return int(v) if v == v.to_integral_value() else float(v)
+    return v
+
+
+async def stream_reservas(formato: str, desde: Optional[date] = None, hasta: Optional[date] = None) -> AsyncIterator[str]:
+    """
+    Recorre Reservas con un cursor del lado del servidor (yield_per) y va emitiendo
+    bloques de texto NDJSON o CSV; la memoria usada no depende del tamaño de la tabla.
+    Abre su propia sesión porque el cuerpo se envía después de que termine el endpoint.
+    """
+    async with read_session() as db: # Lectura larga: a una réplica si hay
+        result = await db.stream(export_query(desde, hasta).execution_options(yield_per=EXPORT_CHUNK_ROWS))
+
+        if formato == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            async for partition in result.partitions():
+                writer.writerows([[_valor(v) for v in row] for row in partition])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            async for partition in result.partitions():
+                yield "".join(
+                    json.dumps({col: _valor(v) for col, v in zip(EXPORT_COLUMNS, row)}, ensure_ascii=False) + "\n"
+                    for row in partition
+                )
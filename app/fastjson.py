@@ -0,0 +1,87 @@
+# app/fastjson.py
+
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, List, Optional, Tuple
+import json
+import os
+
+from fastapi import Response
+from sqlalchemy import inspect
+
+from .pagination import keyset_page
+
+try:
+    import orjson # Dependencia opcional: sin ella se usa json de la biblioteca estándar
+except ImportError:
+    orjson = None
+
+# --- Configuración de la ruta rápida de respuestas JSON ---
+# FAST_JSON=1: los listados grandes se arman con select() de columnas (tuplas, sin objetos
+# ORM), se omite la revalidación con los esquemas Pydantic y se serializa con orjson.
+# La forma del JSON es la misma que la de los esquemas de app/schemas.py.
+FAST_JSON = os.getenv("FAST_JSON", "0").strip().lower() in ("1", "true", "yes")
+
+
+def _default(obj):
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+def dumps(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def schema_columns(model, schema) -> list:
+    """
+    Atributos columna del modelo que expone el esquema, en el orden del esquema
+    (las relaciones, como reservas_elementos, se arman aparte).
+    """
+    columnas = {attr.key for attr in inspect(model).column_attrs}
+    return [getattr(model, campo) for campo in schema.model_fields if campo in columnas]
+
+def rows_as_dicts(result) -> List[dict]:
+    return [dict(row) for row in result.mappings()]
+
+
+class FastJSON:
+    """
+    Interruptor de la ruta rápida. `enabled` se consulta en cada petición, así que
+    los benchmarks pueden comparar ambas rutas en el mismo proceso.
+    """
+    def __init__(self, enabled: bool = FAST_JSON):
+        self.enabled = enabled
+        self.encoder = "orjson" if orjson is not None else "json"
+
+    def response(self, data: Any, status_code: int = 200) -> FastJSONResponse:
+        return FastJSONResponse(data, status_code=status_code)
+
+    async def page(self, db, stmt, key_column, skip: int, limit: int, cursor: Optional[str]) -> Tuple[List[dict], Optional[str]]:
+        """
+        Ejecuta un select() de columnas con la misma paginación que los listados ORM
+        (skip/limit o cursor) y devuelve (filas como dicts, next_cursor).
+        """
+        if cursor is not None:
+            return await keyset_page(db, stmt, key_column, cursor, limit, mappings=True)
+        result = await db.execute(stmt.order_by(key_column).offset(skip).limit(limit))
+        return rows_as_dicts(result), None
+
+    @staticmethod
+    def envelope(filas: List[dict], next_cursor: Optional[str], cursor: Optional[str]) -> Any:
+        """
+        Misma forma que los listados ORM: {items, next_cursor} con cursor, lista sin él.
+        """
+        return {"items": filas, "next_cursor": next_cursor} if cursor is not None else filas
+
+fast_json = FastJSON()
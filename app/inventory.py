@@ -0,0 +1,103 @@
+# app/inventory.py
+
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .models.models import Elemento, InventarioElemento
+
+# --- Inventario de elementos por fecha ---
+# Elementos.Stock es la cantidad total que se tiene de cada elemento y ya no se descuenta al
+# reservar. Lo comprometido en cada fecha está en Inventario_Elementos (Codigo_Elemento, Fecha,
+# Reservado), que las rutas de escritura mantienen al añadir, quitar y cancelar:
+#   disponible(codigo, fecha) = Stock - Reservado
+# Dos reservas de fechas distintas ya no compiten por la misma fila de Elementos.
+
+
+async def _asegurar_filas(db: AsyncSession, fechas: Iterable[date], codigos: Iterable[int]) -> None:
+    # Crea con Reservado=0 las filas (codigo, fecha) que falten, sin tocar las existentes
+    filas = [{"Codigo_Elemento": codigo, "Fecha": fecha, "Reservado": 0} for fecha in fechas for codigo in codigos]
+    if not filas:
+        return
+    dialecto = db.get_bind().dialect.name
+    if dialecto in ("mysql", "mariadb"):
+        stmt = mysql_insert(InventarioElemento).values(filas)
+        stmt = stmt.on_duplicate_key_update(Reservado=InventarioElemento.Reservado)
+    elif dialecto in ("sqlite", "postgresql"):
+        insert_dialecto = sqlite_insert if dialecto == "sqlite" else postgresql_insert
+        stmt = insert_dialecto(InventarioElemento).values(filas).on_conflict_do_nothing(
+            index_elements=[InventarioElemento.Codigo_Elemento, InventarioElemento.Fecha]
+        )
+    else:
+        raise RuntimeError(f"Inventario por fecha no soportado para el dialecto '{dialecto}'.")
+    await db.execute(stmt)
+
+async def reservar_inventario(db: AsyncSession, fechas: List[date], cantidades: Dict[int, int]) -> bool:
+    """
+    Suma las cantidades a lo reservado de cada elemento en cada una de las fechas, con un
+    UPDATE condicional (Reservado + cantidad <= Stock). Devuelve False si alguna fila no
+    alcanzó: el llamador debe hacer rollback.
+    """
+    if not cantidades or not fechas:
+        return True
+    await _asegurar_filas(db, fechas, cantidades)
+    cantidad = case(cantidades, value=InventarioElemento.Codigo_Elemento)
+    stock = select(Elemento.Stock).where(Elemento.Codigo == InventarioElemento.Codigo_Elemento).scalar_subquery()
+    result = await db.execute(
+        update(InventarioElemento)
+        .where(
+            InventarioElemento.Codigo_Elemento.in_(cantidades),
+            InventarioElemento.Fecha.in_(fechas),
+            InventarioElemento.Reservado + cantidad <= stock,
+        )
+        .values(Reservado=InventarioElemento.Reservado + cantidad)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == len(cantidades) * len(set(fechas))
+
+async def liberar_inventario(db: AsyncSession, fecha: date, cantidades: Dict[int, int]) -> None:
+    if not cantidades:
+        return
+    await db.execute(
+        update(InventarioElemento)
+        .where(InventarioElemento.Codigo_Elemento.in_(cantidades), InventarioElemento.Fecha == fecha)
+        .values(Reservado=InventarioElemento.Reservado - case(cantidades, value=InventarioElemento.Codigo_Elemento))
+        .execution_options(synchronize_session=False)
+    )
+
+async def disponibilidad(db: AsyncSession, fecha: date, codigos: Optional[Iterable[int]] = None) -> Dict[int, Tuple[str, int, int]]:
+    """
+    {Codigo: (Nombre, Stock, Reservado)} en la fecha, para los códigos pedidos (o todos).
+    Una consulta: Elementos con un LEFT JOIN por la PK (Codigo_Elemento, Fecha) del inventario.
+    """
+    stmt = (
+        select(Elemento.Codigo, Elemento.Nombre, Elemento.Stock, func.coalesce(InventarioElemento.Reservado, 0))
+        .outerjoin(
+            InventarioElemento,
+            and_(InventarioElemento.Codigo_Elemento == Elemento.Codigo, InventarioElemento.Fecha == fecha),
+        )
+        .order_by(Elemento.Codigo)
+    )
+    if codigos is not None:
+        stmt = stmt.where(Elemento.Codigo.in_(list(codigos)))
+    result = await db.execute(stmt)
+    return {row[0]: (row[1], row[2], row[3]) for row in result.all()}
+
+async def reservado_por_fecha(db: AsyncSession, codigos: Iterable[int], fechas: List[date]) -> Dict[Tuple[int, date], int]:
+    """
+    {(Codigo, Fecha): Reservado} de las combinaciones que ya tienen fila (rango de fechas por la PK).
+    """
+    codigos = list(codigos)
+    if not codigos or not fechas:
+        return {}
+    result = await db.execute(
+        select(InventarioElemento.Codigo_Elemento, InventarioElemento.Fecha, InventarioElemento.Reservado)
+        .where(InventarioElemento.Codigo_Elemento.in_(codigos), InventarioElemento.Fecha.between(min(fechas), max(fechas)))
+    )
+    return {(row[0], row[1]): row[2] for row in result.all()}
@@ -1,67 +1,135 @@
 # app/main.py
+#
+# Fábrica de la aplicación. Importar este módulo no lee variables de entorno, no crea
+# engines ni importa los routers: todo eso ocurre en create_app() y en el lifespan.
+#
+#   uvicorn app.main:create_app --factory          # recomendado
+#   uvicorn app.main:app                           # sigue funcionando (app se crea al pedirla)
 
-from fastapi import FastAPI, Depends, HTTPException, status # Añadimos status
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.future import select # Necesario para crear tablas
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
-import os
-# --- Importar Base de modelos (necesario para la creación de tablas) ---
-from .models.models import Base
-
-# --- Importar los routers ---
-from .routers import auth
-from .routers import users 
-from .routers import reservas
-from .routers import escenarios
-from .routers import elementos
-# Cargar variables de entorno al inicio de la aplicación
-load_dotenv()
-
-# --- Configuración de la base de datos ---
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("La variable de entorno DATABASE_URL no está configurada.")
-
-engine = create_async_engine(DATABASE_URL, echo=True)
-
-# Crea una sesión de base de datos asíncrona
-AsyncSessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False
-)
-
-# Dependencia para obtener la sesión de DB
-async def get_db():
-    async with AsyncSessionLocal() as session:
-        yield session
-
-
-# --- Instancia de FastAPI ---
-app = FastAPI(
-    title="Tu API Juana",
-    description="Una API para gestionar usuarios, reservas e items.",
-    version="0.0.1",
-)
-
-# --- Evento de inicio: Crear tablas de la base de datos ---
-@app.on_event("startup")
-async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("Base de datos inicializada y tablas creadas (si no existían).")
-
-# --- Incluir los routers ---
-app.include_router(auth.router)
-app.include_router(users.router)
-#app.include_router(items.router) 
-app.include_router(reservas.router)
-app.include_router(escenarios.router)
-app.include_router(elementos.router)
-# --- Ruta raíz ---
-@app.get("/")
-async def root():
-    return {"message": "Bienvenido a la API de Juana! Visita /docs para la documentación."}
\ No newline at end of file
+
+from .settings import Settings
+
+
+# --- Precalentamiento de las cachés de catálogo (PREWARM_CATALOGS) ---
+async def _precalentar_catalogos() -> None:
+    from .database.database import async_session_maker
+    from .occupancy import occupancy_index
+    from .routers.elementos import precalentar_elementos
+    from .routers.escenarios import precalentar_escenarios
+
+    async with async_session_maker() as db:
+        await precalentar_escenarios(db)
+        await precalentar_elementos(db)
+        await occupancy_index.ensure_loaded(db) # Calendario de ocupación de /escenarios/disponibles
+
+
+# --- Ciclo de vida: arranque y cierre de la aplicación (sustituye a on_event) ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from .analytics import ANALYTICS_REFRESH_SECONDS, refrescar_periodicamente
+    from .audit import auditoria # Traslado del outbox de auditoría desde una tarea de fondo
+    from .database.database import dispose_database, init_database
+    from .database.migrations import upgrade, verify
+
+    settings: Settings = app.state.settings
+    inicio = time.perf_counter()
+    database = await init_database(settings)
+
+    # Verificar (o aplicar) la versión del esquema; el arranque no ejecuta create_all
+    if settings.schema_mode == "migrate":
+        aplicadas = await upgrade(database.engine)
+        print(f"Migraciones aplicadas al arrancar: {aplicadas or 'ninguna'}.")
+    elif settings.schema_mode == "verify":
+        version = await verify(database.engine) # Una consulta, sin DDL
+        print(f"Esquema de la base de datos en la versión {version}.")
+
+    if settings.prewarm_connections > 0:
+        abiertas = await database.prewarm(settings.prewarm_connections)
+        print(f"Conexiones precalentadas: {abiertas}.")
+    if settings.prewarm_catalogs:
+        await _precalentar_catalogos()
+
+    tareas = []
+    if database.replica_set.enabled:
+        await database.replica_set.revisar() # Estado inicial antes de enviar lecturas a las réplicas
+        tareas.append(asyncio.create_task(database.replica_set.vigilar(settings.replica_health_interval)))
+    auditoria.iniciar()
+    if ANALYTICS_REFRESH_SECONDS > 0:
+        tareas.append(asyncio.create_task(refrescar_periodicamente(ANALYTICS_REFRESH_SECONDS)))
+    app.state.startup_seconds = time.perf_counter() - inicio
+
+    try:
+        yield
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        await auditoria.detener() # Último traslado; lo que quede en el outbox lo traslada el próximo arranque
+        await dispose_database() # Cierra las conexiones de los pools
+
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """
+    Crea la aplicación con la configuración dada (por defecto, la de las variables de entorno).
+    La base de datos se crea en el lifespan, no aquí.
+    """
+    settings = settings or Settings.from_env()
+    load_dotenv() # Los routers leen su configuración (SECRET_KEY, límites, cachés) al importarse
+
+    from .metrics import METRICS_ENABLED, MetricsMiddleware, metrics_registry
+    from .nplusone import NPlusOneMiddleware, nplusone_detector
+    from .routers import admin, auth, elementos, escenarios, reservas, users
+
+    # --- Instancia de FastAPI ---
+    app = FastAPI(
+        title="Tu API Juana",
+        description="Una API para gestionar usuarios, reservas e items.",
+        version="0.0.1",
+        lifespan=lifespan,
+    )
+    app.state.settings = settings
+
+    if METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
+
+        # --- Métricas en formato de texto de Prometheus ---
+        @app.get("/metrics", include_in_schema=False)
+        async def metrics():
+            return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+    # --- Detector de N+1 (opcional, NPLUSONE_MODE=warn|raise) ---
+    if nplusone_detector.enabled:
+        app.add_middleware(NPlusOneMiddleware)
+
+    # --- Incluir los routers ---
+    app.include_router(auth.router)
+    app.include_router(users.router)
+    #app.include_router(items.router)
+    app.include_router(reservas.router)
+    app.include_router(escenarios.router)
+    app.include_router(elementos.router)
+    app.include_router(admin.router)
+
+    # --- Ruta raíz ---
+    @app.get("/")
+    async def root():
+        return {"message": "Bienvenido a la API de Juana! Visita /docs para la documentación."}
+
+    return app
+
+
+# --- app a nivel de módulo, creada la primera vez que se pide (uvicorn app.main:app) ---
+def __getattr__(name: str):
+    if name == "app":
+        app = create_app()
+        globals()["app"] = app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,209 @@
+# app/metrics.py
+
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+# --- Configuración ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").strip().lower() in ("1", "true", "yes", "si", "on")
+# Umbral (ms) a partir del cual se registra la petición junto con su SQL. 0 = desactivado.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_MAX_STATEMENTS = 50
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_logger = logging.getLogger("app.slow_requests")
+
+
+class RequestStats:
+    """
+    Contadores de una sola petición. Se guarda en un ContextVar para que los eventos del
+    engine, el pool y el pool de bcrypt sumen a la petición que los originó.
+    """
+    __slots__ = ("db_queries", "db_time", "pool_wait", "bcrypt_time", "statements")
+
+    def __init__(self, capture_sql: bool = False):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        self.bcrypt_time = 0.0
+        self.statements: Optional[List[Tuple[float, str]]] = [] if capture_sql else None
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _current_request.get()
+
+def record_pool_wait(seconds: float) -> None:
+    stats = _current_request.get()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+def record_bcrypt_time(seconds: float) -> None:
+    stats = _current_request.get()
+    if stats is not None:
+        stats.bcrypt_time += seconds
+
+
+# --- Eventos del engine: número de consultas y tiempo en la DB por petición ---
+def instrument_engine(sync_engine) -> None:
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        stats = _current_request.get()
+        if stats is None:
+            return
+        stats.db_queries += 1
+        stats.db_time += elapsed
+        if stats.statements is not None and len(stats.statements) < SLOW_REQUEST_MAX_STATEMENTS:
+            stats.statements.append((elapsed, statement))
+
+
+# --- Registro en memoria con formato de exposición de Prometheus ---
+class _Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, limite in enumerate(LATENCY_BUCKETS):
+            if value <= limite:
+                self.buckets[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collectors: List[Callable[[], List[Tuple[str, str, str, float]]]] = []
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency: Dict[Tuple[str, str], _Histogram] = {}
+            self.requests: Dict[Tuple[str, str, int], int] = {}
+            self.db_queries: Dict[Tuple[str, str], int] = {}
+            self.db_time: Dict[Tuple[str, str], float] = {}
+            self.pool_wait: Dict[Tuple[str, str], float] = {}
+            self.bcrypt_time: Dict[Tuple[str, str], float] = {}
+
+    def register_collector(self, collector: Callable[[], List[Tuple[str, str, str, float]]]) -> None:
+        """
+        collector() devuelve [(nombre, ayuda, tipo, valor)] con métricas globales (pool, bcrypt...).
+        """
+        self._collectors.append(collector)
+
+    def observe_request(self, method: str, route: str, status_code: int, elapsed: float, stats: RequestStats) -> None:
+        key = (method, route)
+        with self._lock:
+            self.latency.setdefault(key, _Histogram()).observe(elapsed)
+            self.requests[(method, route, status_code)] = self.requests.get((method, route, status_code), 0) + 1
+            self.db_queries[key] = self.db_queries.get(key, 0) + stats.db_queries
+            self.db_time[key] = self.db_time.get(key, 0.0) + stats.db_time
+            self.pool_wait[key] = self.pool_wait.get(key, 0.0) + stats.pool_wait
+            self.bcrypt_time[key] = self.bcrypt_time.get(key, 0.0) + stats.bcrypt_time
+
+    def render(self) -> str:
+        lineas: List[str] = []
+
+        def _labels(method: str, route: str, **extra) -> str:
+            pares = [("method", method), ("route", route)] + list(extra.items())
+            return ",".join(f'{k}="{_escape(str(v))}"' for k, v in pares)
+
+        with self._lock:
+            lineas.append("# HELP http_request_duration_seconds Latencia de las peticiones HTTP por ruta.")
+            lineas.append("# TYPE http_request_duration_seconds histogram")
+            for (method, route), hist in sorted(self.latency.items()):
+                for limite, valor in zip(LATENCY_BUCKETS, hist.buckets):
+                    lineas.append(f'http_request_duration_seconds_bucket{{{_labels(method, route, le=limite)}}} {valor}')
+                lineas.append(f'http_request_duration_seconds_bucket{{{_labels(method, route, le="+Inf")}}} {hist.count}')
+                lineas.append(f'http_request_duration_seconds_sum{{{_labels(method, route)}}} {hist.sum:.6f}')
+                lineas.append(f'http_request_duration_seconds_count{{{_labels(method, route)}}} {hist.count}')
+
+            lineas.append("# HELP http_requests_total Peticiones HTTP por ruta y código de estado.")
+            lineas.append("# TYPE http_requests_total counter")
+            for (method, route, status_code), valor in sorted(self.requests.items()):
+                lineas.append(f'http_requests_total{{{_labels(method, route, status=status_code)}}} {valor}')
+
+            for nombre, ayuda, datos in (
+                ("http_request_db_queries_total", "Consultas SQL ejecutadas, por ruta.", self.db_queries),
+                ("http_request_db_seconds_total", "Tiempo total en la base de datos, por ruta.", self.db_time),
+                ("http_request_pool_wait_seconds_total", "Tiempo esperando conexión del pool, por ruta.", self.pool_wait),
+                ("http_request_bcrypt_seconds_total", "Tiempo de hashing bcrypt, por ruta.", self.bcrypt_time),
+            ):
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} counter")
+                for (method, route), valor in sorted(datos.items()):
+                    lineas.append(f'{nombre}{{{_labels(method, route)}}} {round(valor, 6)}')
+
+        for collector in self._collectors:
+            for nombre, ayuda, tipo, valor in collector():
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+                lineas.append(f"{nombre} {round(valor, 6) if isinstance(valor, float) else valor}")
+
+        return "\n".join(lineas) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics_registry = MetricsRegistry()
+
+
+# --- Middleware ASGI ---
+class MetricsMiddleware:
+    """
+    Mide cada petición HTTP (latencia, consultas y tiempo de DB, espera del pool y bcrypt)
+    y, si supera SLOW_REQUEST_MS, la registra con el SQL capturado.
+    """
+    def __init__(self, app, registry: MetricsRegistry = metrics_registry, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.registry = registry
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(capture_sql=self.slow_request_ms > 0)
+        token = _current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_request.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "sin_ruta" # Plantilla, no la URL concreta
+            self.registry.observe_request(scope["method"], route, status_code, elapsed, stats)
+            if self.slow_request_ms > 0 and elapsed * 1000 >= self.slow_request_ms:
+                sql = "\n".join(f"  [{t * 1000:.1f} ms] {stmt}" for t, stmt in stats.statements or [])
+                slow_logger.warning(
+                    "Petición lenta %s %s: %.1f ms, %d consultas (%.1f ms DB, %.1f ms espera pool, %.1f ms bcrypt)\n%s",
+                    scope["method"], route, elapsed * 1000, stats.db_queries, stats.db_time * 1000,
+                    stats.pool_wait * 1000, stats.bcrypt_time * 1000, sql,
+                )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Date, UniqueConstraint, Index, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, date 
@@ -24,6 +24,8 @@ class User(Base):
     bloqueado = Column(Boolean, default=False)
     fecha_creacion = Column(DateTime, default=datetime.utcnow)
     ultimo_login = Column(DateTime, nullable=True)
+    # Se incrementa cuando cambian rango/bloqueo: invalida los tokens emitidos antes
+    token_version = Column(Integer, default=0, nullable=False, server_default="0")
 
     # ¡ASEGÚRATE DE QUE ESTA LÍNEA ESTÉ PRESENTE Y CORRECTA!
     reservas = relationship("Reserva", back_populates="usuario") # <--- ¡ESTA ES LA LÍNEA QUE FALTA O ESTÁ MAL!
@@ -33,6 +35,10 @@ class User(Base):
 
 class Escenario(Base):
     __tablename__ = "Escenario" # Basado en tu imagen
+    # Búsqueda de escenarios disponibles: filtros por Activo, Capacidad mínima y Precio máximo
+    __table_args__ = (
+        Index("ix_escenario_activo_capacidad_precio", "Activo", "Capacidad", "Precio"),
+    )
 
     ID_Escenario = Column(Integer, primary_key=True, index=True)
     Direccion = Column(String(255))
@@ -64,6 +70,10 @@ class Elemento(Base):
 # --- NUEVO MODELO: Tabla Intermedia para la relación N:M ---
 class ReservaElemento(Base):
     __tablename__ = "Reservas_Elementos" # Según tu imagen
+    # La PK empieza por ID_Reserva: las búsquedas por elemento necesitan su propio índice
+    __table_args__ = (
+        Index("ix_reservas_elementos_codigo", "Codigo_Elemento"),
+    )
 
     # Claves primarias compuestas
     ID_Reserva = Column(Integer, ForeignKey("Reservas.ID_Reserva"), primary_key=True)
@@ -77,10 +87,26 @@ class ReservaElemento(Base):
     def __repr__(self):
         return f"<ReservaElemento(ID_Reserva={self.ID_Reserva}, Codigo_Elemento={self.Codigo_Elemento}, Cantidad={self.Cantidad})>"
 
+# --- Inventario por fecha: unidades de cada elemento comprometidas en cada día (ver app/inventory.py) ---
+class InventarioElemento(Base):
+    __tablename__ = "Inventario_Elementos"
+
+    # CASCADE: las filas en cero que dejan las cancelaciones no impiden borrar el elemento
+    Codigo_Elemento = Column(Integer, ForeignKey("Elementos.Codigo", ondelete="CASCADE"), primary_key=True)
+    Fecha = Column(Date, primary_key=True)
+    Reservado = Column(Integer, nullable=False, default=0) # Nunca mayor que Elementos.Stock al reservar
+
 
 # --- ACTUALIZACIÓN DEL MODELO: Reserva ---
 class Reserva(Base):
     __tablename__ = "Reservas"
+    # Un escenario solo puede reservarse una vez por fecha (lo garantiza la DB, no un SELECT previo)
+    __table_args__ = (
+        UniqueConstraint("ID_Escenario", "Fecha", name="uq_reserva_escenario_fecha"),
+        Index("ix_reservas_correo_usuario", "Correo_Usuario"), # /reservas/me
+        # Cubre las analíticas por rango de fechas sin leer la fila (ver app/analytics.py)
+        Index("ix_reservas_fecha_escenario_total", "Fecha", "ID_Escenario", "Precio_Total"),
+    )
 
     ID_Reserva = Column(Integer, primary_key=True, index=True)
     Correo_Usuario = Column(String(255), ForeignKey("Usuarios.correo"))
@@ -91,6 +117,8 @@ class Reserva(Base):
     ID_Escenario = Column(Integer, ForeignKey("Escenario.ID_Escenario"))
     Estado = Column(String(50), default="Pendiente")
     Fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    # Precio del escenario + elementos, mantenido por las rutas de escritura (ver app/pricing.py)
+    Precio_Total = Column(Integer, nullable=True)
 
     usuario = relationship("User", back_populates="reservas")
     escenario = relationship("Escenario", back_populates="reservas")
@@ -98,4 +126,58 @@ class Reserva(Base):
     reservas_elementos = relationship("ReservaElemento", back_populates="reserva")
 
     def __repr__(self):
-        return f"<Reserva(ID_Reserva={self.ID_Reserva}, Correo_Usuario='{self.Correo_Usuario}')>"
\ No newline at end of file
+        return f"<Reserva(ID_Reserva={self.ID_Reserva}, Correo_Usuario='{self.Correo_Usuario}')>"
+
+# --- Tablas de resumen para analíticas (se recalculan por mes, ver app/analytics.py) ---
+class ResumenMensualEscenario(Base):
+    __tablename__ = "Resumen_Mensual_Escenario"
+
+    ID_Escenario = Column(Integer, ForeignKey("Escenario.ID_Escenario"), primary_key=True)
+    Periodo = Column(Integer, primary_key=True) # AAAAMM
+    Reservas = Column(Integer, nullable=False)
+    Ingresos = Column(Integer, nullable=False)
+    Actualizado = Column(DateTime, default=datetime.utcnow)
+
+
+class ResumenMensualElemento(Base):
+    __tablename__ = "Resumen_Mensual_Elemento"
+
+    Codigo_Elemento = Column(Integer, ForeignKey("Elementos.Codigo"), primary_key=True)
+    Periodo = Column(Integer, primary_key=True) # AAAAMM
+    Reservas = Column(Integer, nullable=False)
+    Cantidad = Column(Integer, nullable=False)
+    Ingresos = Column(Integer, nullable=False)
+    Actualizado = Column(DateTime, default=datetime.utcnow)
+
+
+# --- Auditoría (la escribe app/audit.py en lotes, ya no los triggers de sqldb.sql) ---
+class AuditoriaReserva(Base):
+    __tablename__ = "AuditoriaReservas"
+
+    ID_Auditoria = Column(Integer, primary_key=True, autoincrement=True)
+    ID_Reserva = Column(Integer, nullable=True) # Sin FK: el registro sobrevive al borrado de la reserva
+    Accion = Column(String(10))
+    Usuario = Column(String(255)) # Correo de quien hizo el cambio
+    Fecha = Column(DateTime, default=datetime.utcnow) # Instante del cambio, no de la escritura del lote
+    Datos_anteriores = Column(Text, nullable=True)
+    Entidad = Column(String(20), nullable=True) # "Reserva" o "Usuario"
+    Referencia = Column(String(255), nullable=True) # Correo del usuario afectado (eventos de Usuario)
+    Datos_nuevos = Column(Text, nullable=True)
+
+
+class AuditoriaOutbox(Base):
+    """
+    Eventos de auditoría escritos en la misma transacción que el cambio auditado. El
+    proceso de auditoría los mueve a AuditoriaReservas en lotes (ver app/audit.py).
+    """
+    __tablename__ = "Auditoria_Outbox"
+
+    ID_Outbox = Column(Integer, primary_key=True, autoincrement=True)
+    ID_Reserva = Column(Integer, nullable=True)
+    Accion = Column(String(10))
+    Usuario = Column(String(255))
+    Fecha = Column(DateTime, default=datetime.utcnow)
+    Datos_anteriores = Column(Text, nullable=True)
+    Entidad = Column(String(20), nullable=True)
+    Referencia = Column(String(255), nullable=True)
+    Datos_nuevos = Column(Text, nullable=True)
@@ -0,0 +1,180 @@
+# app/nplusone.py
+
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import re
+import threading
+
+from sqlalchemy import event
+
+# --- Configuración del detector de N+1 (solo desarrollo y pruebas) ---
+# NPLUSONE_MODE: "off" (por defecto), "warn" (log) o "raise" (la petición responde 500 con el detalle).
+NPLUSONE_MODE = os.getenv("NPLUSONE_MODE", "off").strip().lower()
+NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE_THRESHOLD", "5")) # Repeticiones permitidas de una misma forma de SQL
+
+logger = logging.getLogger("app.nplusone")
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Forma de la sentencia sin literales ni listas IN expandidas: dos consultas con la
+    misma forma solo difieren en sus parámetros.
+    """
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    return _PLACEHOLDER_LIST.sub("(?)", sql)
+
+
+class NPlusOneError(AssertionError):
+    """
+    Algún endpoint repitió la misma forma de SQL más de NPLUSONE_THRESHOLD veces (ver assert_clean).
+    """
+
+
+class NPlusOneDetector:
+    """
+    Agrupa las sentencias de cada petición por su forma normalizada y guarda, por endpoint,
+    el peor número de repeticiones observado para cada forma que superó el umbral.
+    """
+    def __init__(self, mode: str = NPLUSONE_MODE, threshold: int = NPLUSONE_THRESHOLD):
+        self.mode = mode
+        self.threshold = threshold
+        self._current: ContextVar[Optional[Counter]] = ContextVar("nplusone_statements", default=None)
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("warn", "raise")
+
+    def reset(self):
+        with self._lock:
+            self._requests: Dict[str, int] = {}
+            self._offenders: Dict[str, Dict[str, int]] = {}
+
+    def instrument_engine(self, sync_engine) -> None:
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            shapes = self._current.get()
+            if shapes is not None:
+                shapes[normalize_sql(statement)] += 1
+
+    def start_request(self):
+        return self._current.set(Counter())
+
+    def current_offenders(self) -> Dict[str, int]:
+        # Formas que ya superaron el umbral en la petición en curso (sin cerrarla)
+        shapes = self._current.get()
+        return {sql: n for sql, n in (shapes or {}).items() if n > self.threshold}
+
+    def finish_request(self, token, endpoint: str) -> Dict[str, int]:
+        shapes = self._current.get()
+        self._current.reset(token)
+        offenders = {sql: n for sql, n in (shapes or {}).items() if n > self.threshold}
+        with self._lock:
+            self._requests[endpoint] = self._requests.get(endpoint, 0) + 1
+            if offenders:
+                peores = self._offenders.setdefault(endpoint, {})
+                for sql, n in offenders.items():
+                    peores[sql] = max(peores.get(sql, 0), n)
+        return offenders
+
+    def report(self) -> Dict[str, dict]:
+        """
+        {endpoint: {"requests": n, "offenders": [{"sql": ..., "max_repeats": n}]}} solo con
+        los endpoints que superaron el umbral (vacío = sin N+1). Pensado para usarse en las pruebas.
+        """
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": self._requests.get(endpoint, 0),
+                    "offenders": [
+                        {"sql": sql, "max_repeats": n}
+                        for sql, n in sorted(peores.items(), key=lambda item: -item[1])
+                    ],
+                }
+                for endpoint, peores in sorted(self._offenders.items())
+            }
+
+    def assert_clean(self) -> None:
+        """
+        Puerta para las pruebas: lanza NPlusOneError con el informe si algún endpoint superó el umbral.
+        """
+        informe = self.report()
+        if informe:
+            lineas = [
+                f"{endpoint}: {o['max_repeats']}x {o['sql']}"
+                for endpoint, datos in informe.items() for o in datos["offenders"]
+            ]
+            raise NPlusOneError(f"Posibles N+1 (umbral {self.threshold}):\n" + "\n".join(lineas))
+
+
+nplusone_detector = NPlusOneDetector()
+
+
+# --- Middleware ASGI ---
+# En modo "raise" el detector se consulta al empezar la respuesta (http.response.start):
+# si la petición ya tiene un N+1, el cliente recibe un 500 con el detalle en lugar de la
+# respuesta del endpoint. Las consultas hechas después (respuestas en streaming) ya no
+# pueden cambiar el estado: se registran en report() y en el log.
+def _endpoint(scope) -> str:
+    route = getattr(scope.get("route"), "path", None) or "sin_ruta"
+    return f'{scope["method"]} {route}'
+
+class NPlusOneMiddleware:
+    def __init__(self, app, detector: NPlusOneDetector = nplusone_detector):
+        self.app = app
+        self.detector = detector
+
+    def _mensaje(self, endpoint: str, offenders: Dict[str, int]) -> str:
+        detalle = "\n".join(f"  {n}x {sql}" for sql, n in sorted(offenders.items(), key=lambda item: -item[1]))
+        return f"Posible N+1 en {endpoint} (umbral {self.detector.threshold}):\n{detalle}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rechazada = False
+
+        async def _send(message):
+            nonlocal rechazada
+            if rechazada:
+                return # Se descarta el resto de la respuesta original
+            if message["type"] == "http.response.start" and self.detector.mode == "raise":
+                offenders = self.detector.current_offenders()
+                if offenders:
+                    rechazada = True
+                    body = json.dumps({"detail": self._mensaje(_endpoint(scope), offenders)}, ensure_ascii=False).encode()
+                    await send({
+                        "type": "http.response.start",
+                        "status": 500,
+                        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+                    })
+                    await send({"type": "http.response.body", "body": body})
+                    return
+            await send(message)
+
+        token = self.detector.start_request()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            endpoint = _endpoint(scope)
+            offenders = self.detector.finish_request(token, endpoint)
+
+        if offenders:
+            mensaje = self._mensaje(endpoint, offenders)
+            if self.detector.mode == "raise":
+                logger.error(mensaje)
+            else:
+                logger.warning(mensaje)
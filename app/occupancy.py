@@ -0,0 +1,126 @@
+# app/occupancy.py
+
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, timedelta
+from typing import Dict, List, Set, Tuple
+import asyncio
+import os
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .models.models import Reserva
+
+# Segundos tras los cuales el índice se recarga desde la DB (recoge reservas hechas por
+# otros workers de uvicorn). 0 = no recargar nunca.
+OCCUPANCY_INDEX_MAX_AGE = float(os.getenv("OCCUPANCY_INDEX_MAX_AGE", "300"))
+
+
+class OccupancyIndex:
+    """
+    Índice en memoria de las fechas ocupadas por escenario.
+
+    Por cada escenario guarda una lista ordenada de fechas (como ordinales) y el conjunto
+    de pares (escenario, fecha) ocupados, de modo que un rango de fechas se resuelve con
+    dos bisect. Se carga una vez desde Reservas y se mantiene con add()/remove() en cada
+    alta o cancelación. Como (ID_Escenario, Fecha) es único en Reservas, add()/remove()
+    son idempotentes: reaplicar un cambio que la carga ya vio no lo cuenta dos veces.
+    """
+    def __init__(self, max_age: float = OCCUPANCY_INDEX_MAX_AGE):
+        self.max_age = max_age
+        self._fechas: Dict[int, List[int]] = {}
+        self._ocupadas: Set[Tuple[int, int]] = set()
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+        self._pending: List[Tuple[str, int, int]] | None = None
+
+    # --- Carga ---
+    def _is_fresh(self) -> bool:
+        if self._loaded_at is None:
+            return False
+        return self.max_age <= 0 or (time.monotonic() - self._loaded_at) < self.max_age
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            await self._load(db)
+
+    async def _load(self, db: AsyncSession) -> None:
+        # Las altas/bajas que lleguen mientras se ejecuta la consulta se aplican al final;
+        # la consulta puede haberlas visto ya, por eso _apply es idempotente
+        self._pending = []
+        try:
+            result = await db.execute(select(Reserva.ID_Escenario, Reserva.Fecha))
+            fechas: Dict[int, List[int]] = {}
+            ocupadas: Set[Tuple[int, int]] = set()
+            for escenario_id, fecha in result.all():
+                if escenario_id is None or fecha is None:
+                    continue
+                key = (escenario_id, fecha.toordinal())
+                if key not in ocupadas:
+                    fechas.setdefault(escenario_id, []).append(key[1])
+                    ocupadas.add(key)
+            for ordinales in fechas.values():
+                ordinales.sort()
+
+            self._fechas, self._ocupadas = fechas, ocupadas
+            pending, self._pending = self._pending, None
+            for op, escenario_id, ordinal in pending:
+                self._apply(op, escenario_id, ordinal)
+            self._loaded_at = time.monotonic()
+        finally:
+            self._pending = None
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    # --- Mantenimiento incremental ---
+    def _apply(self, op: str, escenario_id: int, ordinal: int) -> None:
+        key = (escenario_id, ordinal)
+        if op == "add":
+            if key not in self._ocupadas:
+                self._ocupadas.add(key)
+                insort(self._fechas.setdefault(escenario_id, []), ordinal)
+        elif key in self._ocupadas:
+            self._ocupadas.discard(key)
+            ordinales = self._fechas[escenario_id]
+            del ordinales[bisect_left(ordinales, ordinal)]
+
+    def _record(self, op: str, escenario_id: int, fecha: date) -> None:
+        if self._pending is not None:
+            self._pending.append((op, escenario_id, fecha.toordinal()))
+        elif self._loaded_at is not None:
+            self._apply(op, escenario_id, fecha.toordinal())
+
+    def add(self, escenario_id: int, fecha: date) -> None:
+        self._record("add", escenario_id, fecha)
+
+    def remove(self, escenario_id: int, fecha: date) -> None:
+        self._record("remove", escenario_id, fecha)
+
+    # --- Consultas ---
+    def is_occupied(self, escenario_id: int, fecha: date) -> bool:
+        return (escenario_id, fecha.toordinal()) in self._ocupadas
+
+    def occupied_between(self, escenario_id: int, desde: date, hasta: date) -> List[date]:
+        ordinales = self._fechas.get(escenario_id, [])
+        lo = bisect_left(ordinales, desde.toordinal())
+        hi = bisect_right(ordinales, hasta.toordinal())
+        return [date.fromordinal(o) for o in ordinales[lo:hi]]
+
+    def calendar(self, escenario_id: int, desde: date, hasta: date) -> Tuple[List[date], List[date]]:
+        """
+        Devuelve (ocupadas, disponibles) para el rango [desde, hasta].
+        """
+        ocupadas = self.occupied_between(escenario_id, desde, hasta)
+        ocupadas_set = set(ocupadas)
+        dias = (hasta - desde).days + 1
+        disponibles = [d for d in (desde + timedelta(days=i) for i in range(dias)) if d not in ocupadas_set]
+        return ocupadas, disponibles
+
+
+occupancy_index = OccupancyIndex()
@@ -0,0 +1,102 @@
+# app/pagination.py
+
+from fastapi import HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_
+from typing import Any, List, Optional, Sequence, Tuple
+import base64
+import json
+
+# --- Paginación por cursor (keyset) ---
+# En lugar de OFFSET (MariaDB lee y descarta 'skip' filas), se filtra por
+# "clave primaria > última clave vista", que usa el índice de la PK directamente.
+# El cursor es opaco para el cliente: JSON con la última clave, en base64 url-safe.
+
+MAX_PAGE_SIZE = 1000
+
+def page_limit(default: int = 100):
+    """
+    Dependencia para el parámetro ?limit= de los listados. Un limit mayor que MAX_PAGE_SIZE
+    se recorta en silencio en vez de responder 422: los clientes que antes pedían páginas
+    más grandes siguen funcionando y reciben como máximo MAX_PAGE_SIZE filas (con cursor,
+    next_cursor indica que hay más).
+    """
+    def _limit(limit: int = Query(default, ge=1, description=f"Filas por página (máximo {MAX_PAGE_SIZE}; los valores mayores se recortan)")) -> int:
+        return min(limit, MAX_PAGE_SIZE)
+    return _limit
+
+def encode_cursor(last_key: Any) -> str:
+    raw = json.dumps({"k": last_key}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Any:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))["k"]
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido.")
+
+async def keyset_page(db: AsyncSession, stmt, key_column, cursor: Optional[str], limit: int, mappings: bool = False) -> Tuple[List[Any], Optional[str]]:
+    """
+    Ejecuta stmt ordenado por key_column a partir del cursor.
+    Devuelve (filas, next_cursor); next_cursor es None en la última página.
+    Un cursor vacío ("") pide la primera página.
+    Con mappings=True stmt es un select() de columnas y las filas se devuelven como dicts.
+    """
+    if cursor:
+        stmt = stmt.where(key_column > decode_cursor(cursor))
+    result = await db.execute(stmt.order_by(key_column).limit(limit + 1))
+    if mappings:
+        rows = [dict(row) for row in result.mappings()]
+    else:
+        rows = list(result.scalars().unique().all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        ultima = rows[-1][key_column.key] if mappings else getattr(rows[-1], key_column.key)
+        next_cursor = encode_cursor(ultima)
+    return rows, next_cursor
+
+async def keyset_page_ordered(db: AsyncSession, stmt, key_columns: Sequence, cursor: Optional[str], limit: int, descending: bool = False) -> Tuple[List[Any], Optional[str]]:
+    """
+    Como keyset_page, pero ordenando por varias columnas (la última debe ser única,
+    normalmente la PK), p. ej. (Precio, ID_Escenario). El cursor guarda los valores de
+    todas ellas y la condición se expande a (a > x) OR (a = x AND b > y), que MariaDB
+    resuelve con el índice mejor que una comparación de tuplas.
+
+    Las columnas que admiten NULL ordenan los NULL al final en ambos sentidos (con
+    "col IS NULL" como primera clave: MariaDB no tiene NULLS LAST) y el cursor los
+    recorre con ramas IS NULL, porque "col > NULL" nunca es cierto y las filas con
+    NULL se perderían o repetirían entre páginas.
+    """
+    if cursor:
+        valores = decode_cursor(cursor)
+        if not isinstance(valores, list) or len(valores) != len(key_columns):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido.")
+        condiciones = []
+        iguales = []
+        for columna, valor in zip(key_columns, valores):
+            if valor is None:
+                # Dentro del grupo de NULL (el último) solo desempatan las columnas siguientes
+                iguales.append(columna.is_(None))
+                continue
+            siguiente = columna < valor if descending else columna > valor
+            if columna.nullable:
+                siguiente = or_(siguiente, columna.is_(None))
+            condiciones.append(and_(*iguales, siguiente))
+            iguales.append(columna == valor)
+        stmt = stmt.where(or_(*condiciones))
+    orden = []
+    for columna in key_columns:
+        if columna.nullable:
+            orden.append(columna.is_(None)) # NULL al final
+        orden.append(columna.desc() if descending else columna)
+    result = await db.execute(stmt.order_by(*orden).limit(limit + 1))
+    rows = list(result.scalars().unique().all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], c.key) for c in key_columns])
+    return rows, next_cursor
@@ -0,0 +1,175 @@
+# app/pricing.py
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, inspect, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Dict, Iterable, List
+import os
+
+from .models.models import Reserva, Escenario, Elemento, ReservaElemento
+
+# Reservas revisadas por transacción en la reconciliación de Precio_Total
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "5000"))
+
+
+# --- Motor de precios en lote ---
+# Precio_Total (precio del escenario + precio * cantidad de cada elemento) se guarda en
+# Reservas y lo mantienen las rutas de escritura sumando el delta de cada cambio. Lo de
+# abajo solo se usa para filas sin total persistido (anteriores a la columna) y para la
+# reconciliación: si las relaciones ya vienen cargadas se calcula en memoria; si no, con
+# UNA sola consulta agregada.
+
+def _relaciones_cargadas(reserva: Reserva) -> bool:
+    """
+    Indica si la reserva tiene el escenario y los elementos ya cargados en memoria.
+    """
+    estado = inspect(reserva)
+    if "escenario" in estado.unloaded or "reservas_elementos" in estado.unloaded:
+        return False
+    return all("elemento" not in inspect(res_elem).unloaded for res_elem in reserva.reservas_elementos)
+
+
+def _precio_en_memoria(reserva: Reserva) -> int:
+    if reserva.escenario is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Escenario asociado no encontrado.")
+
+    total_price = reserva.escenario.Precio
+    for res_elem in reserva.reservas_elementos:
+        if res_elem.elemento is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Elemento con código {res_elem.Codigo_Elemento} no encontrado.")
+        total_price += res_elem.elemento.Precio * res_elem.Cantidad
+    return total_price
+
+
+def total_prices_query(reserva_ids: Iterable[int]):
+    """
+    SELECT agregado (ID_Reserva, Precio_Total) sobre Reservas, Escenario,
+    Reservas_Elementos y Elementos para los IDs indicados.
+    """
+    precio_elementos = func.coalesce(func.sum(Elemento.Precio * ReservaElemento.Cantidad), 0)
+    return (
+        select(Reserva.ID_Reserva, (Escenario.Precio + precio_elementos).label("Precio_Total"))
+        .join(Escenario, Escenario.ID_Escenario == Reserva.ID_Escenario)
+        .outerjoin(ReservaElemento, ReservaElemento.ID_Reserva == Reserva.ID_Reserva)
+        .outerjoin(Elemento, Elemento.Codigo == ReservaElemento.Codigo_Elemento)
+        .where(Reserva.ID_Reserva.in_(list(reserva_ids)))
+        .group_by(Reserva.ID_Reserva, Escenario.Precio)
+    )
+
+
+def _precio_elementos_subquery():
+    return (
+        select(func.sum(Elemento.Precio * ReservaElemento.Cantidad))
+        .select_from(ReservaElemento)
+        .join(Elemento, Elemento.Codigo == ReservaElemento.Codigo_Elemento)
+        .where(ReservaElemento.ID_Reserva == Reserva.ID_Reserva)
+        .correlate(Reserva)
+        .scalar_subquery()
+    )
+
+
+def precio_total_expr():
+    """
+    Expresión SQL del Precio_Total de cada fila de Reservas (requiere JOIN con Escenario).
+    Usa el total persistido y, si falta, una subconsulta correlacionada por ID_Reserva,
+    que aprovecha la PK de Reservas_Elementos y permite recorrer Reservas en streaming.
+    """
+    calculado = Escenario.Precio + func.coalesce(_precio_elementos_subquery(), 0)
+    return func.coalesce(Reserva.Precio_Total, calculado).label("Precio_Total")
+
+
+def precio_calculado_expr():
+    """
+    Precio_Total recalculado desde cero para cada fila de Reservas, sin JOIN (válido en un UPDATE).
+    """
+    precio_escenario = (
+        select(Escenario.Precio)
+        .where(Escenario.ID_Escenario == Reserva.ID_Escenario)
+        .correlate(Reserva)
+        .scalar_subquery()
+    )
+    return precio_escenario + func.coalesce(_precio_elementos_subquery(), 0)
+
+
+async def calculate_total_prices(reservas: Iterable[Reserva], db: AsyncSession) -> Dict[int, int]:
+    """
+    Devuelve {ID_Reserva: Precio_Total} para todas las reservas recibidas.
+    """
+    precios: Dict[int, int] = {}
+    pendientes: List[int] = []
+
+    for reserva in reservas:
+        if _relaciones_cargadas(reserva):
+            precios[reserva.ID_Reserva] = _precio_en_memoria(reserva)
+        else:
+            pendientes.append(reserva.ID_Reserva)
+
+    if pendientes:
+        result = await db.execute(total_prices_query(pendientes))
+        for reserva_id, total in result.all():
+            precios[reserva_id] = int(total)
+
+        faltantes = [reserva_id for reserva_id in pendientes if reserva_id not in precios]
+        if faltantes:
+            # Esto no debería pasar si la FK es válida
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Escenario asociado no encontrado.")
+
+    return precios
+
+
+async def assign_total_prices(reservas: Iterable[Reserva], db: AsyncSession) -> None:
+    """
+    Completa Precio_Total en las reservas que aún no lo tienen persistido. Se asigna como
+    valor ya confirmado, así que una lectura nunca termina generando un UPDATE.
+    """
+    pendientes = [reserva for reserva in reservas if reserva.Precio_Total is None]
+    if not pendientes:
+        return
+    precios = await calculate_total_prices(pendientes, db)
+    for reserva in pendientes:
+        set_committed_value(reserva, "Precio_Total", precios[reserva.ID_Reserva])
+
+
+# --- Mantenimiento incremental ante cambios de precio del catálogo ---
+async def propagar_precio_escenario(db: AsyncSession, escenario_id: int, delta: int) -> None:
+    """
+    Suma delta al Precio_Total de las reservas del escenario (dentro de la transacción del llamador).
+    """
+    if delta:
+        await db.execute(
+            update(Reserva)
+            .where(Reserva.ID_Escenario == escenario_id, Reserva.Precio_Total.is_not(None))
+            .values(Precio_Total=Reserva.Precio_Total + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+
+# --- Reconciliación (admin): recalcula y corrige la deriva en bloque ---
+async def reconcile_total_prices(db: AsyncSession, batch_size: int = RECONCILE_BATCH_SIZE) -> dict:
+    """
+    Recorre Reservas por rangos de ID_Reserva y, con un UPDATE por rango, reescribe el
+    Precio_Total de las filas cuyo valor persistido falta o no coincide con el calculado.
+    Cada rango es su propia transacción para no bloquear la tabla entera.
+    """
+    minimo, maximo = (await db.execute(select(func.min(Reserva.ID_Reserva), func.max(Reserva.ID_Reserva)))).one()
+    corregidas = lotes = 0
+    if minimo is None:
+        return {"lotes": 0, "corregidas": 0}
+
+    for inicio in range(minimo, maximo + 1, batch_size):
+        calculado = precio_calculado_expr()
+        result = await db.execute(
+            update(Reserva)
+            .where(
+                Reserva.ID_Reserva.between(inicio, inicio + batch_size - 1),
+                or_(Reserva.Precio_Total.is_(None), Reserva.Precio_Total != calculado),
+            )
+            .values(Precio_Total=calculado)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        corregidas += result.rowcount
+        lotes += 1
+    return {"lotes": lotes, "corregidas": corregidas}
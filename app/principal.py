@@ -0,0 +1,126 @@
+# app/principal.py
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+import os
+import threading
+import time
+
+from .cache import CATALOG_CACHE_BACKEND, CATALOG_CACHE_URL, RedisCacheBackend
+
+# --- Configuración de la caché de principals ---
+# Cada worker guarda los principals en su memoria durante PRINCIPAL_CACHE_TTL segundos.
+# Al bloquear o cambiar el rango de un usuario, invalidate() lo borra del worker actual y,
+# con PRINCIPAL_REVOCATION_BACKEND=redis, incrementa un contador compartido que los demás
+# workers comparan en cada petición (un GET a Redis, sin tocar Usuarios). Con "memory"
+# (por defecto si la caché de catálogo no es Redis) los otros workers pueden seguir usando
+# los permisos anteriores hasta PRINCIPAL_CACHE_TTL segundos: bajar el TTL acorta esa ventana.
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60")) # segundos
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_REVOCATION_BACKEND = os.getenv("PRINCIPAL_REVOCATION_BACKEND", CATALOG_CACHE_BACKEND).strip().lower()
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Identidad mínima del usuario autenticado: lo que necesitan la mayoría de endpoints
+    (correo y rango) sin cargar la fila completa de Usuarios.
+    """
+    correo: str
+    rango: str
+    bloqueado: bool
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            correo=user.correo,
+            rango=user.rango,
+            bloqueado=bool(user.bloqueado),
+            token_version=user.token_version or 0,
+        )
+
+
+class PrincipalCache:
+    """
+    Caché LRU con TTL, en memoria del proceso, indexada por correo.
+    Se invalida explícitamente cuando cambia el rango, el bloqueo o la versión del token.
+    Con un backend de revocaciones compartido (get_counter/incr, ver app/cache.py) la
+    invalidación llega también a los demás workers.
+    """
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL, revocaciones=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.revocaciones = revocaciones
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revocados = 0 # Entradas descartadas por una invalidación de otro worker
+
+    async def generacion(self, correo: str) -> int:
+        """
+        Contador de revocaciones del usuario. Se lee antes de cargar la fila de Usuarios y se
+        pasa a put(): si otro worker invalida entre medias, la entrada nace ya vencida.
+        """
+        if self.revocaciones is None:
+            return 0
+        return await self.revocaciones.get_counter(correo)
+
+    async def get(self, correo: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._data.get(correo)
+            if entry is None:
+                self.misses += 1
+                return None
+            principal, expires_at, generacion = entry
+            if expires_at < time.monotonic():
+                del self._data[correo]
+                self.misses += 1
+                return None
+            self._data.move_to_end(correo)
+        if self.revocaciones is not None and await self.revocaciones.get_counter(correo) != generacion:
+            with self._lock:
+                self._data.pop(correo, None)
+                self.revocados += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return principal
+
+    def put(self, principal: Principal, generacion: int = 0) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[principal.correo] = (principal, time.monotonic() + self.ttl, generacion)
+            self._data.move_to_end(principal.correo)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    async def invalidate(self, correo: str) -> None:
+        with self._lock:
+            self._data.pop(correo, None)
+        if self.revocaciones is not None:
+            await self.revocaciones.incr(correo)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl, "hits": self.hits, "misses": self.misses,
+                "revocacion": "compartida" if self.revocaciones is not None else "por_proceso", "revocados": self.revocados,
+            }
+
+
+def _build_revocaciones():
+    if PRINCIPAL_REVOCATION_BACKEND == "redis":
+        return RedisCacheBackend.from_url(CATALOG_CACHE_URL, prefix="reservas:principal:")
+    return None
+
+
+principal_cache = PrincipalCache(revocaciones=_build_revocaciones())
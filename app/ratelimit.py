@@ -0,0 +1,201 @@
+# app/ratelimit.py
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import os
+import threading
+import time
+import uuid
+
+from .metrics import metrics_registry
+
+# --- Configuración del limitador de intentos de login ---
+# LOGIN_LIMIT_BACKEND: "memory" (por proceso), "redis" (compartido entre workers) o "none".
+LOGIN_LIMIT_BACKEND = os.getenv("LOGIN_LIMIT_BACKEND", "memory").strip().lower()
+LOGIN_LIMIT_URL = os.getenv("LOGIN_LIMIT_URL", "redis://localhost:6379/0")
+LOGIN_LIMIT_WINDOW = float(os.getenv("LOGIN_LIMIT_WINDOW", "900")) # segundos (ventana deslizante)
+LOGIN_LIMIT_PER_ACCOUNT = int(os.getenv("LOGIN_LIMIT_PER_ACCOUNT", "10")) # Fallos por cuenta antes del bloqueo
+LOGIN_LIMIT_PER_IP = int(os.getenv("LOGIN_LIMIT_PER_IP", "50")) # Fallos por IP antes de rechazar con 429
+LOGIN_LIMIT_MAX_KEYS = int(os.getenv("LOGIN_LIMIT_MAX_KEYS", "100000")) # Solo backend en memoria
+
+
+# --- Backends: registran fallos con su instante y cuentan los de la ventana ---
+class MemoryLimiterBackend:
+    """
+    Ventana deslizante exacta en memoria del proceso: una cola de instantes por clave.
+    Con varios workers cada uno cuenta por separado (usar el backend redis).
+    """
+    def __init__(self, window: float = LOGIN_LIMIT_WINDOW, max_keys: int = LOGIN_LIMIT_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self._data: dict = {}
+        self._lock = threading.Lock()
+
+    def _purge(self, key: str, now: float) -> Optional[deque]:
+        eventos = self._data.get(key)
+        if eventos is None:
+            return None
+        while eventos and eventos[0] <= now - self.window:
+            eventos.popleft()
+        if not eventos:
+            del self._data[key]
+            return None
+        return eventos
+
+    async def count(self, key: str) -> Tuple[int, float]:
+        """
+        (fallos dentro de la ventana, segundos hasta que expire el más antiguo).
+        """
+        now = time.monotonic()
+        with self._lock:
+            eventos = self._purge(key, now)
+            if eventos is None:
+                return 0, 0.0
+            return len(eventos), eventos[0] + self.window - now
+
+    async def hit(self, key: str) -> int:
+        now = time.monotonic()
+        with self._lock:
+            eventos = self._purge(key, now)
+            if eventos is None:
+                if len(self._data) >= self.max_keys:
+                    # Cota de memoria ante ráfagas con muchas claves distintas: se descarta la más antigua
+                    self._data.pop(next(iter(self._data)))
+                eventos = self._data[key] = deque()
+            eventos.append(now)
+            return len(eventos)
+
+    async def reset(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisLimiterBackend:
+    """
+    Ventana deslizante compartida con un sorted set por clave (puntuación = instante).
+    Acepta cualquier cliente con la API de redis.asyncio, p. ej. fakeredis en pruebas locales.
+    """
+    def __init__(self, client, window: float = LOGIN_LIMIT_WINDOW, prefix: str = "reservas:login:"):
+        self.client = client
+        self.window = window
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisLimiterBackend":
+        try:
+            import redis.asyncio as redis_asyncio # Dependencia opcional
+        except ImportError:
+            raise RuntimeError("LOGIN_LIMIT_BACKEND=redis requiere el paquete 'redis' (pip install redis).")
+        return cls(redis_asyncio.from_url(url), **kwargs)
+
+    async def count(self, key: str) -> Tuple[int, float]:
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self.prefix + key, 0, now - self.window)
+        pipe.zcard(self.prefix + key)
+        pipe.zrange(self.prefix + key, 0, 0, withscores=True)
+        _, fallos, primero = await pipe.execute()
+        if not fallos:
+            return 0, 0.0
+        return int(fallos), float(primero[0][1]) + self.window - now
+
+    async def hit(self, key: str) -> int:
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self.prefix + key, 0, now - self.window)
+        pipe.zadd(self.prefix + key, {f"{now}:{uuid.uuid4().hex[:8]}": now}) # Miembro único por fallo
+        pipe.zcard(self.prefix + key)
+        pipe.expire(self.prefix + key, max(1, int(self.window)))
+        _, _, fallos, _ = await pipe.execute()
+        return int(fallos)
+
+    async def reset(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+
+# --- Limitador de login por cuenta y por IP ---
+@dataclass
+class LimitDecision:
+    permitido: bool
+    motivo: Optional[str] = None # "ip" o "cuenta"
+    retry_after: int = 0 # segundos
+
+
+class LoginLimiter:
+    """
+    Se consulta antes de tocar la base o bcrypt: una IP o una cuenta que ya superó su
+    límite en la ventana se rechaza sin trabajo. Los fallos se cuentan aquí y no en
+    Usuarios.intentos_login; la base solo se escribe cuando la cuenta cruza el umbral.
+    """
+    def __init__(self, backend, per_account: int = LOGIN_LIMIT_PER_ACCOUNT, per_ip: int = LOGIN_LIMIT_PER_IP):
+        self.backend = backend
+        self.per_account = per_account
+        self.per_ip = per_ip
+        self.rechazos_ip = 0
+        self.rechazos_cuenta = 0
+        self.bloqueos = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def check(self, correo: str, ip: Optional[str]) -> LimitDecision:
+        if self.backend is None:
+            return LimitDecision(True)
+        if ip:
+            fallos, espera = await self.backend.count(f"ip:{ip}")
+            if fallos >= self.per_ip:
+                self.rechazos_ip += 1
+                return LimitDecision(False, "ip", max(1, int(espera) + 1))
+        fallos, espera = await self.backend.count(f"cuenta:{correo.lower()}")
+        if fallos > self.per_account: # Ya cruzó el umbral: la cuenta quedó bloqueada en la base
+            self.rechazos_cuenta += 1
+            return LimitDecision(False, "cuenta", max(1, int(espera) + 1))
+        return LimitDecision(True)
+
+    async def register_failure(self, correo: str, ip: Optional[str]) -> int:
+        """
+        Registra un fallo y devuelve los fallos de la cuenta dentro de la ventana.
+        """
+        if self.backend is None:
+            return 0
+        if ip:
+            await self.backend.hit(f"ip:{ip}")
+        return await self.backend.hit(f"cuenta:{correo.lower()}")
+
+    async def reset_account(self, correo: str) -> None:
+        if self.backend is not None:
+            await self.backend.reset(f"cuenta:{correo.lower()}")
+
+    def snapshot(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "ventana_segundos": getattr(self.backend, "window", None),
+            "por_cuenta": self.per_account,
+            "por_ip": self.per_ip,
+            "rechazos_ip": self.rechazos_ip,
+            "rechazos_cuenta": self.rechazos_cuenta,
+            "bloqueos": self.bloqueos,
+        }
+
+
+def _build_backend():
+    if LOGIN_LIMIT_BACKEND == "none":
+        return None
+    if LOGIN_LIMIT_BACKEND == "redis":
+        return RedisLimiterBackend.from_url(LOGIN_LIMIT_URL)
+    return MemoryLimiterBackend()
+
+
+login_limiter = LoginLimiter(_build_backend())
+
+
+def _limiter_metrics():
+    return [
+        ("login_rejected_ip_total", "Intentos de login rechazados por límite de IP.", "counter", login_limiter.rechazos_ip),
+        ("login_rejected_account_total", "Intentos de login rechazados por límite de cuenta.", "counter", login_limiter.rechazos_cuenta),
+        ("login_lockouts_total", "Cuentas bloqueadas por superar el umbral de fallos.", "counter", login_limiter.bloqueos),
+    ]
+
+metrics_registry.register_collector(_limiter_metrics)
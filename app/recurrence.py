@@ -0,0 +1,83 @@
+# app/recurrence.py
+
+from calendar import monthrange
+from datetime import date, timedelta
+from typing import Iterator, List
+import os
+
+from fastapi import HTTPException, status
+
+from . import schemas
+
+# Máximo de fechas por serie (un año de reservas diarias)
+SERIE_MAX_FECHAS = int(os.getenv("SERIE_MAX_FECHAS", "366"))
+
+
+# --- Expansión de reglas de recurrencia (subconjunto de RRULE: DAILY/WEEKLY/MONTHLY) ---
+def _generar(regla: schemas.Recurrencia) -> Iterator[date]:
+    if regla.frecuencia == "diaria":
+        fecha = regla.desde
+        while True:
+            yield fecha
+            fecha += timedelta(days=regla.intervalo)
+
+    elif regla.frecuencia == "semanal":
+        dias = sorted(set(regla.dias_semana or [regla.desde.weekday()]))
+        if any(dia < 0 or dia > 6 for dia in dias):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'dias_semana' admite valores de 0 (lunes) a 6 (domingo).")
+        lunes = regla.desde - timedelta(days=regla.desde.weekday())
+        semana = 0
+        while True:
+            for dia in dias:
+                fecha = lunes + timedelta(weeks=semana * regla.intervalo, days=dia)
+                if fecha >= regla.desde:
+                    yield fecha
+            semana += 1
+
+    else: # mensual: el mismo día del mes; se saltan los meses que no lo tienen (ej. día 31)
+        paso = 0
+        while True:
+            indice = regla.desde.month - 1 + paso * regla.intervalo
+            anio, mes = regla.desde.year + indice // 12, indice % 12 + 1
+            if regla.desde.day <= monthrange(anio, mes)[1]:
+                yield date(anio, mes, regla.desde.day)
+            paso += 1
+
+def _expandir(regla: schemas.Recurrencia, max_fechas: int) -> List[date]:
+    if regla.hasta is None and regla.repeticiones is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La recurrencia necesita 'hasta' o 'repeticiones'.")
+    if regla.hasta is not None and regla.hasta < regla.desde:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'hasta' debe ser igual o posterior a 'desde'.")
+    # Se genera como mucho una fecha de más para detectar series que superan el máximo
+    limite = min(regla.repeticiones or max_fechas + 1, max_fechas + 1)
+    fechas = []
+    try:
+        for fecha in _generar(regla):
+            if regla.hasta is not None and fecha > regla.hasta:
+                break
+            fechas.append(fecha)
+            if len(fechas) >= limite:
+                break
+    except (OverflowError, ValueError):
+        # timedelta (diaria/semanal) o date() (mensual) pasan del año 9999
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La recurrencia se sale del rango de fechas admitido.")
+    return fechas
+
+def expandir_fechas(serie: schemas.ReservaSerieCreate, max_fechas: int = SERIE_MAX_FECHAS) -> List[date]:
+    """
+    Fechas de la serie, ordenadas y sin duplicados: la lista explícita o la regla expandida,
+    menos las fechas de 'excluir'.
+    """
+    if (serie.fechas is None) == (serie.recurrencia is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Indica 'fechas' o 'recurrencia' (solo uno de los dos).")
+    if serie.fechas is not None:
+        fechas = set(serie.fechas)
+    else:
+        fechas = set(_expandir(serie.recurrencia, max_fechas))
+    fechas -= set(serie.excluir)
+
+    if not fechas:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La serie no contiene ninguna fecha.")
+    if len(fechas) > max_fechas:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Una serie no puede superar {max_fechas} fechas.")
+    return sorted(fechas)
@@ -0,0 +1,155 @@
+# app/routers/admin.py
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import StreamingResponse
+from datetime import date, timedelta
+from typing import List, Optional
+
+from .. import schemas
+from ..audit import auditoria
+from ..analytics import ingresos_por_elemento, ingresos_por_escenario, ocupacion_mensual, refrescar_resumenes
+from ..database.database import get_db, get_pool_stats
+from ..security import hashing_stats
+from ..cache import catalog_cache
+from ..export import stream_reservas
+from ..nplusone import nplusone_detector
+from ..pricing import RECONCILE_BATCH_SIZE, reconcile_total_prices
+from ..principal import Principal, principal_cache
+from ..ratelimit import login_limiter
+from .auth import get_current_principal
+
+# --- Todo el router es solo para administradores: el chequeo de rol va una vez, como dependencia ---
+async def _solo_admin(current_user: Principal = Depends(get_current_principal)) -> Principal:
+    if current_user.rango != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo los administradores pueden usar las rutas de administración.")
+    return current_user
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(_solo_admin)],
+)
+
+# --- Endpoint con estadísticas en vivo del pool de conexiones (solo admins) ---
+@router.get("/pool")
+async def read_pool_stats():
+    return get_pool_stats()
+
+# --- Endpoint con métricas de la cola de bcrypt (solo admins) ---
+@router.get("/hashing")
+async def read_hashing_stats():
+    return hashing_stats.snapshot()
+
+# --- Endpoint con métricas de las cachés (catálogos y principals) ---
+@router.get("/cache")
+async def read_cache_stats():
+    return {"catalogos": catalog_cache.snapshot(), "principals": principal_cache.snapshot()}
+
+# --- Métricas del limitador de intentos de login ---
+@router.get("/login-limiter")
+async def read_login_limiter_stats():
+    return login_limiter.snapshot()
+
+# --- Estado de la auditoría (eventos confirmados en el outbox, pendientes y trasladados) ---
+@router.get("/auditoria")
+async def read_audit_stats():
+    return auditoria.snapshot()
+
+# --- Informe del detector de N+1 por endpoint (NPLUSONE_MODE=warn|raise) ---
+@router.get("/nplusone")
+async def read_nplusone_report():
+    return {"mode": nplusone_detector.mode, "threshold": nplusone_detector.threshold, "endpoints": nplusone_detector.report()}
+
+# --- Exportación de todas las reservas en streaming (NDJSON o CSV) ---
+@router.get("/reservas/export")
+async def export_reservas(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None
+):
+    if formato == "csv":
+        media_type, extension = "text/csv; charset=utf-8", "csv"
+    else:
+        media_type, extension = "application/x-ndjson", "ndjson"
+    return StreamingResponse(
+        stream_reservas(formato, desde, hasta),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="reservas.{extension}"'},
+    )
+
+# --- Reconciliación de Precio_Total: recalcula en bloque y corrige la deriva ---
+@router.post("/reservas/reconciliar-precios")
+async def reconcile_reservas_prices(
+    lote: int = Query(RECONCILE_BATCH_SIZE, ge=100, le=100000),
+    db: AsyncSession = Depends(get_db)
+):
+    return await reconcile_total_prices(db, lote)
+
+
+# --- Analíticas: ocupación e ingresos agregados en SQL ---
+# fuente=vivo agrega directamente sobre Reservas (índice cubriente por Fecha);
+# fuente=resumen lee las tablas mensuales precalculadas (meses completos).
+ANALYTICS_MAX_DAYS = 366 * 3
+
+def _rango_analiticas(desde: Optional[date], hasta: Optional[date]):
+    if desde is None:
+        desde = date.today().replace(day=1)
+    if hasta is None:
+        hasta = (desde.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1) # Fin de mes
+    if hasta < desde:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'hasta' debe ser posterior o igual a 'desde'.")
+    if (hasta - desde).days >= ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"El rango no puede superar {ANALYTICS_MAX_DAYS} días.")
+    return desde, hasta
+
+@router.get("/analytics/ocupacion", response_model=List[schemas.OcupacionMensual])
+async def read_ocupacion(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    fuente: str = Query("vivo", pattern="^(vivo|resumen)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    desde, hasta = _rango_analiticas(desde, hasta)
+    return await ocupacion_mensual(db, desde, hasta, resumen=fuente == "resumen")
+
+@router.get("/analytics/ingresos/escenarios", response_model=List[schemas.IngresosEscenario])
+async def read_ingresos_escenarios(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    fuente: str = Query("vivo", pattern="^(vivo|resumen)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    desde, hasta = _rango_analiticas(desde, hasta)
+    return await ingresos_por_escenario(db, desde, hasta, resumen=fuente == "resumen")
+
+@router.get("/analytics/ingresos/elementos", response_model=List[schemas.IngresosElemento])
+async def read_ingresos_elementos(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    fuente: str = Query("vivo", pattern="^(vivo|resumen)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    desde, hasta = _rango_analiticas(desde, hasta)
+    return await ingresos_por_elemento(db, desde, hasta, resumen=fuente == "resumen")
+
+@router.get("/analytics/elementos/top", response_model=List[schemas.IngresosElemento])
+async def read_top_elementos(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=100),
+    orden: str = Query("cantidad", pattern="^(cantidad|ingresos)$"),
+    fuente: str = Query("vivo", pattern="^(vivo|resumen)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    desde, hasta = _rango_analiticas(desde, hasta)
+    return await ingresos_por_elemento(db, desde, hasta, resumen=fuente == "resumen", orden=orden, top=limit)
+
+@router.post("/analytics/refrescar")
+async def refresh_analytics(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    desde, hasta = _rango_analiticas(desde, hasta)
+    return await refrescar_resumenes(db, desde, hasta)
@@ -1,6 +1,6 @@
 # app/routers/auth.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -12,13 +12,15 @@ import os
 from ..database.database import get_db # Importa la dependencia de DB
 from ..models.models import User # Importa el modelo de usuario
 from .. import schemas # Importa tus esquemas
-from ..security import verify_password # Importa verify_password desde security.py
+from ..security import verify_and_update_password_async # Verificación en el pool de bcrypt
+from ..principal import Principal, principal_cache
+from ..ratelimit import LOGIN_LIMIT_PER_ACCOUNT, login_limiter # Fallos contados fuera de Usuarios
 
 # --- Cargar variables de entorno (asumiendo que main.py ya llamó load_dotenv()) ---
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-MAX_LOGIN_ATTEMPTS = 10 
+MAX_LOGIN_ATTEMPTS = LOGIN_LIMIT_PER_ACCOUNT
 
 if not SECRET_KEY:
     raise ValueError("La variable de entorno SECRET_KEY no está configurada.")
@@ -34,10 +36,29 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Claims firmados que permiten autenticar sin consultar Usuarios
+def build_token_claims(user: User) -> dict:
+    return {
+        "sub": user.correo,
+        "rol": user.rango,
+        "blq": bool(user.bloqueado),
+        "ver": user.token_version or 0,
+    }
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login") # Asegúrate de que sea "login"
 
-# Esta función la usaremos para proteger rutas
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+async def _load_principal(correo: str, db: AsyncSession) -> Principal | None:
+    generacion = await principal_cache.generacion(correo)
+    user = await db.get(User, correo)
+    if user is None:
+        return None
+    principal = Principal.from_user(user)
+    principal_cache.put(principal, generacion)
+    return principal
+
+# Ruta rápida: devuelve solo correo/rango desde los claims y la caché de principals.
+# Solo consulta Usuarios cuando el principal no está en caché (o expiró su TTL).
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
@@ -51,12 +72,34 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
 
-    
-    result = await db.execute(select(User).where(User.correo == correo))
-    user = result.scalars().first()
-    if user is None:
-        raise credentials_exception # El token es válido pero el usuario no existe en DB
+    principal = await principal_cache.get(correo)
+    if principal is None:
+        principal = await _load_principal(correo, db)
+        if principal is None:
+            raise credentials_exception # El token es válido pero el usuario no existe en DB
 
+    # Tokens emitidos antes de un cambio de rango/bloqueo (o sin claim de versión) ya no valen
+    if payload.get("ver") != principal.token_version:
+        raise credentials_exception
+
+    if principal.bloqueado:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Tu cuenta está bloqueada. Contacta al soporte.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return principal
+
+# Para los endpoints que necesitan la fila completa de Usuarios (ej. /signup/me)
+async def get_current_user(principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, principal.correo)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No se pudieron validar las credenciales",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user # Ahora devuelve el objeto User completo
 
 # --- Crear el router para autenticación ---
@@ -66,14 +109,32 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=schemas.Token) # La ruta final será /login/
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
-    
+async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    client_ip = request.client.host if request.client else None
+
+    # 0. Limitador por IP y por cuenta: rechaza antes de consultar la DB y de ejecutar bcrypt
+    decision = await login_limiter.check(form_data.username, client_ip)
+    if not decision.permitido:
+        if decision.motivo == "ip":
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Demasiados intentos de login fallidos desde esta dirección. Intenta más tarde.",
+                headers={"Retry-After": str(decision.retry_after)},
+            )
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Tu cuenta está bloqueada debido a demasiados intentos fallidos. Contacta al soporte.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     # 1. Buscar al usuario en la DB por correo
     result = await db.execute(select(User).where(User.correo == form_data.username))
     user_in_db = result.scalars().first()
 
     # Si el usuario no existe, devolvemos un error genérico por seguridad
     if not user_in_db:
+        # También cuenta como fallo: frena la enumeración de correos desde una misma IP
+        await login_limiter.register_failure(form_data.username, client_ip)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Credenciales incorrectas (correo o contraseña)",
@@ -88,14 +149,18 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # 3. Verificar la contraseña
-    if not verify_password(form_data.password, user_in_db.contrasenia):
-        # Contraseña incorrecta: Incrementar intentos de login y actualizar en DB
-        new_attempts = user_in_db.intentos_login + 1
-        is_blocked = False
+    # 3. Verificar la contraseña (fuera del event loop)
+    password_ok, new_hash = await verify_and_update_password_async(form_data.password, user_in_db.contrasenia)
+    if not password_ok:
+        # Contraseña incorrecta: el fallo se cuenta en el limitador (ventana deslizante).
+        # Sin limitador (LOGIN_LIMIT_BACKEND=none) se usa el contador de la DB como antes.
+        if login_limiter.enabled:
+            new_attempts = await login_limiter.register_failure(user_in_db.correo, client_ip)
+        else:
+            new_attempts = user_in_db.intentos_login + 1
+        is_blocked = new_attempts > MAX_LOGIN_ATTEMPTS
 
-        if new_attempts > MAX_LOGIN_ATTEMPTS:
-            is_blocked = True
+        if is_blocked:
             detail_message = "Tu cuenta ha sido bloqueada debido a demasiados intentos fallidos."
             status_code_to_return = status.HTTP_403_FORBIDDEN
         else:
@@ -105,16 +170,22 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
                 detail_message += f" Intentos restantes antes del bloqueo: {remaining_attempts}"
             status_code_to_return = status.HTTP_400_BAD_REQUEST
 
-        # Actualizar los intentos de login y el estado de bloqueo en la base de datos
-        await db.execute( # Usar db directamente
-            update(User)
-            .where(User.correo == user_in_db.correo)
-            .values(
-                intentos_login=new_attempts,
-                bloqueado=is_blocked
+        # Con limitador solo se escribe en Usuarios al cruzar el umbral (una vez por bloqueo)
+        if is_blocked or not login_limiter.enabled:
+            await db.execute( # Usar db directamente
+                update(User)
+                .where(User.correo == user_in_db.correo)
+                .values(
+                    intentos_login=new_attempts,
+                    bloqueado=is_blocked,
+                    # Al bloquear la cuenta se revocan los tokens emitidos
+                    token_version=User.token_version + 1 if is_blocked else User.token_version
+                )
             )
-        )
-        await db.commit() # Usar db directamente
+            await db.commit() # Usar db directamente
+        if is_blocked:
+            login_limiter.bloqueos += 1
+            await principal_cache.invalidate(user_in_db.correo)
 
         raise HTTPException(
             status_code=status_code_to_return,
@@ -129,17 +200,21 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         "bloqueado": False,
         "ultimo_login": datetime.utcnow()
     }
+    if new_hash:
+        # El coste de bcrypt configurado cambió: guardar el hash actualizado
+        update_values["contrasenia"] = new_hash
     await db.execute( # Usar db directamente
         update(User)
         .where(User.correo == user_in_db.correo)
         .values(**update_values)
     )
     await db.commit() # Usar db directamente
+    await login_limiter.reset_account(user_in_db.correo)
 
     # 5. Crear y devolver el token JWT
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user_in_db.correo},
+        data=build_token_claims(user_in_db),
         expires_delta=access_token_expires
     )
 
@@ -1,15 +1,20 @@
 # app/routers/elementos.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
-from datetime import datetime
+from typing import List, Optional, Union
+from datetime import date, datetime
 
 from ..database.database import get_db
 from ..models.models import Elemento, User # Importa el modelo Elemento y User
 from .. import schemas
-from .auth import get_current_user # Para proteger las rutas (ej. solo administradores)
+from ..cache import catalog_cache, cached_json_response, dump_json
+from ..fastjson import dumps, fast_json, schema_columns
+from ..inventory import disponibilidad
+from ..pagination import MAX_PAGE_SIZE, keyset_page, page_limit
+from ..principal import Principal
+from .auth import get_current_principal # Para proteger las rutas (ej. solo administradores)
 
 router = APIRouter(
     prefix="/elementos",
@@ -20,7 +25,7 @@ router = APIRouter(
 @router.post("/", response_model=schemas.Elemento, status_code=status.HTTP_201_CREATED)
 async def create_elemento(
     elemento: schemas.ElementoCreate,
-    current_user: User = Depends(get_current_user), # Requiere autenticación
+    current_user: Principal = Depends(get_current_principal), # Requiere autenticación
     db: AsyncSession = Depends(get_db)
 ):
     #Chequeo de rol de administrador
@@ -35,40 +40,84 @@ async def create_elemento(
     try:
         await db.commit()
         await db.refresh(db_elemento)
-        return db_elemento
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al crear el elemento: {e}")
 
+    await catalog_cache.invalidate("elementos")
+    return db_elemento
+
+# --- Carga de una página del listado (la usan el endpoint y el precalentamiento) ---
+async def cargar_elementos(db: AsyncSession, skip: int, limit: int, cursor: Optional[str]) -> bytes:
+    if fast_json.enabled:
+        # Ruta rápida: columnas + orjson, sin objetos ORM ni revalidación Pydantic
+        filas, next_cursor = await fast_json.page(db, select(*schema_columns(Elemento, schemas.Elemento)), Elemento.Codigo, skip, limit, cursor)
+        return dumps(fast_json.envelope(filas, next_cursor, cursor))
+    if cursor is not None:
+        elementos, next_cursor = await keyset_page(db, select(Elemento), Elemento.Codigo, cursor, limit)
+        return dump_json(schemas.Pagina[schemas.Elemento], {"items": elementos, "next_cursor": next_cursor})
+
+    result = await db.execute(select(Elemento).order_by(Elemento.Codigo).offset(skip).limit(limit))
+    return dump_json(List[schemas.Elemento], result.scalars().all())
+
+async def precalentar_elementos(db: AsyncSession, limit: int = 100) -> None:
+    # Deja en la caché la primera página que piden los clientes (GET /elementos/ sin parámetros)
+    await catalog_cache.get_or_load("elementos", ("offset", 0, limit), lambda: cargar_elementos(db, 0, limit, None))
+
 # --- Endpoint para obtener todos los elementos ---
-@router.get("/", response_model=List[schemas.Elemento])
+# Con ?cursor= (vacío para la primera página) responde {items, next_cursor} paginando por Codigo;
+# sin cursor mantiene el modo skip/limit de siempre.
+@router.get("/", response_model=Union[schemas.Pagina[schemas.Elemento], List[schemas.Elemento]])
 async def read_elementos(
+    request: Request,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Depends(page_limit(100)),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(Elemento).offset(skip).limit(limit))
-    elementos = result.scalars().all()
-    return list(elementos)
+    # Read-through: solo se consulta la DB si la página no está en caché
+    partes = ("cursor", cursor, limit) if cursor is not None else ("offset", skip, limit)
+    entry = await catalog_cache.get_or_load("elementos", partes, lambda: cargar_elementos(db, skip, limit, cursor))
+    return cached_json_response(request, entry)
+
+# --- Unidades libres de cada elemento en una fecha ---
+# GET /elementos/disponibilidad?fecha=2025-06-01&codigos=1&codigos=2 (sin codigos: todos).
+# Una consulta sobre la PK (Codigo_Elemento, Fecha) del inventario; no se cachea porque
+# cambia con cada reserva.
+@router.get("/disponibilidad", response_model=List[schemas.DisponibilidadElemento])
+async def read_disponibilidad_elementos(
+    fecha: date,
+    codigos: Optional[List[int]] = Query(None, max_length=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    elementos = await disponibilidad(db, fecha, codigos)
+    return [
+        {"Codigo": codigo, "Nombre": nombre, "Stock": stock, "Reservado": reservado, "Disponible": max(stock - reservado, 0)}
+        for codigo, (nombre, stock, reservado) in elementos.items()
+    ]
 
 # --- Endpoint para obtener un elemento por Codigo ---
 @router.get("/{codigo_elemento}", response_model=schemas.Elemento)
 async def read_elemento(
     codigo_elemento: int,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
-    elemento = await db.get(Elemento, codigo_elemento)
-    if elemento:
-        return elemento
-    else:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Elemento no encontrado")
+    async def _cargar() -> bytes:
+        elemento = await db.get(Elemento, codigo_elemento)
+        if not elemento:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Elemento no encontrado")
+        return dump_json(schemas.Elemento, elemento)
+
+    entry = await catalog_cache.get_or_load("elementos", ("id", codigo_elemento), _cargar)
+    return cached_json_response(request, entry)
 
 # --- Endpoint para actualizar un elemento (protegido) ---
 @router.put("/{codigo_elemento}", response_model=schemas.Elemento)
 async def update_elemento(
     codigo_elemento: int,
     elemento_update: schemas.ElementoUpdate,
-    current_user: User = Depends(get_current_user), # Requiere autenticación
+    current_user: Principal = Depends(get_current_principal), # Requiere autenticación
     db: AsyncSession = Depends(get_db)
 ):
     #Chequeo de rol de administrador
@@ -84,13 +133,15 @@ async def update_elemento(
 
     await db.commit()
     await db.refresh(db_elemento)
+    # Write-through: invalida los listados y deja cacheada la versión nueva
+    await catalog_cache.write_through("elementos", ("id", codigo_elemento), dump_json(schemas.Elemento, db_elemento))
     return db_elemento
 
 # --- Endpoint para eliminar un elemento (protegido) ---
 @router.delete("/{codigo_elemento}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_elemento(
     codigo_elemento: int,
-    current_user: User = Depends(get_current_user), # Requiere autenticación
+    current_user: Principal = Depends(get_current_principal), # Requiere autenticación
     db: AsyncSession = Depends(get_db)
 ):
     # Chequeo de rol de administrador
@@ -103,4 +154,5 @@ async def delete_elemento(
 
     await db.delete(db_elemento)
     await db.commit()
+    await catalog_cache.invalidate("elementos")
     return {"message": "Elemento eliminado exitosamente"}
\ No newline at end of file
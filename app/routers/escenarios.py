@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Optional, Union
+from datetime import date, datetime
 
 from ..database.database import get_db
-from ..models.models import Escenario, User # Importa el modelo Escenario y User
+from ..models.models import Escenario, Reserva, User # Importa el modelo Escenario y User
 from .. import schemas
-from .auth import get_current_user # Para proteger las rutas
+from ..cache import catalog_cache, cached_json_response, dump_json
+from ..fastjson import dumps, fast_json, schema_columns
+from ..occupancy import occupancy_index
+from ..pagination import keyset_page, keyset_page_ordered, page_limit
+from ..principal import Principal
+from ..pricing import propagar_precio_escenario
+from .auth import get_current_principal # Para proteger las rutas
 
 router = APIRouter(
     prefix="/escenarios",
@@ -18,7 +24,7 @@ router = APIRouter(
 @router.post("/", response_model=schemas.Escenario, status_code=status.HTTP_201_CREATED)
 async def create_escenario(
     escenario: schemas.EscenarioCreate,
-    current_user: User = Depends(get_current_user), # Requiere autenticación
+    current_user: Principal = Depends(get_current_principal), # Requiere autenticación
     db: AsyncSession = Depends(get_db)
 ):
     # Opcional: Aquí puedes añadir lógica para verificar si current_user.rango es "administrador"
@@ -33,40 +39,160 @@ async def create_escenario(
     try:
         await db.commit()
         await db.refresh(db_escenario)
-        return db_escenario
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al crear el escenario: {e}")
 
+    await catalog_cache.invalidate("escenarios")
+    return db_escenario
+
+# --- Carga de una página del listado (la usan el endpoint y el precalentamiento) ---
+async def cargar_escenarios(db: AsyncSession, skip: int, limit: int, cursor: Optional[str]) -> bytes:
+    if fast_json.enabled:
+        # Ruta rápida: columnas + orjson, sin objetos ORM ni revalidación Pydantic
+        filas, next_cursor = await fast_json.page(db, select(*schema_columns(Escenario, schemas.Escenario)), Escenario.ID_Escenario, skip, limit, cursor)
+        return dumps(fast_json.envelope(filas, next_cursor, cursor))
+    if cursor is not None:
+        escenarios, next_cursor = await keyset_page(db, select(Escenario), Escenario.ID_Escenario, cursor, limit)
+        return dump_json(schemas.Pagina[schemas.Escenario], {"items": escenarios, "next_cursor": next_cursor})
+
+    result = await db.execute(select(Escenario).order_by(Escenario.ID_Escenario).offset(skip).limit(limit))
+    return dump_json(List[schemas.Escenario], result.scalars().all())
+
+async def precalentar_escenarios(db: AsyncSession, limit: int = 100) -> None:
+    # Deja en la caché la primera página que piden los clientes (GET /escenarios/ sin parámetros)
+    await catalog_cache.get_or_load("escenarios", ("offset", 0, limit), lambda: cargar_escenarios(db, 0, limit, None))
+
 # --- Endpoint para obtener todos los escenarios ---
-@router.get("/", response_model=List[schemas.Escenario])
+# Con ?cursor= (vacío para la primera página) responde {items, next_cursor} paginando por ID_Escenario;
+# sin cursor mantiene el modo skip/limit de siempre.
+@router.get("/", response_model=Union[schemas.Pagina[schemas.Escenario], List[schemas.Escenario]])
 async def read_escenarios(
+    request: Request,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Depends(page_limit(100)),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    # Read-through: solo se consulta la DB si la página no está en caché
+    partes = ("cursor", cursor, limit) if cursor is not None else ("offset", skip, limit)
+    entry = await catalog_cache.get_or_load("escenarios", partes, lambda: cargar_escenarios(db, skip, limit, cursor))
+    return cached_json_response(request, entry)
+
+# Máximo de días que se pueden consultar de una vez en el calendario
+MAX_DIAS_DISPONIBILIDAD = 366
+
+def _validar_rango(desde: date, hasta: date):
+    if hasta < desde:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'hasta' debe ser igual o posterior a 'desde'.")
+    if (hasta - desde).days + 1 > MAX_DIAS_DISPONIBILIDAD:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"El rango no puede superar {MAX_DIAS_DISPONIBILIDAD} días.")
+
+# --- Búsqueda de escenarios disponibles (activos y libres en la fecha o en todo el rango) ---
+# Una sola consulta: filtros sobre ix_escenario_activo_capacidad_precio y un anti-join
+# (NOT EXISTS) contra Reservas que usa el índice único (ID_Escenario, Fecha).
+# Paginada por cursor sobre (columna de orden, ID_Escenario).
+@router.get("/buscar", response_model=schemas.Pagina[schemas.Escenario])
+async def buscar_escenarios_disponibles(
+    fecha: Optional[date] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    capacidad_min: Optional[int] = Query(None, ge=1),
+    precio_max: Optional[int] = Query(None, ge=0),
+    orden: str = Query("precio", pattern="^(precio|capacidad)$"),
+    descendente: bool = False,
+    limit: int = Depends(page_limit(20)),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    if fecha is not None:
+        if desde is not None or hasta is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Indica 'fecha' o el rango 'desde'/'hasta', no ambos.")
+        desde = hasta = fecha
+    elif desde is None or hasta is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Indica 'fecha' o el rango completo 'desde'/'hasta'.")
+    _validar_rango(desde, hasta)
+
+    ocupado = (
+        select(Reserva.ID_Reserva)
+        .where(Reserva.ID_Escenario == Escenario.ID_Escenario, Reserva.Fecha.between(desde, hasta))
+        .correlate(Escenario)
+        .exists()
+    )
+    stmt = select(Escenario).where(Escenario.Activo == True, ~ocupado) # noqa: E712
+    if capacidad_min is not None:
+        stmt = stmt.where(Escenario.Capacidad >= capacidad_min)
+    if precio_max is not None:
+        stmt = stmt.where(Escenario.Precio <= precio_max)
+
+    columna = Escenario.Precio if orden == "precio" else Escenario.Capacidad
+    escenarios, next_cursor = await keyset_page_ordered(db, stmt, (columna, Escenario.ID_Escenario), cursor, limit, descending=descendente)
+    return {"items": escenarios, "next_cursor": next_cursor}
+
+# --- Endpoint de disponibilidad para varios escenarios (?ids=1&ids=2) ---
+# Declarado antes de /{escenario_id} para que "disponibilidad" no se tome como ID
+@router.get("/disponibilidad", response_model=List[schemas.Disponibilidad])
+async def read_disponibilidad_escenarios(
+    desde: date,
+    hasta: date,
+    ids: List[int] = Query(...),
+    db: AsyncSession = Depends(get_db)
+):
+    _validar_rango(desde, hasta)
+    ids = list(dict.fromkeys(ids)) # Sin duplicados, conservando el orden
+
+    result = await db.execute(select(Escenario.ID_Escenario).where(Escenario.ID_Escenario.in_(ids)))
+    existentes = set(result.scalars().all())
+    faltantes = [escenario_id for escenario_id in ids if escenario_id not in existentes]
+    if faltantes:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Escenarios no encontrados: {faltantes}")
+
+    await occupancy_index.ensure_loaded(db)
+    respuesta = []
+    for escenario_id in ids:
+        ocupadas, disponibles = occupancy_index.calendar(escenario_id, desde, hasta)
+        respuesta.append(schemas.Disponibilidad(ID_Escenario=escenario_id, desde=desde, hasta=hasta, ocupadas=ocupadas, disponibles=disponibles))
+    return respuesta
+
+# --- Endpoint de disponibilidad (calendario) de un escenario ---
+@router.get("/{escenario_id}/disponibilidad", response_model=schemas.Disponibilidad)
+async def read_disponibilidad_escenario(
+    escenario_id: int,
+    desde: date,
+    hasta: date,
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(Escenario).offset(skip).limit(limit))
-    escenarios = result.scalars().all()
-    return list(escenarios)
+    _validar_rango(desde, hasta)
+    escenario = await db.get(Escenario, escenario_id)
+    if not escenario:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Escenario no encontrado")
+
+    await occupancy_index.ensure_loaded(db)
+    ocupadas, disponibles = occupancy_index.calendar(escenario_id, desde, hasta)
+    return schemas.Disponibilidad(ID_Escenario=escenario_id, desde=desde, hasta=hasta, ocupadas=ocupadas, disponibles=disponibles)
 
 # --- Endpoint para obtener un escenario por ID ---
 @router.get("/{escenario_id}", response_model=schemas.Escenario)
 async def read_escenario(
     escenario_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
-    escenario = await db.get(Escenario, escenario_id)
-    if escenario:
-        return escenario
-    else:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Escenario no encontrado")
+    async def _cargar() -> bytes:
+        escenario = await db.get(Escenario, escenario_id)
+        if not escenario:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Escenario no encontrado")
+        return dump_json(schemas.Escenario, escenario)
+
+    entry = await catalog_cache.get_or_load("escenarios", ("id", escenario_id), _cargar)
+    return cached_json_response(request, entry)
 
 # --- Endpoint para actualizar un escenario (protegido) ---
 @router.put("/{escenario_id}", response_model=schemas.Escenario)
 async def update_escenario(
     escenario_id: int,
     escenario_update: schemas.EscenarioUpdate,
-    current_user: User = Depends(get_current_user), # Requiere autenticación
+    current_user: Principal = Depends(get_current_principal), # Requiere autenticación
     db: AsyncSession = Depends(get_db)
 ):
     #Chequeo de rol de administrador
@@ -78,18 +204,25 @@ async def update_escenario(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Escenario no encontrado")
 
     # Actualizar los campos
+    precio_anterior = db_escenario.Precio
     for key, value in escenario_update.model_dump(exclude_unset=True).items():
         setattr(db_escenario, key, value)
+    # Un cambio de precio se propaga al Precio_Total persistido de las reservas, en la misma transacción
+    # (un PUT que no toca el precio no hace ningún UPDATE sobre Reservas)
+    if db_escenario.Precio is not None and precio_anterior is not None and db_escenario.Precio != precio_anterior:
+        await propagar_precio_escenario(db, escenario_id, db_escenario.Precio - precio_anterior)
 
     await db.commit()
     await db.refresh(db_escenario)
+    # Write-through: invalida los listados y deja cacheada la versión nueva
+    await catalog_cache.write_through("escenarios", ("id", escenario_id), dump_json(schemas.Escenario, db_escenario))
     return db_escenario
 
 # --- Endpoint para eliminar un escenario (protegido) ---
 @router.delete("/{escenario_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_escenario(
     escenario_id: int,
-    current_user: User = Depends(get_current_user), # Requiere autenticación
+    current_user: Principal = Depends(get_current_principal), # Requiere autenticación
     db: AsyncSession = Depends(get_db)
 ):
     #Chequeo de rol de administrador
@@ -102,4 +235,5 @@ async def delete_escenario(
 
     await db.delete(db_escenario)
     await db.commit()
+    await catalog_cache.invalidate("escenarios")
     return {"message": "Escenario eliminado exitosamente"}
\ No newline at end of file
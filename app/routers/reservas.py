@@ -1,125 +1,184 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload # Para cargar relaciones eager
-from typing import List
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Dict, List, Optional, Union
 from datetime import date, datetime
 
-from ..database.database import get_db
+from ..database.database import get_db, run_with_retry
 from ..models.models import Reserva, User, Escenario, Elemento, ReservaElemento # Importa todos los modelos necesarios
 from .. import schemas
-from .auth import get_current_user
+from ..audit import auditoria
+from ..pricing import assign_total_prices, precio_calculado_expr
+from ..bulk import ConflictoSerie, importar_reservas, leer_filas, reservar_serie
+from ..fastjson import fast_json, schema_columns
+from ..inventory import disponibilidad, liberar_inventario, reservar_inventario
+from ..occupancy import occupancy_index
+from ..pagination import keyset_page, page_limit
+from ..recurrence import expandir_fechas
+from ..principal import Principal
+from .auth import get_current_principal
 
 router = APIRouter(
     prefix="/reservas",
     tags=["Reservas"]
 )
 
-# Helper para calcular el precio total de una reserva
-async def calculate_total_price(db_reserva: Reserva, db: AsyncSession) -> int:
-    total_price = 0
-
-    # Precio base del escenario
-    if db_reserva.ID_Escenario:
-        escenario = await db.get(Escenario, db_reserva.ID_Escenario)
-        if escenario:
-            total_price += escenario.Precio
-        else:
-            # Esto no debería pasar si la FK es válida
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Escenario asociado no encontrado.")
-
-    # Precio de los elementos
-    for res_elem in db_reserva.reservas_elementos:
-        elemento = await db.get(Elemento, res_elem.Codigo_Elemento)
-        if elemento:
-            total_price += elemento.Precio * res_elem.Cantidad
-        else:
-            # Manejar el caso si un elemento ya no existe (raro si hay FK)
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Elemento con código {res_elem.Codigo_Elemento} no encontrado.")
-
-    return total_price
+# --- Helpers de stock por fecha (ver app/inventory.py) ---
+# Un UPDATE condicional sobre Inventario_Elementos para todos los códigos de la fecha. Si algún
+# elemento no alcanza (Reservado + cantidad > Stock), el llamador debe hacer rollback.
+async def reservar_stock(db: AsyncSession, fecha: date, cantidades: Dict[int, int]) -> None:
+    if await reservar_inventario(db, [fecha], cantidades):
+        return
+
+    # Diagnóstico (solo en el camino de error): una consulta para saber qué código falló
+    elementos = await disponibilidad(db, fecha, cantidades)
+    for codigo_elemento, cantidad_pedida in cantidades.items():
+        if codigo_elemento not in elementos:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Elemento con código {codigo_elemento} no encontrado.")
+        nombre, stock, reservado = elementos[codigo_elemento]
+        if stock - reservado < cantidad_pedida:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Stock insuficiente para el elemento '{nombre}' el {fecha.isoformat()}. Stock disponible: {max(stock - reservado, 0)}")
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Stock insuficiente para los elementos seleccionados.")
+
+async def liberar_stock(db: AsyncSession, fecha: date, cantidades: Dict[int, int]) -> None:
+    await liberar_inventario(db, fecha, cantidades)
+
+async def sumar_cantidades(db: AsyncSession, reserva_id: int, cantidades: Dict[int, int]) -> None:
+    """
+    Upsert de Reservas_Elementos: inserta los códigos nuevos y suma la cantidad a los existentes
+    en una sola sentencia (ON DUPLICATE KEY UPDATE en MariaDB, ON CONFLICT en SQLite/PostgreSQL).
+    """
+    filas = [{"ID_Reserva": reserva_id, "Codigo_Elemento": codigo, "Cantidad": cantidad} for codigo, cantidad in cantidades.items()]
+    if not filas:
+        return
+    dialecto = db.get_bind().dialect.name
+    if dialecto in ("mysql", "mariadb"):
+        stmt = mysql_insert(ReservaElemento).values(filas)
+        stmt = stmt.on_duplicate_key_update(Cantidad=ReservaElemento.Cantidad + stmt.inserted.Cantidad)
+    elif dialecto in ("sqlite", "postgresql"):
+        insert_dialecto = sqlite_insert if dialecto == "sqlite" else postgresql_insert
+        stmt = insert_dialecto(ReservaElemento).values(filas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ReservaElemento.ID_Reserva, ReservaElemento.Codigo_Elemento],
+            set_={"Cantidad": ReservaElemento.Cantidad + stmt.excluded.Cantidad},
+        )
+    else:
+        raise RuntimeError(f"Upsert de Reservas_Elementos no soportado para el dialecto '{dialecto}'.")
+    await db.execute(stmt)
+
+def agrupar_cantidades(elementos_data: List[schemas.ReservaElementoCreate]) -> Dict[int, int]:
+    # Suma las cantidades de códigos repetidos; el orden por código evita deadlocks entre transacciones
+    cantidades: Dict[int, int] = {}
+    for elem_data in elementos_data or []:
+        cantidades[elem_data.Codigo_Elemento] = cantidades.get(elem_data.Codigo_Elemento, 0) + elem_data.Cantidad
+    return dict(sorted(cantidades.items()))
+
+# --- Helpers de Precio_Total persistido ---
+async def precios_elementos(db: AsyncSession, codigos) -> Dict[int, int]:
+    if not codigos:
+        return {}
+    result = await db.execute(select(Elemento.Codigo, Elemento.Precio).where(Elemento.Codigo.in_(list(codigos))))
+    return {row[0]: row[1] for row in result.all()}
+
+async def sumar_precio_total(db: AsyncSession, reserva: Reserva, delta: int) -> None:
+    """
+    Precio_Total += delta en SQL (correcto aunque haya escrituras concurrentes sobre la reserva).
+    Si la fila aún no tenía total persistido, se calcula completo en la misma sentencia.
+    """
+    await db.execute(
+        update(Reserva)
+        .where(Reserva.ID_Reserva == reserva.ID_Reserva)
+        .values(Precio_Total=func.coalesce(Reserva.Precio_Total + delta, precio_calculado_expr()))
+        .execution_options(synchronize_session=False)
+    )
+
+def datos_auditoria(reserva: Reserva, cantidades: Dict[int, int]) -> dict:
+    # Lo que guardaba el trigger (Lugar, Precio) más lo que hoy define la reserva
+    return {
+        "ID_Escenario": reserva.ID_Escenario,
+        "Fecha": reserva.Fecha,
+        "Lugar": reserva.Lugar,
+        "Precio": reserva.Precio,
+        "Precio_Total": reserva.Precio_Total,
+        "Estado": reserva.Estado,
+        "elementos": cantidades,
+    }
+
+def reserva_respuesta(reserva: Reserva, cantidades: Dict[int, int]) -> dict:
+    # Respuesta schemas.Reserva armada con datos ya conocidos (sin recargar la reserva)
+    return {
+        **{columna.key: getattr(reserva, columna.key) for columna in Reserva.__table__.columns},
+        "reservas_elementos": [
+            {"Codigo_Elemento": codigo, "Cantidad": cantidad} for codigo, cantidad in sorted(cantidades.items())
+        ],
+    }
 
 # --- Endpoint para crear una reserva ---
 @router.post("/", response_model=schemas.Reserva, status_code=status.HTTP_201_CREATED)
 async def create_reserva(
     reserva_data: schemas.ReservaCreate, # Ahora solo ID_Escenario y Fecha (y elementos)
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    # 1. Verificar si ya existe una reserva para el mismo escenario en la misma fecha
-    result = await db.execute(
-        select(Reserva).where(
-            Reserva.ID_Escenario == reserva_data.ID_Escenario,
-            Reserva.Fecha == reserva_data.Fecha
-        )
-    )
-    existing_reserva = result.scalars().first()
-
-    if existing_reserva:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Este escenario ya está reservado para la fecha especificada."
-        )
-
-    # 2. Verificar existencia del escenario y obtener sus datos (Lugar, Precio)
+    # 1. Verificar existencia del escenario y obtener sus datos (Lugar, Precio)
     escenario = await db.get(Escenario, reserva_data.ID_Escenario)
     if not escenario:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Escenario no encontrado.")
-
-    # 3. Crear la reserva base (sin elementos aún)
-    db_reserva = Reserva(
-        # Ahora toma Lugar y Precio directamente del objeto 'escenario'
-        Lugar=escenario.Direccion, # <--- CAMBIO: Usar escenario.Direccion como Lugar
-        Precio=escenario.Precio,   # <--- CAMBIO: Usar escenario.Precio
-        Fecha=reserva_data.Fecha,
-        ID_Escenario=reserva_data.ID_Escenario,
-        Correo_Usuario=current_user.correo,
-        Fecha_creacion=datetime.utcnow(),
-        Estado="Pendiente" # Default
-    )
-    db.add(db_reserva)
-
-    try:
-        await db.flush() # flush para que db_reserva.ID_Reserva tenga un valor antes de los elementos
-
-        # 4. Añadir elementos si se proporcionaron (esta lógica se mantiene igual)
-        if reserva_data.elementos_seleccionados:
-            for elem_data in reserva_data.elementos_seleccionados:
-                elemento = await db.get(Elemento, elem_data.Codigo_Elemento)
-                if not elemento:
-                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Elemento con código {elem_data.Codigo_Elemento} no encontrado.")
-                if elemento.Stock < elem_data.Cantidad:
-                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Stock insuficiente para el elemento '{elemento.Nombre}'. Stock disponible: {elemento.Stock}")
-
-                # Crear entrada en la tabla intermedia
-                db_reserva_elemento = ReservaElemento(
-                    ID_Reserva=db_reserva.ID_Reserva,
-                    Codigo_Elemento=elem_data.Codigo_Elemento,
-                    Cantidad=elem_data.Cantidad
-                )
-                db.add(db_reserva_elemento)
-                # Opcional: Reducir el stock del elemento
-                # elemento.Stock -= elem_data.Cantidad
-
-        await db.commit()
-        loaded_reserva_result = await db.execute(
-            select(Reserva)
-            .options(
-                selectinload(Reserva.reservas_elementos).selectinload(ReservaElemento.elemento)
-            )
-            .where(Reserva.ID_Reserva == db_reserva.ID_Reserva) # Usa el ID generado por el flush
+    # Copiamos los valores: un rollback por reintento expira los objetos de la sesión
+    lugar, precio = escenario.Direccion, escenario.Precio
+    cantidades = agrupar_cantidades(reserva_data.elementos_seleccionados)
+    # Precio_Total se guarda al crear la reserva: una consulta IN para los precios de los elementos
+    precios = await precios_elementos(db, cantidades)
+    precio_total = precio + sum(precios.get(codigo, 0) * cantidad for codigo, cantidad in cantidades.items())
+
+    async def _reservar() -> Reserva:
+        # 2. Crear la reserva base. La restricción única (ID_Escenario, Fecha) impide
+        #    la reserva doble incluso con peticiones concurrentes.
+        db_reserva = Reserva(
+            Lugar=lugar,
+            Precio=precio,
+            Fecha=reserva_data.Fecha,
+            ID_Escenario=reserva_data.ID_Escenario,
+            Correo_Usuario=current_user.correo,
+            Fecha_creacion=datetime.utcnow(),
+            Estado="Pendiente", # Default
+            Precio_Total=precio_total
         )
-        final_reserva = loaded_reserva_result.scalars().first()
-
-        if not final_reserva:
-            # Esto sería muy inusual si el commit fue exitoso
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Reserva no pudo ser recuperada después de la creación.")
+        db.add(db_reserva)
+        try:
+            await db.flush() # flush para que db_reserva.ID_Reserva tenga un valor antes de los elementos
+        except IntegrityError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Este escenario ya está reservado para la fecha especificada."
+            )
 
-        # Calcular y asignar el precio total antes de devolver la respuesta
-        final_reserva.Precio_Total = await calculate_total_price(final_reserva, db)
+        # 3. Reservar los elementos en el inventario de la fecha (un UPDATE para todos) y añadirlos
+        await reservar_stock(db, reserva_data.Fecha, cantidades)
+        for codigo_elemento, cantidad in cantidades.items():
+            db.add(ReservaElemento(
+                ID_Reserva=db_reserva.ID_Reserva,
+                Codigo_Elemento=codigo_elemento,
+                Cantidad=cantidad
+            ))
+
+        # La auditoría va en la misma transacción (outbox): se confirma con la reserva o no se guarda
+        await auditoria.registrar(db, "INSERT", current_user.correo, db_reserva.ID_Reserva, despues=datos_auditoria(db_reserva, cantidades))
+        await db.commit()
+        return db_reserva
 
-        return final_reserva # <-- Retorna el objeto que tiene todo cargado
+    try:
+        db_reserva = await run_with_retry(db, _reservar)
+        occupancy_index.add(db_reserva.ID_Escenario, db_reserva.Fecha)
+        # La respuesta se arma con lo que ya sabemos: no hace falta recargar ni recalcular
+        return reserva_respuesta(db_reserva, cantidades)
 
     except IntegrityError:
         await db.rollback()
@@ -134,43 +193,130 @@ async def create_reserva(
             detail=f"Error inesperado al crear la reserva: {e}"
         )
 
+# --- Endpoint de carga masiva: arreglo JSON, NDJSON o CSV (Fecha,ID_Escenario,Elementos) ---
+# Valida todas las filas contra escenarios, elementos y fechas ocupadas pre-cargados, e
+# inserta en bloques (executemany) de BULK_CHUNK_SIZE filas por transacción.
+@router.post("/bulk", response_model=schemas.ResultadoBulk, status_code=status.HTTP_200_OK)
+async def create_reservas_bulk(
+    request: Request,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    filas = await leer_filas(request)
+    resultado, creadas = await importar_reservas(db, filas, current_user.correo)
+
+    for escenario_id, fecha in creadas:
+        occupancy_index.add(escenario_id, fecha)
+    return resultado
+
+# --- Endpoint de series de reservas: lista de fechas o regla de recurrencia ---
+# Todas las fechas en una transacción: una consulta de conflictos para toda la serie y una
+# inserción en bloque, así que 20 fechas cuestan lo mismo que una reserva individual.
+# Con todo_o_nada=False se reservan las fechas libres y se informa cuáles estaban ocupadas.
+@router.post("/serie", response_model=schemas.ResultadoSerie, status_code=status.HTTP_201_CREATED)
+async def create_reserva_serie(
+    serie: schemas.ReservaSerieCreate,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    fechas = expandir_fechas(serie)
+    cantidades = agrupar_cantidades(serie.elementos_seleccionados)
+    try:
+        creadas, conflictos, precio_total = await reservar_serie(
+            db, serie.ID_Escenario, fechas, cantidades, current_user.correo, serie.todo_o_nada
+        )
+    except ConflictoSerie as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "mensaje": "Hay fechas ocupadas en la serie; no se reservó ninguna.",
+                "conflictos": [{"Fecha": fecha.isoformat(), "error": error} for fecha, error in sorted(e.conflictos.items())],
+            },
+        )
+
+    for fecha in creadas:
+        occupancy_index.add(serie.ID_Escenario, fecha)
+
+    return schemas.ResultadoSerie(
+        ID_Escenario=serie.ID_Escenario,
+        solicitadas=len(fechas),
+        creadas=len(creadas),
+        conflictos=len(conflictos),
+        Precio_Total=precio_total,
+        resultados=[
+            schemas.ResultadoFechaSerie(Fecha=fecha, ok=True, ID_Reserva=creadas[fecha]) if fecha in creadas
+            else schemas.ResultadoFechaSerie(Fecha=fecha, ok=False, error=conflictos.get(fecha))
+            for fecha in fechas
+        ],
+    )
+
 # --- Endpoint para obtener las reservas de un usuario (rutas protegidas) ---
 # Modificado para cargar los elementos asociados
-@router.get("/me", response_model=List[schemas.Reserva])
+# Paginado: skip/limit como el resto de listados, o ?cursor= (vacío para la primera
+# página) para recibir {items, next_cursor} paginando por ID_Reserva.
+@router.get("/me", response_model=Union[schemas.Pagina[schemas.Reserva], List[schemas.Reserva]])
 async def get_my_reservas(
-    current_user: User = Depends(get_current_user),
+    skip: int = 0,
+    limit: int = Depends(page_limit(100)),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(
+    if fast_json.enabled:
+        return await _reservas_me_rapido(db, current_user.correo, skip, limit, cursor)
+
+    stmt = (
         select(Reserva)
-        .options(selectinload(Reserva.reservas_elementos).selectinload(ReservaElemento.elemento)) # Carga elementos y sus detalles
+        .options(selectinload(Reserva.reservas_elementos)) # Precio_Total ya está en la fila: no hacen falta escenario ni precios
         .where(Reserva.Correo_Usuario == current_user.correo)
     )
+
+    if cursor is not None:
+        reservas, next_cursor = await keyset_page(db, stmt, Reserva.ID_Reserva, cursor, limit)
+        await assign_total_prices(reservas, db)
+        return {"items": reservas, "next_cursor": next_cursor}
+
+    result = await db.execute(stmt.order_by(Reserva.ID_Reserva).offset(skip).limit(limit))
     reservas = result.scalars().unique().all() # .unique() para evitar duplicados si hay muchos elementos
-    print(f"DEBUG: Número de reservas cargadas: {len(reservas)}")
-    for i, reserva in enumerate(reservas):
-        print(f"DEBUG: Reserva {i}: ID={reserva.ID_Reserva}")
-        print(f"DEBUG: Reserva {i}: Lugar={reserva.Lugar}") # <-- Verifica esto
-        print(f"DEBUG: Reserva {i}: Fecha={reserva.Fecha}") # <-- Verifica esto
-        print(f"DEBUG: Reserva {i}: Atributos cargados: {reserva.__dict__.keys()}")
-        print(f"DEBUG: Reserva {i}: Objeto completo: {reserva.__dict__}") # Ver todos los atributos
-
-    # Calcular Precio_Total para cada reserva
-    for reserva in reservas:
-        reserva.Precio_Total = await calculate_total_price(reserva, db)
+
+    # Precio_Total viene persistido; solo se calcula (en una consulta) para filas sin él
+    await assign_total_prices(reservas, db)
 
     return list(reservas)
 
+# Ruta rápida (FAST_JSON=1): dos SELECT de columnas, sin objetos ORM ni revalidación Pydantic.
+# Precio_Total se completa en SQL solo para filas que aún no lo tienen persistido.
+async def _reservas_me_rapido(db: AsyncSession, correo: str, skip: int, limit: int, cursor: Optional[str]):
+    columnas = [c for c in schema_columns(Reserva, schemas.Reserva) if c.key != "Precio_Total"]
+    stmt = (
+        select(*columnas, func.coalesce(Reserva.Precio_Total, precio_calculado_expr()).label("Precio_Total"))
+        .where(Reserva.Correo_Usuario == correo)
+    )
+    filas, next_cursor = await fast_json.page(db, stmt, Reserva.ID_Reserva, skip, limit, cursor)
+
+    por_reserva = {}
+    for fila in filas:
+        fila["reservas_elementos"] = []
+        por_reserva[fila["ID_Reserva"]] = fila
+    if por_reserva:
+        result = await db.execute(
+            select(ReservaElemento.ID_Reserva, ReservaElemento.Codigo_Elemento, ReservaElemento.Cantidad)
+            .where(ReservaElemento.ID_Reserva.in_(list(por_reserva)))
+        )
+        for reserva_id, codigo, cantidad in result.all():
+            por_reserva[reserva_id]["reservas_elementos"].append({"Codigo_Elemento": codigo, "Cantidad": cantidad})
+    return fast_json.response(fast_json.envelope(filas, next_cursor, cursor))
+
 # --- Endpoint para obtener una reserva específica por ID_Reserva ---
 @router.get("/{reserva_id}", response_model=schemas.Reserva)
 async def get_reserva_by_id(
     reserva_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     result = await db.execute(
         select(Reserva)
-        .options(selectinload(Reserva.reservas_elementos).selectinload(ReservaElemento.elemento)) # Carga elementos y sus detalles
+        .options(selectinload(Reserva.reservas_elementos)) # Precio_Total ya está en la fila: no hacen falta escenario ni precios
         .where(
             Reserva.ID_Reserva == reserva_id,
             Reserva.Correo_Usuario == current_user.correo # Asegura que solo el dueño vea su reserva
@@ -180,108 +326,140 @@ async def get_reserva_by_id(
     if not reserva:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reserva no encontrada o no tienes permiso para verla.")
 
-    # Calcular Precio_Total
-    reserva.Precio_Total = await calculate_total_price(reserva, db)
+    # Solo calcula Precio_Total si la fila aún no lo tiene persistido
+    await assign_total_prices([reserva], db)
 
     return reserva
 
 # --- ENDPOINTS: Añadir/Quitar Elementos a una Reserva Existente ---
+# Operaciones por conjuntos: un número fijo de consultas sin importar cuántos elementos
+# vengan en la petición, y la respuesta se arma con lo ya leído (sin recargar la reserva).
+# Precio_Total se ajusta sumando el delta de los elementos añadidos o quitados.
+
+async def _cargar_reserva_propia(db: AsyncSession, reserva_id: int, correo: str) -> Reserva:
+    reserva = await db.get(Reserva, reserva_id)
+    if not reserva or reserva.Correo_Usuario != correo:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reserva no encontrada o no tienes permiso.")
+    return reserva
+
+async def _vinculos_con_precio(db: AsyncSession, reserva_id: int) -> Dict[int, tuple]:
+    # {Codigo_Elemento: (Cantidad, Precio del elemento)} de todos los elementos de la reserva
+    result = await db.execute(
+        select(ReservaElemento.Codigo_Elemento, ReservaElemento.Cantidad, Elemento.Precio)
+        .join(Elemento, Elemento.Codigo == ReservaElemento.Codigo_Elemento)
+        .where(ReservaElemento.ID_Reserva == reserva_id)
+        .order_by(ReservaElemento.Codigo_Elemento)
+    )
+    return {row[0]: (row[1], row[2]) for row in result.all()}
+
+async def _actualizar_precio_respuesta(db: AsyncSession, reserva: Reserva, delta: int) -> None:
+    # Refleja en el objeto el total que quedó en la DB, sin marcarlo como modificado
+    if reserva.Precio_Total is not None:
+        set_committed_value(reserva, "Precio_Total", reserva.Precio_Total + delta)
+    else:
+        await assign_total_prices([reserva], db)
 
 @router.post("/{reserva_id}/elementos", response_model=schemas.Reserva, status_code=status.HTTP_200_OK)
 async def add_elementos_to_reserva(
     reserva_id: int,
     elementos_data: List[schemas.ReservaElementoCreate],
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    reserva = await db.get(Reserva, reserva_id)
-    if not reserva or reserva.Correo_Usuario != current_user.correo:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reserva no encontrada o no tienes permiso.")
-
-    for elem_data in elementos_data:
-        elemento = await db.get(Elemento, elem_data.Codigo_Elemento)
-        if not elemento:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Elemento con código {elem_data.Codigo_Elemento} no encontrado.")
-        if elemento.Stock < elem_data.Cantidad:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Stock insuficiente para el elemento '{elemento.Nombre}'. Stock disponible: {elemento.Stock}")
+    reserva = await _cargar_reserva_propia(db, reserva_id, current_user.correo)
+    cantidades = agrupar_cantidades(elementos_data)
 
-        # Comprobar si ya existe para actualizar la cantidad o añadir
-        existing_res_elem = (await db.execute(
-            select(ReservaElemento).where(
-                ReservaElemento.ID_Reserva == reserva_id,
-                ReservaElemento.Codigo_Elemento == elem_data.Codigo_Elemento
-            )
-        )).scalars().first()
-
-        if existing_res_elem:
-            existing_res_elem.Cantidad += elem_data.Cantidad
-            # ajustar stock si se añade más
-            # elemento.Stock -= elem_data.Cantidad
-        else:
-            db_reserva_elemento = ReservaElemento(
-                ID_Reserva=reserva_id,
-                Codigo_Elemento=elem_data.Codigo_Elemento,
-                Cantidad=elem_data.Cantidad
-            )
-            db.add(db_reserva_elemento)
-            # reducir stock
-            # elemento.Stock -= elem_data.Cantidad
     try:
+        # Una consulta IN para los elementos pedidos (su precio da el delta de Precio_Total)
+        precios = await precios_elementos(db, cantidades)
+        for codigo_elemento in cantidades:
+            if codigo_elemento not in precios:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Elemento con código {codigo_elemento} no encontrado.")
+
+        vinculos = await _vinculos_con_precio(db, reserva_id)
+        # Reserva en el inventario de la fecha de forma atómica (falla si no alcanza) y hace el upsert de los vínculos
+        await reservar_stock(db, reserva.Fecha, cantidades)
+        await sumar_cantidades(db, reserva_id, cantidades)
+        delta = sum(precios[codigo] * cantidad for codigo, cantidad in cantidades.items())
+        if delta:
+            await sumar_precio_total(db, reserva, delta)
+        await auditoria.registrar(
+            db, "ELEM_ADD", current_user.correo, reserva_id,
+            antes={"elementos": {codigo: cantidad for codigo, (cantidad, _) in vinculos.items()}},
+            despues={"agregados": cantidades, "delta_precio": delta},
+        )
         await db.commit()
-        await db.refresh(reserva)
-
-        # Recargar la reserva con los elementos
-        reserva_updated = (await db.execute(select(Reserva).options(selectinload(Reserva.reservas_elementos).selectinload(ReservaElemento.elemento)).where(Reserva.ID_Reserva == reserva_id))).scalars().first()
-
-        # Calcular y devolver el precio total actualizado
-        reserva_updated.Precio_Total = await calculate_total_price(reserva_updated, db)
-        return reserva_updated
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al añadir elementos a la reserva: {e}")
 
-@router.delete("/{reserva_id}/elementos/{codigo_elemento}", status_code=status.HTTP_200_OK)
-async def remove_elemento_from_reserva(
-    reserva_id: int,
-    codigo_elemento: int,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    reserva = await db.get(Reserva, reserva_id)
-    if not reserva or reserva.Correo_Usuario != current_user.correo:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reserva no encontrada o no tienes permiso.")
+    await _actualizar_precio_respuesta(db, reserva, delta)
+    actuales = {codigo: cantidad for codigo, (cantidad, _) in vinculos.items()}
+    for codigo_elemento, cantidad in cantidades.items():
+        actuales[codigo_elemento] = actuales.get(codigo_elemento, 0) + cantidad
+    return reserva_respuesta(reserva, actuales)
 
-    reserva_elemento = (await db.execute(
-        select(ReservaElemento).where(
-            ReservaElemento.ID_Reserva == reserva_id,
-            ReservaElemento.Codigo_Elemento == codigo_elemento
-        )
-    )).scalars().first()
+async def _quitar_elementos(db: AsyncSession, reserva_id: int, codigos: List[int], correo: str) -> dict:
+    reserva = await _cargar_reserva_propia(db, reserva_id, correo)
+    vinculos = await _vinculos_con_precio(db, reserva_id)
 
-    if not reserva_elemento:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="El elemento no está asociado a esta reserva.")
+    codigos = sorted(set(codigos))
+    faltantes = [codigo for codigo in codigos if codigo not in vinculos]
+    if faltantes:
+        detalle = "El elemento no está asociado a esta reserva." if len(codigos) == 1 else f"Elementos no asociados a esta reserva: {', '.join(map(str, faltantes))}."
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detalle)
 
+    delta = -sum(vinculos[codigo][0] * vinculos[codigo][1] for codigo in codigos)
     try:
-        
-
-        await db.delete(reserva_elemento)
+        # Liberar en el inventario de la fecha las cantidades reservadas y borrar los vínculos (un UPDATE y un DELETE)
+        await liberar_stock(db, reserva.Fecha, {codigo: vinculos[codigo][0] for codigo in codigos})
+        await db.execute(
+            delete(ReservaElemento).where(
+                ReservaElemento.ID_Reserva == reserva_id,
+                ReservaElemento.Codigo_Elemento.in_(codigos)
+            )
+        )
+        if delta:
+            await sumar_precio_total(db, reserva, delta)
+        await auditoria.registrar(
+            db, "ELEM_DEL", correo, reserva_id,
+            antes={"elementos": {codigo: cantidad for codigo, (cantidad, _) in vinculos.items()}},
+            despues={"quitados": codigos, "delta_precio": delta},
+        )
         await db.commit()
-        await db.refresh(reserva)
-
-        # Recargar la reserva con los elementos
-        reserva_updated = (await db.execute(select(Reserva).options(selectinload(Reserva.reservas_elementos).selectinload(ReservaElemento.elemento)).where(Reserva.ID_Reserva == reserva_id))).scalars().first()
-
-        # Calcular y devolver el precio total actualizado
-        reserva_updated.Precio_Total = await calculate_total_price(reserva_updated, db)
-        return reserva_updated
     except Exception as e:
         await db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al eliminar elemento de la reserva: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al eliminar elementos de la reserva: {e}")
+
+    await _actualizar_precio_respuesta(db, reserva, delta)
+    return reserva_respuesta(reserva, {codigo: cantidad for codigo, (cantidad, _) in vinculos.items() if codigo not in codigos})
+
+# Borrado en lote: DELETE /reservas/{id}/elementos?codigos=1&codigos=2
+@router.delete("/{reserva_id}/elementos", response_model=schemas.Reserva, status_code=status.HTTP_200_OK)
+async def remove_elementos_from_reserva(
+    reserva_id: int,
+    codigos: List[int] = Query(..., min_length=1),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    return await _quitar_elementos(db, reserva_id, codigos, current_user.correo)
+
+@router.delete("/{reserva_id}/elementos/{codigo_elemento}", response_model=schemas.Reserva, status_code=status.HTTP_200_OK)
+async def remove_elemento_from_reserva(
+    reserva_id: int,
+    codigo_elemento: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    return await _quitar_elementos(db, reserva_id, [codigo_elemento], current_user.correo)
 # --- Endpoint para cancelar una reserva ---
 @router.delete("/{reserva_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def cancel_reserva(
     reserva_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     reserva = await db.get(Reserva, reserva_id)
@@ -289,8 +467,18 @@ async def cancel_reserva(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reserva no encontrada o no tienes permiso.")
 
     try:
+        # Liberar en el inventario de la fecha los elementos de la reserva y borrar sus vínculos
+        res_elems = (await db.execute(
+            select(ReservaElemento.Codigo_Elemento, ReservaElemento.Cantidad)
+            .where(ReservaElemento.ID_Reserva == reserva_id)
+            .order_by(ReservaElemento.Codigo_Elemento)
+        )).all()
+        await liberar_stock(db, reserva.Fecha, dict(res_elems))
+        await auditoria.registrar(db, "DELETE", current_user.correo, reserva_id, antes=datos_auditoria(reserva, dict(res_elems)))
+        await db.execute(delete(ReservaElemento).where(ReservaElemento.ID_Reserva == reserva_id))
         await db.delete(reserva)
         await db.commit()
+        occupancy_index.remove(reserva.ID_Escenario, reserva.Fecha)
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al cancelar la reserva: {e}")
@@ -300,7 +488,7 @@ async def cancel_reserva(
 async def update_reserva(
     reserva_id: int,
     reserva_update: schemas.ReservaUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     reserva = await db.get(Reserva, reserva_id)
@@ -310,15 +498,17 @@ async def update_reserva(
     if current_user.rango != "admin" and reserva.Correo_Usuario != current_user.correo:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes permisos para actualizar esta reserva.")
     # Solo se permite actualizar el estado
+    estado_anterior = reserva.Estado
     if reserva_update.Estado:
         reserva.Estado = reserva_update.Estado
 
     try:
+        if reserva.Estado != estado_anterior:
+            await auditoria.registrar(db, "UPDATE", current_user.correo, reserva_id, antes={"Estado": estado_anterior}, despues={"Estado": reserva.Estado})
         await db.commit()
-        await db.refresh(reserva)
+        await db.refresh(reserva, attribute_names=["reservas_elementos"])
 
-        # Calcular y devolver el precio total actualizado
-        reserva.Precio_Total = await calculate_total_price(reserva, db)
+        await assign_total_prices([reserva], db) # Solo si la fila aún no tiene Precio_Total
         return reserva
     except Exception as e:
         await db.rollback()
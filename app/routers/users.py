@@ -4,15 +4,20 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
-from typing import List
+from typing import List, Optional, Union
 from datetime import datetime
 from pydantic import EmailStr
 from ..database.database import get_db
 from ..models.models import User
 from .. import schemas
-from ..security import get_password_hash # Importa get_password_hash desde security.py
+from ..audit import auditoria
+from ..pagination import keyset_page, page_limit
+from ..security import get_password_hash_async # Hash en el pool de bcrypt
 
-from .auth import get_current_user # Importa get_current_user desde auth.py para proteger rutas
+from ..principal import Principal, principal_cache
+from ..ratelimit import login_limiter
+from ..fastjson import fast_json, schema_columns
+from .auth import get_current_user, get_current_principal # Para proteger rutas
 
 # --- Crear el router para usuarios ---
 router = APIRouter(
@@ -23,7 +28,7 @@ router = APIRouter(
 # --- Endpoint para crear usuarios (signup) ---
 @router.post("/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
 async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
-    hashed_password = get_password_hash(user.contrasenia)
+    hashed_password = await get_password_hash_async(user.contrasenia)
 
     db_user = User(
         correo=user.correo,
@@ -37,6 +42,11 @@ async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_d
     )
     db.add(db_user)
     try:
+        # La auditoría va en la misma transacción (outbox): un correo duplicado no deja evento
+        await auditoria.registrar(
+            db, "INSERT", user.correo, entidad="Usuario", referencia=user.correo,
+            despues={"nombres": user.nombres, "apellidos": user.apellidos, "rango": "usuario"},
+        )
         await db.commit() # Confirma la transacción y guarda el usuario
         await db.refresh(db_user) # Refresca el objeto db_user para obtener el ID generado
         return db_user
@@ -62,11 +72,14 @@ async def update_user_me(
     # No se permite cambiar el rango, intentos_login, bloqueado, fecha_creacion, ultimo_login.
 
     # Itera sobre los campos proporcionados en user_update
-    for field, value in user_update.model_dump(exclude_unset=True).items():
+    cambios = user_update.model_dump(exclude_unset=True)
+    antes = {field: getattr(current_user, field) for field in cambios}
+    for field, value in cambios.items():
         # exclude_unset=True asegura que solo se actualicen los campos que realmente se enviaron
         setattr(current_user, field, value)
 
     try:
+        await auditoria.registrar(db, "UPDATE", current_user.correo, entidad="Usuario", referencia=current_user.correo, antes=antes, despues=cambios)
         await db.commit()
         await db.refresh(current_user) # Refresca el objeto current_user con los datos actualizados de la DB
         return current_user
@@ -77,7 +90,7 @@ async def update_user_me(
 async def admin_update_user(
     user_email: str, # El correo del usuario a modificar
     user_admin_update: schemas.UserAdminUpdate, # Los campos a actualizar (rango, bloqueado)
-    current_user: User = Depends(get_current_user), # El administrador que hace la solicitud
+    current_user: Principal = Depends(get_current_principal), # El administrador que hace la solicitud
     db: AsyncSession = Depends(get_db)
 ):
     # 1. Verificar que el usuario actual es un administrador
@@ -101,7 +114,9 @@ async def admin_update_user(
         )
 
     # 4. Actualizar los campos especificados por el administrador
-    for field, value in user_admin_update.model_dump(exclude_unset=True).items():
+    cambios = user_admin_update.model_dump(exclude_unset=True)
+    antes = {field: getattr(user_to_update, field) for field in cambios}
+    for field, value in cambios.items():
         # Validar los valores del rango para evitar rangos inválidos
         if field == "rango" and value not in ["usuario", "admin"]:
             raise HTTPException(
@@ -109,9 +124,18 @@ async def admin_update_user(
                 detail=f"Rango '{value}' no válido. Los rangos permitidos son 'usuario' y 'administrador'."
             )
         setattr(user_to_update, field, value)
+        if field == "bloqueado" and value is False:
+            user_to_update.intentos_login = 0 # Al desbloquear, la cuenta empieza de cero
+
+    # Revocar los tokens emitidos con el rango/bloqueo anterior
+    user_to_update.token_version = (user_to_update.token_version or 0) + 1
 
     try:
+        await auditoria.registrar(db, "UPDATE", current_user.correo, entidad="Usuario", referencia=user_to_update.correo, antes=antes, despues=cambios)
         await db.commit()
+        await principal_cache.invalidate(user_to_update.correo)
+        if user_admin_update.bloqueado is False:
+            await login_limiter.reset_account(user_to_update.correo)
         await db.refresh(user_to_update) # Refresca el objeto con los datos actualizados
         return user_to_update
     except Exception as e:
@@ -129,19 +153,28 @@ async def read_user(user_correo: EmailStr, db: AsyncSession = Depends(get_db)):
     return user
 
 # --- Obtener todos los usuarios (ejemplo de ruta, requiere autenticación de administrador) ---
-@router.get("/", response_model=List[schemas.User])
-async def read_users(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db),
-                     current_user: User = Depends(get_current_user)):
+# Con ?cursor= (vacío para la primera página) responde {items, next_cursor} paginando por correo;
+# sin cursor mantiene el modo skip/limit de siempre.
+@router.get("/", response_model=Union[schemas.Pagina[schemas.User], List[schemas.User]])
+async def read_users(skip: int = 0, limit: int = Depends(page_limit(100)), cursor: Optional[str] = None,
+                     db: AsyncSession = Depends(get_db),
+                     current_user: Principal = Depends(get_current_principal)):
     """Obtiene una lista de usuarios con paginación."""
-    # Aquí también se elimina el 'async with db as session:'
-    result = await db.execute(
-        select(User).offset(skip).limit(limit)
-
-    )
     if current_user.rango != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="No tienes permisos para realizar esta acción. Se requiere rol de administrador."
         )
+    if fast_json.enabled:
+        # Ruta rápida: columnas + orjson, sin objetos ORM ni revalidación Pydantic
+        filas, next_cursor = await fast_json.page(db, select(*schema_columns(User, schemas.User)), User.correo, skip, limit, cursor)
+        return fast_json.response(fast_json.envelope(filas, next_cursor, cursor))
+    if cursor is not None:
+        users, next_cursor = await keyset_page(db, select(User), User.correo, cursor, limit)
+        return {"items": users, "next_cursor": next_cursor}
+
+    result = await db.execute(
+        select(User).order_by(User.correo).offset(skip).limit(limit)
+    )
     users = result.scalars().all()
-    return users
\ No newline at end of file
+    return users
@@ -2,10 +2,17 @@
 
 from pydantic import BaseModel, EmailStr, Field # Asegúrate de importar EmailStr
 from datetime import datetime, date
-from typing import Optional, List # Para campos opcionales si los usas
+from typing import Generic, Optional, List, TypeVar # Para campos opcionales si los usas
 
+T = TypeVar("T")
 
 
+
+# --- ESQUEMA: Página de resultados con paginación por cursor ---
+class Pagina(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None # None cuando no hay más resultados
+
 class UserBase(BaseModel):
     correo: EmailStr # Usa EmailStr para validación de correo
     nombres: str
@@ -62,13 +69,21 @@ class Elemento(ElementoBase):
     class Config:
         from_attributes = True
 
+# --- ESQUEMA: Unidades de un elemento libres en una fecha (inventario por fecha) ---
+class DisponibilidadElemento(BaseModel):
+    Codigo: int
+    Nombre: str
+    Stock: int # Cantidad total del elemento
+    Reservado: int # Unidades comprometidas por reservas de esa fecha
+    Disponible: int
+
 # --- ESQUEMA: Para la tabla intermedia (ReservaElemento) ---
 class ReservaElementoBase(BaseModel):
     Codigo_Elemento: int
     Cantidad: int
 
 class ReservaElementoCreate(ReservaElementoBase):
-    pass
+    Cantidad: int = Field(..., gt=0) # Una cantidad negativa restaría del inventario y del precio
 
 class ReservaElementoResponse(ReservaElementoBase):
 
@@ -135,4 +150,78 @@ class Escenario(EscenarioBase):
     Fecha_creacion: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- ESQUEMA: Disponibilidad (calendario de ocupación de un escenario) ---
+class Disponibilidad(BaseModel):
+    ID_Escenario: int
+    desde: date
+    hasta: date
+    ocupadas: List[date] = []
+    disponibles: List[date] = []
+
+# --- ESQUEMAS: Carga masiva de reservas ---
+class ResultadoFilaBulk(BaseModel):
+    fila: int # Posición de la fila en el archivo/arreglo (desde 1)
+    ok: bool
+    ID_Reserva: Optional[int] = None
+    error: Optional[str] = None
+
+class ResultadoBulk(BaseModel):
+    total: int
+    creadas: int
+    errores: int
+    resultados: List[ResultadoFilaBulk] = []
+
+# --- ESQUEMAS: Analíticas de administración (agregadas en SQL) ---
+class OcupacionMensual(BaseModel):
+    ID_Escenario: int
+    Direccion: str
+    periodo: str # AAAA-MM
+    reservas: int
+    dias: int # Días del mes dentro del rango consultado
+    tasa_ocupacion: float # reservas / dias (un escenario admite una reserva por fecha)
+
+class IngresosEscenario(BaseModel):
+    ID_Escenario: int
+    Direccion: str
+    reservas: int
+    ingresos: int
+
+class IngresosElemento(BaseModel):
+    Codigo: int
+    Nombre: str
+    reservas: int
+    cantidad: int
+    ingresos: int
+
+# --- ESQUEMAS: Series de reservas (varias fechas del mismo escenario) ---
+class Recurrencia(BaseModel):
+    frecuencia: str = Field(..., pattern="^(diaria|semanal|mensual)$")
+    intervalo: int = Field(1, ge=1, le=366) # Cada cuántos días / semanas / meses
+    desde: date
+    hasta: Optional[date] = None # Inclusive; se necesita 'hasta' o 'repeticiones'
+    repeticiones: Optional[int] = Field(None, ge=1)
+    dias_semana: Optional[List[int]] = None # Solo semanal: 0 = lunes ... 6 = domingo
+
+class ReservaSerieCreate(BaseModel):
+    ID_Escenario: int
+    fechas: Optional[List[date]] = None # Lista explícita de fechas...
+    recurrencia: Optional[Recurrencia] = None # ...o una regla de recurrencia
+    excluir: List[date] = [] # Fechas a saltar (festivos, etc.)
+    elementos_seleccionados: Optional[List[ReservaElementoCreate]] = None # Para cada fecha
+    todo_o_nada: bool = False # True: si alguna fecha está ocupada no se reserva ninguna
+
+class ResultadoFechaSerie(BaseModel):
+    Fecha: date
+    ok: bool
+    ID_Reserva: Optional[int] = None
+    error: Optional[str] = None
+
+class ResultadoSerie(BaseModel):
+    ID_Escenario: int
+    solicitadas: int
+    creadas: int
+    conflictos: int
+    Precio_Total: int # Suma de las reservas creadas
+    resultados: List[ResultadoFechaSerie] = []
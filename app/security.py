@@ -1,7 +1,106 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+import asyncio
+import os
+import threading
+import time
+
+from .metrics import metrics_registry, record_bcrypt_time
+
+# --- Configuración de bcrypt ---
+# BCRYPT_ROUNDS: factor de coste. Si cambia, los hashes antiguos se marcan como obsoletos
+# y (con BCRYPT_REHASH_ON_LOGIN) se re-hashean en el siguiente login correcto.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_MAX_WORKERS = int(os.getenv("BCRYPT_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+BCRYPT_REHASH_ON_LOGIN = os.getenv("BCRYPT_REHASH_ON_LOGIN", "true").strip().lower() in ("1", "true", "yes", "si", "on")
 
 # Inicializa el contexto de hashing para contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Pool acotado de hilos: bcrypt libera el GIL, así que el event loop sigue libre
+# mientras se calcula el hash. Como máximo BCRYPT_MAX_WORKERS hashes en paralelo.
+_bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_MAX_WORKERS, thread_name_prefix="bcrypt")
+
+
+class HashingStats:
+    """
+    Métricas de la cola de bcrypt: trabajos en espera, en curso y tiempos acumulados.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+
+    def _enqueue(self):
+        with self._lock:
+            self.queued += 1
+
+    def _start(self, waited: float):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.queue_wait_total += waited
+            if waited > self.queue_wait_max:
+                self.queue_wait_max = waited
+
+    def _finish(self, elapsed: float):
+        with self._lock:
+            self.running -= 1
+            self.completed += 1
+            self.hash_time_total += elapsed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": BCRYPT_MAX_WORKERS,
+                "rounds": BCRYPT_ROUNDS,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "queue_wait_total_ms": round(self.queue_wait_total * 1000, 3),
+                "queue_wait_max_ms": round(self.queue_wait_max * 1000, 3),
+                "hash_time_total_ms": round(self.hash_time_total * 1000, 3),
+            }
+
+
+hashing_stats = HashingStats()
+
+def _bcrypt_metrics():
+    snap = hashing_stats.snapshot()
+    return [
+        ("bcrypt_queued", "Hashes bcrypt esperando un hilo libre.", "gauge", snap["queued"]),
+        ("bcrypt_running", "Hashes bcrypt en curso.", "gauge", snap["running"]),
+        ("bcrypt_completed_total", "Hashes bcrypt completados.", "counter", snap["completed"]),
+        ("bcrypt_queue_wait_seconds_total", "Tiempo total en la cola de bcrypt.", "counter", snap["queue_wait_total_ms"] / 1000),
+        ("bcrypt_hash_seconds_total", "Tiempo total calculando hashes bcrypt.", "counter", snap["hash_time_total_ms"] / 1000),
+    ]
+
+metrics_registry.register_collector(_bcrypt_metrics)
+
+
+async def _run_in_bcrypt_pool(func, *args):
+    enqueued_at = time.perf_counter()
+    hashing_stats._enqueue()
+
+    def job():
+        started_at = time.perf_counter()
+        hashing_stats._start(started_at - enqueued_at)
+        try:
+            return func(*args)
+        finally:
+            hashing_stats._finish(time.perf_counter() - started_at)
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_bcrypt_executor, job)
+    finally:
+        # Cola + hash: es lo que la petición realmente esperó por bcrypt
+        record_bcrypt_time(time.perf_counter() - enqueued_at)
+
 
 def get_password_hash(password: str) -> str:
     """
@@ -13,4 +112,25 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verifica si una contraseña en texto plano coincide con un hash de contraseña.
     """
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Igual que get_password_hash, pero ejecutado en el pool de bcrypt (no bloquea el event loop).
+    """
+    return await _run_in_bcrypt_pool(pwd_context.hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Igual que verify_password, pero ejecutado en el pool de bcrypt (no bloquea el event loop).
+    """
+    return await _run_in_bcrypt_pool(pwd_context.verify, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica la contraseña y, si el hash usa un coste distinto al configurado,
+    devuelve también el nuevo hash (o None si no hace falta re-hashear).
+    """
+    if not BCRYPT_REHASH_ON_LOGIN:
+        return await verify_password_async(plain_password, hashed_password), None
+    return await _run_in_bcrypt_pool(pwd_context.verify_and_update, plain_password, hashed_password)
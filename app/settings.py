@@ -0,0 +1,71 @@
+# app/settings.py
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+import os
+
+from dotenv import load_dotenv
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "si", "on")
+
+
+# --- Configuración de arranque de la aplicación (ver create_app en app/main.py) ---
+# Importar un módulo de la aplicación ya no lee estas variables ni crea engines: se leen
+# aquí, al llamar a Settings.from_env(), y la base de datos se construye con ellas la
+# primera vez que se necesita.
+@dataclass
+class Settings:
+    database_url: Optional[str] = None
+
+    # Pool de conexiones. Tamaño total por worker de uvicorn = db_pool_size + db_max_overflow
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800 # MariaDB cierra conexiones inactivas (wait_timeout)
+    db_pool_pre_ping: bool = True
+    db_echo: bool = False # Log de cada sentencia SQL (solo para depuración)
+
+    # Réplicas de lectura (opcionales): las peticiones GET/HEAD leen de ellas;
+    # escrituras y lecturas posteriores a una escritura van a database_url.
+    replica_urls: List[str] = field(default_factory=list)
+    replica_pool_size: Optional[int] = None # Por defecto, db_pool_size
+    replica_health_interval: float = 10 # segundos entre revisiones
+    replica_health_timeout: float = 2
+    # Tras una escritura, el mismo cliente lee de la primaria durante estos segundos (lag de replicación)
+    replica_sticky_seconds: float = 5
+
+    # "verify" (por defecto: el arranque falla si faltan migraciones),
+    # "migrate" (aplica las pendientes al arrancar; solo para desarrollo / una instancia) u "off".
+    schema_mode: str = "verify"
+
+    # Precalentamiento al arrancar: conexiones abiertas por adelantado en cada pool
+    # (como máximo su tamaño) y primeras páginas de los catálogos en la caché.
+    prewarm_connections: int = 0
+    prewarm_catalogs: bool = False
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        load_dotenv()
+        db_pool_size = int(os.getenv("DB_POOL_SIZE", "5"))
+        return cls(
+            database_url=os.getenv("DATABASE_URL"),
+            db_pool_size=db_pool_size,
+            db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            db_pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            db_pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+            db_echo=_env_bool("DB_ECHO", False),
+            replica_urls=[u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()],
+            replica_pool_size=int(os.getenv("DB_REPLICA_POOL_SIZE", str(db_pool_size))),
+            replica_health_interval=float(os.getenv("DB_REPLICA_HEALTH_INTERVAL", "10")),
+            replica_health_timeout=float(os.getenv("DB_REPLICA_HEALTH_TIMEOUT", "2")),
+            replica_sticky_seconds=float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5")),
+            schema_mode=os.getenv("DB_SCHEMA_MODE", "verify").strip().lower(),
+            prewarm_connections=int(os.getenv("DB_PREWARM_CONNECTIONS", "0")),
+            prewarm_catalogs=_env_bool("PREWARM_CATALOGS", False),
+        )
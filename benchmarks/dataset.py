@@ -0,0 +1,124 @@
+# benchmarks/dataset.py
+#
+# Generador de datos sintéticos para los benchmarks: usuarios, escenarios, elementos y
+# reservas con elementos. Es determinista para una misma --semilla y solo usa fechas
+# posteriores a las que ya existan en la base, así que puede ejecutarse varias veces.
+
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import List
+
+from sqlalchemy import func, insert
+from sqlalchemy.future import select
+
+from app.database.database import async_session_maker, get_engine
+from app.database.migrations import upgrade
+from app.models.models import User, Escenario, Elemento, Reserva, ReservaElemento
+from app.routers.auth import create_access_token, build_token_claims
+from app.security import get_password_hash
+
+BENCH_PASSWORD = "benchmark-password"
+
+
+@dataclass
+class Dataset:
+    correos: List[str]
+    pesados: List[str] # Usuarios con muchas reservas (escenario /reservas/me)
+    tokens: dict # correo -> JWT ya emitido (evita bcrypt fuera del escenario de login)
+    escenario_ids: List[int]
+    elemento_codigos: List[int]
+    fecha_libre: date # Primera fecha sin reservas en ningún escenario del dataset
+    conteos: dict = field(default_factory=dict)
+
+
+async def seed(
+    usuarios: int = 200,
+    escenarios: int = 50,
+    elementos: int = 30,
+    pesados: int = 5,
+    reservas_por_pesado: int = 500,
+    reservas_por_usuario: int = 3,
+    elementos_por_reserva: int = 2,
+    semilla: int = 42,
+) -> Dataset:
+    rnd = random.Random(semilla)
+    await upgrade(get_engine()) # Esquema al día (idempotente)
+
+    sufijo = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+    ahora = datetime.utcnow()
+    # Un único hash para todos: el coste de bcrypt se mide en el escenario de login, no aquí
+    hash_bench = get_password_hash(BENCH_PASSWORD)
+
+    async with async_session_maker() as db:
+        correos = [f"bench{i}_{sufijo}@example.com" for i in range(usuarios)]
+        await db.execute(insert(User), [
+            {"correo": correo, "nombres": "Bench", "apellidos": str(i), "contrasenia": hash_bench,
+             "rango": "usuario", "intentos_login": 0, "bloqueado": False, "token_version": 0,
+             "fecha_creacion": ahora}
+            for i, correo in enumerate(correos)
+        ])
+
+        max_escenario = (await db.execute(select(func.coalesce(func.max(Escenario.ID_Escenario), 0)))).scalar_one()
+        escenario_ids = list(range(max_escenario + 1, max_escenario + 1 + escenarios))
+        precios_escenario = {eid: rnd.randrange(50_000, 500_000, 1000) for eid in escenario_ids}
+        await db.execute(insert(Escenario), [
+            {"ID_Escenario": eid, "Direccion": f"Cancha {eid} {sufijo}", "Capacidad": rnd.randint(10, 500),
+             "Precio": precios_escenario[eid], "Activo": rnd.random() > 0.1, "Fecha_creacion": ahora}
+            for eid in escenario_ids
+        ])
+
+        max_elemento = (await db.execute(select(func.coalesce(func.max(Elemento.Codigo), 0)))).scalar_one()
+        elemento_codigos = list(range(max_elemento + 1, max_elemento + 1 + elementos))
+        precios_elemento = {codigo: rnd.randrange(1_000, 50_000, 500) for codigo in elemento_codigos}
+        await db.execute(insert(Elemento), [
+            {"Codigo": codigo, "Nombre": f"Elemento {codigo}", "Precio": precios_elemento[codigo],
+             "Stock": 1_000_000, "Fecha_creacion": ahora}
+            for codigo in elemento_codigos
+        ])
+
+        # Reservas: el usuario i-ésimo de la lista de dueños ocupa el siguiente hueco
+        # (escenario, fecha) libre, de modo que nunca se viola la restricción única
+        max_fecha = (await db.execute(select(func.max(Reserva.Fecha)))).scalar_one()
+        fecha_base = max(max_fecha or date.today(), date.today()) + timedelta(days=1)
+        duenos = [c for c in correos[:pesados] for _ in range(reservas_por_pesado)]
+        duenos += [c for c in correos[pesados:] for _ in range(reservas_por_usuario)]
+        rnd.shuffle(duenos)
+
+        max_reserva = (await db.execute(select(func.coalesce(func.max(Reserva.ID_Reserva), 0)))).scalar_one()
+        reservas, vinculos = [], []
+        for i, correo in enumerate(duenos):
+            reserva_id = max_reserva + 1 + i
+            escenario_id = escenario_ids[i % escenarios]
+            precio_total = precios_escenario[escenario_id]
+            for codigo in rnd.sample(elemento_codigos, min(elementos_por_reserva, len(elemento_codigos))):
+                cantidad = rnd.randint(1, 4)
+                vinculos.append({"ID_Reserva": reserva_id, "Codigo_Elemento": codigo, "Cantidad": cantidad})
+                precio_total += precios_elemento[codigo] * cantidad
+            reservas.append({
+                "ID_Reserva": reserva_id, "Correo_Usuario": correo, "Lugar": f"Cancha {escenario_id} {sufijo}",
+                "Precio": precios_escenario[escenario_id], "Fecha": fecha_base + timedelta(days=i // escenarios),
+                "ID_Escenario": escenario_id, "Estado": rnd.choice(["Pendiente", "Confirmada"]), "Fecha_creacion": ahora,
+                "Precio_Total": precio_total,
+            })
+
+        for inicio in range(0, len(reservas), 1000):
+            await db.execute(insert(Reserva), reservas[inicio:inicio + 1000])
+        for inicio in range(0, len(vinculos), 1000):
+            await db.execute(insert(ReservaElemento), vinculos[inicio:inicio + 1000])
+        await db.commit()
+
+    tokens = {
+        correo: create_access_token(build_token_claims(User(correo=correo, rango="usuario", bloqueado=False, token_version=0)))
+        for correo in correos
+    }
+    return Dataset(
+        correos=correos,
+        pesados=correos[:pesados],
+        tokens=tokens,
+        escenario_ids=escenario_ids,
+        elemento_codigos=elemento_codigos,
+        fecha_libre=fecha_base + timedelta(days=len(duenos) // max(escenarios, 1) + 1),
+        conteos={"usuarios": usuarios, "escenarios": escenarios, "elementos": elementos,
+                 "reservas": len(reservas), "reservas_elementos": len(vinculos)},
+    )
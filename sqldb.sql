@@ -1,4 +1,7 @@
 -- Crear la base de datos con configuración de seguridad
+-- Después de crearla, registrar la versión del esquema con:
+--   python -m app.database.migrations upgrade
+-- (las migraciones detectan lo que ya existe y solo agregan lo que falte)
 CREATE DATABASE IF NOT EXISTS ProyectoReservas
 CHARACTER SET utf8mb4
 COLLATE utf8mb4_unicode_ci;
@@ -15,6 +18,7 @@ Intentos_login INT DEFAULT 0,
 Bloqueado BOOLEAN DEFAULT FALSE,
 Fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
 Ultimo_login TIMESTAMP NULL,
+Token_version INT NOT NULL DEFAULT 0,
 INDEX idx_apellidos (Apellidos)
 ) ENGINE=InnoDB;
 -- Tabla Escenario con auto-incremento
@@ -22,16 +26,17 @@ CREATE TABLE Escenario (
 ID_Escenario INT AUTO_INCREMENT PRIMARY KEY,
 Direccion VARCHAR(255) NOT NULL,
 Capacidad INT NOT NULL CHECK (Capacidad > 0),
-Precio DECIMAL(10,2) NOT NULL CHECK (Precio >= 0),
+Precio INT NOT NULL CHECK (Precio >= 0),
 Activo BOOLEAN DEFAULT TRUE,
 Fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-INDEX idx_direccion (Direccion)
+INDEX idx_direccion (Direccion),
+INDEX ix_escenario_activo_capacidad_precio (Activo, Capacidad, Precio) -- Búsqueda de disponibles
 ) ENGINE=InnoDB;
 -- Tabla Elementos con autoincremento
 CREATE TABLE Elementos (
 Codigo INT AUTO_INCREMENT PRIMARY KEY,
 Nombre VARCHAR(255) NOT NULL,
-Precio DECIMAL(10,2) NOT NULL CHECK (Precio >= 0),
+Precio INT NOT NULL CHECK (Precio >= 0),
 Stock INT DEFAULT 1 CHECK (Stock >= 0),
 
 Fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -42,18 +47,25 @@ CREATE TABLE Reservas (
 ID_Reserva INT AUTO_INCREMENT PRIMARY KEY,
 Correo_Usuario VARCHAR(255) NOT NULL,
 Lugar VARCHAR(255) NOT NULL,
-Precio DECIMAL(10,2) NOT NULL CHECK (Precio >= 0),
+Precio INT NOT NULL CHECK (Precio >= 0),
 Fecha DATE NOT NULL,
-Hora TIME NOT NULL,
+Hora TIME NULL, -- La API no maneja horas
+
 ID_Escenario INT NOT NULL,
 Estado ENUM('pendiente', 'confirmada', 'cancelada', 'completada') DEFAULT 'pendiente',
 Fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+-- Precio del escenario + elementos, mantenido por la API (NULL = pendiente de reconciliar)
+Precio_Total INT NULL,
 FOREIGN KEY (Correo_Usuario) REFERENCES Usuarios(Correo) ON UPDATE
 CASCADE,
 FOREIGN KEY (ID_Escenario) REFERENCES Escenario(ID_Escenario),
 CONSTRAINT chk_fecha_valida CHECK (Fecha >= '1000-01-01'), -- Fecha mínima
 permitida
-INDEX idx_fecha (Fecha)
+INDEX idx_fecha (Fecha),
+INDEX ix_reservas_correo_usuario (Correo_Usuario), -- /reservas/me
+INDEX ix_reservas_fecha_escenario_total (Fecha, ID_Escenario, Precio_Total), -- Analíticas
+-- Evita reservas dobles del mismo escenario en la misma fecha
+CONSTRAINT uq_reserva_escenario_fecha UNIQUE (ID_Escenario, Fecha)
 ) ENGINE=InnoDB;
 -- Tabla Reservas_Elementos con claves foráneas seguras
 CREATE TABLE Reservas_Elementos (
@@ -61,11 +73,41 @@ ID_Reserva INT NOT NULL,
 Codigo_Elemento INT NOT NULL,
 Cantidad INT DEFAULT 1 CHECK (Cantidad > 0),
 PRIMARY KEY (ID_Reserva, Codigo_Elemento),
+INDEX ix_reservas_elementos_codigo (Codigo_Elemento),
 FOREIGN KEY (ID_Reserva) REFERENCES Reservas(ID_Reserva) ON DELETE
 CASCADE,
 FOREIGN KEY (Codigo_Elemento) REFERENCES Elementos(Codigo) ON UPDATE
 CASCADE
 ) ENGINE=InnoDB;
+-- Inventario por fecha: unidades de cada elemento reservadas cada día (Elementos.Stock es el total)
+CREATE TABLE Inventario_Elementos (
+Codigo_Elemento INT NOT NULL,
+Fecha DATE NOT NULL,
+Reservado INT NOT NULL DEFAULT 0,
+PRIMARY KEY (Codigo_Elemento, Fecha),
+FOREIGN KEY (Codigo_Elemento) REFERENCES Elementos(Codigo) ON DELETE
+CASCADE
+) ENGINE=InnoDB;
+-- Resúmenes mensuales para analíticas (Periodo = AAAAMM; los recalcula la API)
+CREATE TABLE Resumen_Mensual_Escenario (
+ID_Escenario INT NOT NULL,
+Periodo INT NOT NULL,
+Reservas INT NOT NULL,
+Ingresos INT NOT NULL,
+Actualizado DATETIME NULL,
+PRIMARY KEY (ID_Escenario, Periodo),
+FOREIGN KEY (ID_Escenario) REFERENCES Escenario(ID_Escenario)
+) ENGINE=InnoDB;
+CREATE TABLE Resumen_Mensual_Elemento (
+Codigo_Elemento INT NOT NULL,
+Periodo INT NOT NULL,
+Reservas INT NOT NULL,
+Cantidad INT NOT NULL,
+Ingresos INT NOT NULL,
+Actualizado DATETIME NULL,
+PRIMARY KEY (Codigo_Elemento, Periodo),
+FOREIGN KEY (Codigo_Elemento) REFERENCES Elementos(Codigo)
+) ENGINE=InnoDB;
 -- Creación de usuarios con privilegios limitados
 CREATE USER 'reservas_app'@'localhost' IDENTIFIED BY 'Un4C0ntrs3n!4F0rt3';
 GRANT SELECT, INSERT, UPDATE, DELETE ON ProyectoReservas.* TO 'reservas_app'@'localhost';
@@ -77,30 +119,28 @@ SELECT r.ID_Reserva, r.Lugar, r.Precio, r.Fecha, r.Hora, e.Direccion
 FROM Reservas r
 JOIN Escenario e ON r.ID_Escenario = e.ID_Escenario
 WHERE r.Correo_Usuario = CURRENT_USER();
--- Creación de triggers para auditoría
+-- Auditoría: la API (app/audit.py) escribe cada evento en Auditoria_Outbox dentro de la
+-- transacción del cambio y lo traslada aquí en lotes; ya no hay triggers sobre Reservas
 CREATE TABLE AuditoriaReservas (
 ID_Auditoria INT AUTO_INCREMENT PRIMARY KEY,
-
 ID_Reserva INT,
 Accion VARCHAR(10),
 Usuario VARCHAR(255),
 Fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-Datos_anteriores TEXT
+Datos_anteriores TEXT,
+Entidad VARCHAR(20) NULL,
+Referencia VARCHAR(255) NULL,
+Datos_nuevos TEXT NULL
 ) ENGINE=InnoDB;
-DELIMITER //
-CREATE TRIGGER after_reserva_insert
-AFTER INSERT ON Reservas
-FOR EACH ROW
-BEGIN
-INSERT INTO AuditoriaReservas (ID_Reserva, Accion, Usuario)
-VALUES (NEW.ID_Reserva, 'INSERT', CURRENT_USER());
-END//
-CREATE TRIGGER before_reserva_delete
-BEFORE DELETE ON Reservas
-FOR EACH ROW
-BEGIN
-INSERT INTO AuditoriaReservas (ID_Reserva, Accion, Usuario, Datos_anteriores)
-VALUES (OLD.ID_Reserva, 'DELETE', CURRENT_USER(),
-CONCAT('Lugar: ', OLD.Lugar, ', Precio: ', OLD.Precio));
-END//
-DELIMITER ;
\ No newline at end of file
+-- Eventos escritos en la transacción de cada cambio; la API los traslada a AuditoriaReservas
+CREATE TABLE Auditoria_Outbox (
+ID_Outbox INT AUTO_INCREMENT PRIMARY KEY,
+ID_Reserva INT,
+Accion VARCHAR(10),
+Usuario VARCHAR(255),
+Fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+Datos_anteriores TEXT,
+Entidad VARCHAR(20) NULL,
+Referencia VARCHAR(255) NULL,
+Datos_nuevos TEXT NULL
+) ENGINE=InnoDB;
\ No newline at end of file
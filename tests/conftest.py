@@ -0,0 +1,99 @@
+# tests/conftest.py
+#
+# Pruebas con pytest (python -m pytest desde la raíz del repositorio). Las pruebas
+# asíncronas usan el plugin de anyio (@pytest.mark.anyio) sobre asyncio. Cada prueba que
+# pide `client` tiene su propia base SQLite en un archivo temporal, migrada por el lifespan,
+# y corre con el detector de N+1 en modo "raise": una petición con N+1 responde 500 y la
+# prueba falla al terminar con el informe de nplusone_detector.
+
+import os
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("BCRYPT_ROUNDS", "4") # El mínimo: los tests de login no miden bcrypt
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _reiniciar_estado_global():
+    # Cachés y contadores de proceso: cada prueba empieza con una base nueva
+    from app.cache import MemoryCacheBackend, catalog_cache
+    from app.occupancy import occupancy_index
+    from app.principal import principal_cache
+    from app.ratelimit import MemoryLimiterBackend, login_limiter
+
+    if catalog_cache.backend is not None:
+        catalog_cache.backend = MemoryCacheBackend()
+    occupancy_index.invalidate()
+    principal_cache.clear()
+    if login_limiter.backend is not None:
+        login_limiter.backend = MemoryLimiterBackend()
+
+
+@pytest.fixture
+def settings(tmp_path):
+    from app.settings import Settings
+
+    return Settings(database_url=f"sqlite+aiosqlite:///{tmp_path / 'reservas.db'}", schema_mode="migrate")
+
+
+@pytest.fixture
+def nplusone():
+    """
+    Activa el detector de N+1 para las pruebas que hacen peticiones y las hace fallar si
+    algún endpoint repitió una misma forma de SQL más de NPLUSONE_THRESHOLD veces.
+    """
+    from app.nplusone import NPlusOneError, nplusone_detector
+
+    modo_anterior = nplusone_detector.mode
+    nplusone_detector.mode = "raise"
+    nplusone_detector.reset()
+    yield nplusone_detector
+    nplusone_detector.mode = modo_anterior
+    try:
+        nplusone_detector.assert_clean()
+    except NPlusOneError as e:
+        pytest.fail(str(e), pytrace=False)
+    finally:
+        nplusone_detector.reset()
+
+
+@pytest.fixture
+async def aplicacion(settings, nplusone):
+    from app.main import create_app
+
+    _reiniciar_estado_global()
+    app = create_app(settings) # Con el detector ya activo: instala el middleware y escucha el engine
+    async with app.router.lifespan_context(app):
+        yield app
+
+
+@pytest.fixture
+async def client(aplicacion):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=aplicacion), base_url="http://test", timeout=60) as c:
+        yield c
+
+
+@pytest.fixture
+def crear_usuario(aplicacion):
+    """
+    crear_usuario(correo, rango="usuario") -> cabeceras con un Bearer válido para ese usuario.
+    """
+    from app.database.database import async_session_maker
+    from app.models.models import User
+    from app.routers.auth import build_token_claims, create_access_token
+
+    async def _crear(correo: str, rango: str = "usuario") -> dict:
+        async with async_session_maker() as db:
+            user = User(correo=correo, nombres="Prueba", apellidos=correo, contrasenia="x", rango=rango,
+                        intentos_login=0, bloqueado=False, token_version=0)
+            db.add(user)
+            await db.commit()
+            return {"Authorization": f"Bearer {create_access_token(build_token_claims(user))}"}
+
+    return _crear
@@ -0,0 +1,38 @@
+# tests/test_admin.py
+#
+# El router /admin exige rango de administrador en todas sus rutas (una sola dependencia
+# del router, no un chequeo copiado en cada endpoint).
+
+import pytest
+from fastapi.routing import APIRoute
+
+pytestmark = pytest.mark.anyio
+
+
+def _rutas_admin():
+    from app.routers.admin import router
+
+    for ruta in router.routes:
+        if isinstance(ruta, APIRoute):
+            for metodo in ruta.methods:
+                yield metodo, ruta.path
+
+
+async def test_rutas_admin_rechazan_a_usuarios_normales(client, crear_usuario):
+    usuario = await crear_usuario("usuario@example.com")
+    rutas = list(_rutas_admin())
+    assert rutas
+
+    for metodo, ruta in rutas:
+        respuesta = await client.request(metodo, ruta, headers=usuario)
+        assert respuesta.status_code == 403, (metodo, ruta, respuesta.text)
+        sin_token = await client.request(metodo, ruta)
+        assert sin_token.status_code == 401, (metodo, ruta, sin_token.text)
+
+
+async def test_rutas_admin_responden_a_administradores(client, crear_usuario):
+    admin = await crear_usuario("admin@example.com", rango="admin")
+
+    for ruta in ("/admin/pool", "/admin/cache", "/admin/login-limiter", "/admin/analytics/ocupacion"):
+        respuesta = await client.get(ruta, headers=admin)
+        assert respuesta.status_code == 200, (ruta, respuesta.text)
@@ -0,0 +1,106 @@
+# tests/test_auditoria.py
+#
+# Auditoría con outbox transaccional: el evento se guarda en Auditoria_Outbox con el mismo
+# commit que el cambio (aunque la tarea de fondo no llegue a trasladarlo), un cambio
+# revertido no deja evento y la tarea lo traslada a AuditoriaReservas en lotes.
+
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy.future import select
+
+from app.audit import auditoria
+from app.database.database import async_session_maker
+from app.models.models import AuditoriaOutbox, AuditoriaReserva, Escenario
+
+pytestmark = pytest.mark.anyio
+
+FECHA = (date.today() + timedelta(days=20)).isoformat()
+
+
+@pytest.fixture(autouse=True)
+def traslado_manual(monkeypatch):
+    # La tarea de fondo no traslada nada durante la prueba: simula un proceso que cae justo
+    # después del commit (el cierre ordenado del lifespan sí hace el último traslado)
+    monkeypatch.setattr(auditoria, "flush_seconds", 3600)
+    monkeypatch.setattr(auditoria, "relay_seconds", 3600)
+
+
+async def _escenario() -> int:
+    async with async_session_maker() as db:
+        escenario = Escenario(Direccion="Cancha 1", Capacidad=10, Precio=1000, Activo=True)
+        db.add(escenario)
+        await db.commit()
+        return escenario.ID_Escenario
+
+
+async def _filas(modelo) -> list:
+    async with async_session_maker() as db:
+        return (await db.execute(select(modelo.Accion, modelo.ID_Reserva, modelo.Entidad).order_by(modelo.Fecha))).all()
+
+
+async def test_el_evento_se_guarda_con_el_commit_del_cambio(client, crear_usuario):
+    cabeceras = await crear_usuario("cliente@example.com")
+    escenario = await _escenario()
+
+    respuesta = await client.post("/reservas/", json={"Fecha": FECHA, "ID_Escenario": escenario}, headers=cabeceras)
+    assert respuesta.status_code == 201, respuesta.text
+    reserva = respuesta.json()["ID_Reserva"]
+
+    # Sin traslado todavía: el evento ya es durable en el outbox
+    assert await _filas(AuditoriaOutbox) == [("INSERT", reserva, "Reserva")]
+    assert await _filas(AuditoriaReserva) == []
+
+
+async def test_un_cambio_revertido_no_deja_evento(client, crear_usuario):
+    cabeceras = await crear_usuario("cliente@example.com")
+    escenario = await _escenario()
+    registrados = auditoria.registrados
+
+    assert (await client.post("/reservas/", json={"Fecha": FECHA, "ID_Escenario": escenario}, headers=cabeceras)).status_code == 201
+    # Reserva doble: la transacción se revierte y con ella el evento
+    assert (await client.post("/reservas/", json={"Fecha": FECHA, "ID_Escenario": escenario}, headers=cabeceras)).status_code == 400
+    # Correo ya registrado: el INSERT del usuario falla y tampoco queda evento
+    usuario = {"correo": "cliente@example.com", "nombres": "Otro", "apellidos": "Cliente", "contrasenia": "secreta123"}
+    assert (await client.post("/signup/", json=usuario)).status_code == 400
+
+    assert [accion for accion, _, _ in await _filas(AuditoriaOutbox)] == ["INSERT"]
+    assert auditoria.registrados - registrados == 1
+
+
+async def test_traslado_en_lotes_y_al_cerrar(client, crear_usuario, monkeypatch):
+    cabeceras = await crear_usuario("cliente@example.com")
+    escenario = await _escenario()
+    fechas = [(date.today() + timedelta(days=30 + i)).isoformat() for i in range(5)]
+    respuesta = await client.post("/reservas/serie", json={"ID_Escenario": escenario, "fechas": fechas}, headers=cabeceras)
+    assert respuesta.status_code == 201, respuesta.text
+    # La serie deja sus cinco eventos con un solo INSERT, en la transacción del bloque
+    assert len(await _filas(AuditoriaOutbox)) == 5
+
+    monkeypatch.setattr(auditoria, "batch_size", 2)
+    lotes = auditoria.lotes
+    assert await auditoria.trasladar() == 5
+    assert auditoria.lotes - lotes == 3 # 2 + 2 + 1
+    assert await _filas(AuditoriaOutbox) == []
+    assert [accion for accion, _, _ in await _filas(AuditoriaReserva)] == ["INSERT"] * 5
+
+    reserva = respuesta.json()["resultados"][0]["ID_Reserva"]
+    assert (await client.delete(f"/reservas/{reserva}", headers=cabeceras)).status_code == 204
+    assert [accion for accion, _, _ in await _filas(AuditoriaOutbox)] == ["DELETE"]
+
+    # El cierre ordenado (lifespan) hace un último traslado
+    await auditoria.detener()
+    assert await _filas(AuditoriaOutbox) == []
+    assert [accion for accion, _, _ in await _filas(AuditoriaReserva)].count("DELETE") == 1
+
+
+async def test_rollback_despues_de_registrar_descarta_el_evento(aplicacion):
+    registrados = auditoria.registrados
+    async with async_session_maker() as db:
+        await auditoria.registrar(db, "UPDATE", "admin@example.com", 1, antes={"Estado": "Pendiente"})
+        await db.rollback()
+        await auditoria.registrar(db, "UPDATE", "admin@example.com", 2, antes={"Estado": "Pendiente"})
+        await db.commit()
+
+    assert await _filas(AuditoriaOutbox) == [("UPDATE", 2, "Reserva")]
+    assert auditoria.registrados - registrados == 1
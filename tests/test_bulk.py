@@ -0,0 +1,142 @@
+# tests/test_bulk.py
+#
+# Carga masiva: cada fila se valida e informa por separado (formato, escenario, fechas
+# repetidas en el archivo o ya reservadas, stock acumulado de la fecha), las válidas se
+# insertan por bloques y, si un bloque choca con una reserva concurrente, se reintenta
+# fila por fila para no perder las que sí caben.
+
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy.future import select
+
+from app import bulk
+from app.database.database import async_session_maker
+from app.models.models import Elemento, Escenario, InventarioElemento, Reserva
+
+pytestmark = pytest.mark.anyio
+
+
+async def _crear_catalogo():
+    async with async_session_maker() as db:
+        escenarios = [Escenario(Direccion=f"Cancha {i}", Capacidad=10, Precio=1000, Activo=True) for i in range(2)]
+        elemento = Elemento(Nombre="Balon", Precio=10, Stock=3)
+        db.add_all(escenarios + [elemento])
+        await db.commit()
+        return [e.ID_Escenario for e in escenarios], elemento.Codigo
+
+
+async def _reservas() -> list:
+    async with async_session_maker() as db:
+        filas = (await db.execute(
+            select(Reserva.ID_Escenario, Reserva.Fecha, Reserva.Precio_Total).order_by(Reserva.ID_Escenario, Reserva.Fecha)
+        )).all()
+    return [tuple(fila) for fila in filas]
+
+
+async def _reservado(codigo: int) -> dict:
+    async with async_session_maker() as db:
+        filas = (await db.execute(
+            select(InventarioElemento.Fecha, InventarioElemento.Reservado).where(InventarioElemento.Codigo_Elemento == codigo)
+        )).all()
+    return {fecha: reservado for fecha, reservado in filas if reservado}
+
+
+async def test_errores_por_fila_sin_perder_las_validas(client, crear_usuario):
+    (cancha, otra), balon = await _crear_catalogo()
+    cabecera = await crear_usuario("ana@example.com")
+    ocupada = await client.post("/reservas/", headers=cabecera, json={"Fecha": "2031-01-09", "ID_Escenario": otra})
+    assert ocupada.status_code == 201, ocupada.text
+
+    filas = [
+        {"Fecha": "2031-01-06", "ID_Escenario": cancha, "elementos_seleccionados": [{"Codigo_Elemento": balon, "Cantidad": 2}]},
+        {"Fecha": "no-es-fecha", "ID_Escenario": cancha},
+        {"Fecha": "2031-01-06", "ID_Escenario": cancha}, # Repetida dentro del archivo
+        {"Fecha": "2031-01-07", "ID_Escenario": 999},
+        {"Fecha": "2031-01-09", "ID_Escenario": otra}, # Ya reservada en la base
+        # Misma fecha que la fila 1: solo queda 1 balón
+        {"Fecha": "2031-01-06", "ID_Escenario": otra, "elementos_seleccionados": [{"Codigo_Elemento": balon, "Cantidad": 2}]},
+        {"Fecha": "2031-01-08", "ID_Escenario": cancha, "elementos_seleccionados": [{"Codigo_Elemento": 999, "Cantidad": 1}]},
+        {"Fecha": "2031-01-08", "ID_Escenario": otra, "elementos_seleccionados": [{"Codigo_Elemento": balon, "Cantidad": 3}]},
+    ]
+    respuesta = await client.post("/reservas/bulk", headers=cabecera, json=filas)
+
+    assert respuesta.status_code == 200, respuesta.text
+    cuerpo = respuesta.json()
+    assert (cuerpo["total"], cuerpo["creadas"], cuerpo["errores"]) == (8, 2, 6)
+    resultados = {r["fila"]: r for r in cuerpo["resultados"]}
+    assert [fila for fila, r in sorted(resultados.items()) if r["ok"]] == [1, 8]
+    assert resultados[2]["error"].startswith("Fecha:")
+    assert resultados[3]["error"] == resultados[5]["error"] == "Este escenario ya está reservado para la fecha especificada."
+    assert resultados[4]["error"] == "Escenario no encontrado."
+    assert resultados[6]["error"].startswith("Stock insuficiente") and resultados[6]["error"].endswith("Stock disponible: 1")
+    assert resultados[7]["error"] == "Elemento con código 999 no encontrado."
+
+    assert await _reservas() == [
+        (cancha, date(2031, 1, 6), 1000 + 2 * 10),
+        (otra, date(2031, 1, 8), 1000 + 3 * 10),
+        (otra, date(2031, 1, 9), 1000),
+    ]
+    assert await _reservado(balon) == {date(2031, 1, 6): 2, date(2031, 1, 8): 3}
+
+
+async def test_csv_y_ndjson(client, crear_usuario):
+    (cancha, _), balon = await _crear_catalogo()
+    cabecera = await crear_usuario("ana@example.com")
+
+    csv = f"Fecha,ID_Escenario,Elementos\r\n2031-01-06,{cancha},{balon}:2\r\n2031-01-07,{cancha},\r\n"
+    respuesta = await client.post("/reservas/bulk", headers={**cabecera, "Content-Type": "text/csv"}, content=csv.encode("utf-8-sig"))
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["creadas"] == 2
+
+    ndjson = "\n".join([json.dumps({"Fecha": "2031-01-08", "ID_Escenario": cancha}), "{roto", ""])
+    respuesta = await client.post("/reservas/bulk", headers={**cabecera, "Content-Type": "application/x-ndjson"}, content=ndjson)
+    assert respuesta.status_code == 200, respuesta.text
+    cuerpo = respuesta.json()
+    assert [r["ok"] for r in cuerpo["resultados"]] == [True, False]
+    assert cuerpo["resultados"][1]["error"].startswith("JSON inválido")
+
+    assert [fecha for _, fecha, _ in await _reservas()] == [date(2031, 1, 6), date(2031, 1, 7), date(2031, 1, 8)]
+    assert await _reservado(balon) == {date(2031, 1, 6): 2}
+
+
+async def test_bloque_en_conflicto_se_reintenta_fila_por_fila(client, crear_usuario, monkeypatch):
+    (cancha, _), balon = await _crear_catalogo()
+    cabecera = await crear_usuario("ana@example.com")
+    ocupada = await client.post("/reservas/", headers=cabecera, json={"Fecha": "2031-01-07", "ID_Escenario": cancha})
+    assert ocupada.status_code == 201, ocupada.text
+
+    # Simula una reserva concurrente: la pre-carga no ve la fecha ocupada y el bloque choca con el índice único
+    precargar = bulk._precargar
+    async def _precarga_desactualizada(db, plan):
+        escenarios, elementos, _, reservado = await precargar(db, plan)
+        return escenarios, elementos, set(), reservado
+    monkeypatch.setattr(bulk, "_precargar", _precarga_desactualizada)
+
+    respuesta = await client.post("/reservas/bulk", headers=cabecera, json=[
+        {"Fecha": "2031-01-06", "ID_Escenario": cancha, "elementos_seleccionados": [{"Codigo_Elemento": balon, "Cantidad": 1}]},
+        {"Fecha": "2031-01-07", "ID_Escenario": cancha, "elementos_seleccionados": [{"Codigo_Elemento": balon, "Cantidad": 1}]},
+        {"Fecha": "2031-01-08", "ID_Escenario": cancha},
+    ])
+
+    assert respuesta.status_code == 200, respuesta.text
+    cuerpo = respuesta.json()
+    assert [r["ok"] for r in cuerpo["resultados"]] == [True, False, True]
+    assert cuerpo["resultados"][1]["error"] == "Conflicto: la fecha o el stock ya no están disponibles."
+    assert [fecha for _, fecha, _ in await _reservas()] == [date(2031, 1, 6), date(2031, 1, 7), date(2031, 1, 8)]
+    # La fila rechazada no dejó unidades reservadas
+    assert await _reservado(balon) == {date(2031, 1, 6): 1}
+
+
+async def test_limite_de_filas(client, crear_usuario, monkeypatch):
+    (cancha, _), _ = await _crear_catalogo()
+    cabecera = await crear_usuario("ana@example.com")
+    monkeypatch.setattr(bulk, "BULK_MAX_ROWS", 2)
+
+    respuesta = await client.post("/reservas/bulk", headers=cabecera, json=[
+        {"Fecha": f"2031-01-0{dia}", "ID_Escenario": cancha} for dia in (6, 7, 8)
+    ])
+
+    assert respuesta.status_code == 413, respuesta.text
+    assert await _reservas() == []
@@ -0,0 +1,107 @@
+# tests/test_cache_redis.py
+#
+# Caché de catálogo con el backend de Redis contra fakeredis (mismo protocolo, sin servidor).
+
+import fakeredis.aioredis
+import pytest
+
+from app.cache import CachedEntry, CatalogCache, RedisCacheBackend, catalog_cache
+from app.database.database import async_session_maker
+from app.models.models import Elemento
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.aioredis.FakeRedis()
+
+
+@pytest.fixture
+def cache(redis):
+    return CatalogCache(RedisCacheBackend(redis, ttl=300))
+
+
+def _loader(body: bytes, llamadas: list):
+    async def _cargar() -> bytes:
+        llamadas.append(body)
+        return body
+    return _cargar
+
+
+async def test_get_or_load_lee_de_redis_despues_de_la_primera_carga(cache, redis):
+    llamadas = []
+    primera = await cache.get_or_load("elementos", ("offset", 0, 100), _loader(b'[{"Codigo":1}]', llamadas))
+    segunda = await cache.get_or_load("elementos", ("offset", 0, 100), _loader(b'[{"Codigo":1}]', llamadas))
+
+    assert llamadas == [b'[{"Codigo":1}]'] # La segunda no fue a la base
+    assert segunda == primera
+    assert (cache.hits, cache.misses) == (1, 1)
+    clave = b"reservas:catalogo:elementos:v0:offset:0:100"
+    assert await redis.exists(clave)
+    assert 0 < await redis.ttl(clave) <= 300
+
+
+async def test_invalidar_incrementa_la_version_y_obsoleta_todas_las_paginas(cache, redis):
+    llamadas = []
+    for partes in (("offset", 0, 100), ("cursor", "", 50)):
+        await cache.get_or_load("elementos", partes, _loader(b"[]", llamadas))
+
+    await cache.invalidate("elementos")
+
+    assert int(await redis.get("reservas:catalogo:elementos:version")) == 1
+    for partes in (("offset", 0, 100), ("cursor", "", 50)):
+        await cache.get_or_load("elementos", partes, _loader(b"[1]", llamadas))
+    assert llamadas == [b"[]", b"[]", b"[1]", b"[1]"]
+    # Otro catálogo no se ve afectado
+    assert await redis.get("reservas:catalogo:escenarios:version") is None
+
+
+async def test_write_through_deja_cacheada_la_version_nueva(cache):
+    llamadas = []
+    await cache.get_or_load("elementos", ("id", 7), _loader(b'{"Codigo":7,"Stock":1}', llamadas))
+
+    await cache.write_through("elementos", ("id", 7), b'{"Codigo":7,"Stock":2}')
+
+    entry = await cache.get_or_load("elementos", ("id", 7), _loader(b"no deberia cargarse", llamadas))
+    assert entry.body == b'{"Codigo":7,"Stock":2}'
+    assert entry.etag == CachedEntry.from_body(b'{"Codigo":7,"Stock":2}').etag
+    assert llamadas == [b'{"Codigo":7,"Stock":1}']
+
+
+async def test_dos_workers_comparten_entradas_e_invalidaciones(redis):
+    worker_a = CatalogCache(RedisCacheBackend(redis))
+    worker_b = CatalogCache(RedisCacheBackend(redis))
+    llamadas = []
+    await worker_a.get_or_load("escenarios", ("offset", 0, 100), _loader(b"[]", llamadas))
+    await worker_b.get_or_load("escenarios", ("offset", 0, 100), _loader(b"[]", llamadas))
+    assert len(llamadas) == 1
+
+    await worker_a.invalidate("escenarios")
+    await worker_b.get_or_load("escenarios", ("offset", 0, 100), _loader(b"[1]", llamadas))
+    assert len(llamadas) == 2
+
+
+async def test_etag_y_304_a_traves_de_la_api(client, crear_usuario, redis):
+    catalog_cache.backend = RedisCacheBackend(redis)
+    async with async_session_maker() as db:
+        db.add(Elemento(Nombre="Balon", Precio=10, Stock=5))
+        await db.commit()
+
+    r = await client.get("/elementos/")
+    assert r.status_code == 200
+    etag, last_modified = r.headers["etag"], r.headers["last-modified"]
+
+    r = await client.get("/elementos/", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == etag
+    assert (await client.get("/elementos/", headers={"If-Modified-Since": last_modified})).status_code == 304
+
+    # Un alta invalida el catálogo: el ETag anterior ya no coincide
+    admin = await crear_usuario("admin@example.com", rango="admin")
+    assert (await client.post("/elementos/", json={"Nombre": "Red", "Precio": 5, "Stock": 2}, headers=admin)).status_code == 201
+    r = await client.get("/elementos/", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert [e["Nombre"] for e in r.json()] == ["Balon", "Red"]
@@ -0,0 +1,100 @@
+# tests/test_disponibilidad.py
+#
+# Calendario de disponibilidad: el índice en memoria refleja altas y cancelaciones, la
+# disponibilidad de varios escenarios coincide con la de cada uno, y un cambio registrado
+# mientras se carga el índice (que la consulta ya pudo ver) no se cuenta dos veces.
+
+from datetime import date
+
+import pytest
+
+from app.database.database import async_session_maker
+from app.models.models import Escenario, Reserva
+from app.occupancy import OccupancyIndex
+
+pytestmark = pytest.mark.anyio
+
+
+async def _crear_escenarios(n: int) -> list:
+    async with async_session_maker() as db:
+        escenarios = [Escenario(Direccion=f"Cancha {i}", Capacidad=10, Precio=1000, Activo=True) for i in range(n)]
+        db.add_all(escenarios)
+        await db.commit()
+        return [e.ID_Escenario for e in escenarios]
+
+
+async def _reservar(client, cabecera, escenario: int, fecha: str) -> int:
+    respuesta = await client.post("/reservas/", headers=cabecera, json={"Fecha": fecha, "ID_Escenario": escenario})
+    assert respuesta.status_code == 201, respuesta.text
+    return respuesta.json()["ID_Reserva"]
+
+
+async def test_calendario_sigue_altas_y_cancelaciones(client, crear_usuario):
+    cancha, otra = await _crear_escenarios(2)
+    cabecera = await crear_usuario("ana@example.com")
+    rango = {"desde": "2031-01-05", "hasta": "2031-01-08"}
+    # Carga el índice antes de las reservas: lo que sigue llega por add()/remove()
+    respuesta = await client.get(f"/escenarios/{cancha}/disponibilidad", params=rango)
+    assert respuesta.json()["ocupadas"] == []
+
+    reserva = await _reservar(client, cabecera, cancha, "2031-01-06")
+    await _reservar(client, cabecera, cancha, "2031-01-08")
+    await _reservar(client, cabecera, otra, "2031-01-05")
+
+    respuesta = await client.get(f"/escenarios/{cancha}/disponibilidad", params=rango)
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json() == {
+        "ID_Escenario": cancha, **rango,
+        "ocupadas": ["2031-01-06", "2031-01-08"],
+        "disponibles": ["2031-01-05", "2031-01-07"],
+    }
+
+    respuesta = await client.get("/escenarios/disponibilidad", params={**rango, "ids": [otra, cancha, otra]})
+    assert respuesta.status_code == 200, respuesta.text
+    assert [(d["ID_Escenario"], d["ocupadas"]) for d in respuesta.json()] == [
+        (otra, ["2031-01-05"]), (cancha, ["2031-01-06", "2031-01-08"]),
+    ]
+
+    respuesta = await client.delete(f"/reservas/{reserva}", headers=cabecera)
+    assert respuesta.status_code == 204, respuesta.text
+    respuesta = await client.get(f"/escenarios/{cancha}/disponibilidad", params=rango)
+    assert respuesta.json()["ocupadas"] == ["2031-01-08"]
+
+
+async def test_errores(client):
+    (cancha,) = await _crear_escenarios(1)
+
+    respuesta = await client.get("/escenarios/999/disponibilidad", params={"desde": "2031-01-05", "hasta": "2031-01-06"})
+    assert respuesta.status_code == 404
+    respuesta = await client.get("/escenarios/disponibilidad", params={"desde": "2031-01-05", "hasta": "2031-01-06", "ids": [cancha, 999]})
+    assert respuesta.status_code == 404
+    assert "999" in respuesta.json()["detail"]
+    respuesta = await client.get(f"/escenarios/{cancha}/disponibilidad", params={"desde": "2031-01-06", "hasta": "2031-01-05"})
+    assert respuesta.status_code == 400
+    respuesta = await client.get(f"/escenarios/{cancha}/disponibilidad", params={"desde": "2031-01-01", "hasta": "2041-01-01"})
+    assert respuesta.status_code == 400
+
+
+async def test_cambio_durante_la_carga_no_se_cuenta_dos_veces(aplicacion):
+    (cancha,) = await _crear_escenarios(1)
+    fecha = date(2031, 1, 6)
+    indice = OccupancyIndex(max_age=0)
+
+    async with async_session_maker() as db:
+        db.add(Reserva(Correo_Usuario="ana@example.com", Lugar="Cancha", Precio=1000, Fecha=fecha, ID_Escenario=cancha, Estado="Pendiente"))
+        await db.commit()
+
+        # El alta se confirmó antes de la consulta de carga, pero su add() llega durante ella
+        execute = db.execute
+        async def _execute_con_alta(*args, **kwargs):
+            result = await execute(*args, **kwargs)
+            indice.add(cancha, fecha)
+            return result
+        db.execute = _execute_con_alta
+        await indice.ensure_loaded(db)
+
+    assert indice.occupied_between(cancha, fecha, fecha) == [fecha]
+    # Una sola cancelación deja la fecha libre
+    indice.remove(cancha, fecha)
+    assert not indice.is_occupied(cancha, fecha)
+    assert indice.calendar(cancha, fecha, fecha) == ([], [fecha])
@@ -0,0 +1,95 @@
+# tests/test_export.py
+#
+# Exportación de reservas: solo para administradores, NDJSON y CSV con las mismas columnas
+# y valores (Precio_Total calculado si falta el persistido), filtro por fechas, y el cuerpo
+# sale en bloques de EXPORT_CHUNK_ROWS filas en lugar de construirse entero en memoria.
+
+import csv
+import io
+import json
+from datetime import date, datetime
+
+import pytest
+
+from app import export
+from app.database.database import async_session_maker
+from app.models.models import Elemento, Escenario, Reserva, ReservaElemento
+
+pytestmark = pytest.mark.anyio
+
+CREADA = datetime(2030, 12, 1, 8, 30)
+
+
+async def _crear_reservas(correo: str, dias: int):
+    async with async_session_maker() as db:
+        escenario = Escenario(Direccion="Cancha", Capacidad=10, Precio=1000, Activo=True)
+        elemento = Elemento(Nombre="Balon", Precio=10, Stock=5)
+        db.add_all([escenario, elemento])
+        await db.flush()
+        reservas = [
+            Reserva(Correo_Usuario=correo, Lugar="Cancha", Precio=1000, Fecha=date(2031, 1, dia), ID_Escenario=escenario.ID_Escenario,
+                    Estado="Pendiente", Fecha_creacion=CREADA, Precio_Total=1000)
+            for dia in range(1, dias + 1)
+        ]
+        reservas[0].Precio_Total = None # Sin total persistido: se calcula al exportar
+        db.add_all(reservas)
+        await db.flush()
+        db.add(ReservaElemento(ID_Reserva=reservas[0].ID_Reserva, Codigo_Elemento=elemento.Codigo, Cantidad=2))
+        await db.commit()
+        return escenario.ID_Escenario, [r.ID_Reserva for r in reservas]
+
+
+async def test_solo_administradores(client, crear_usuario):
+    cabecera = await crear_usuario("ana@example.com")
+
+    respuesta = await client.get("/admin/reservas/export", headers=cabecera)
+
+    assert respuesta.status_code == 403, respuesta.text
+
+
+async def test_ndjson_y_csv(client, crear_usuario):
+    cabecera = await crear_usuario("admin@example.com", rango="admin")
+    escenario, ids = await _crear_reservas("admin@example.com", dias=3)
+    esperadas = [
+        {
+            "ID_Reserva": ids[i], "Correo_Usuario": "admin@example.com", "Lugar": "Cancha", "Precio": 1000,
+            "Fecha": f"2031-01-0{i + 1}", "ID_Escenario": escenario, "Estado": "Pendiente",
+            "Fecha_creacion": CREADA.isoformat(), "Precio_Total": 1000 + 2 * 10 if i == 0 else 1000,
+        }
+        for i in range(3)
+    ]
+
+    respuesta = await client.get("/admin/reservas/export", headers=cabecera)
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.headers["content-type"] == "application/x-ndjson"
+    assert respuesta.headers["content-disposition"] == 'attachment; filename="reservas.ndjson"'
+    assert [json.loads(linea) for linea in respuesta.text.splitlines()] == esperadas
+
+    respuesta = await client.get("/admin/reservas/export", params={"formato": "csv"}, headers=cabecera)
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.headers["content-type"].startswith("text/csv")
+    filas = list(csv.reader(io.StringIO(respuesta.text)))
+    assert filas[0] == export.EXPORT_COLUMNS
+    assert filas[1:] == [[str(fila[col]) for col in export.EXPORT_COLUMNS] for fila in esperadas]
+
+    respuesta = await client.get("/admin/reservas/export", params={"desde": "2031-01-02", "hasta": "2031-01-02"}, headers=cabecera)
+    assert [json.loads(linea)["ID_Reserva"] for linea in respuesta.text.splitlines()] == [ids[1]]
+
+    respuesta = await client.get("/admin/reservas/export", params={"formato": "xml"}, headers=cabecera)
+    assert respuesta.status_code == 422
+
+
+@pytest.mark.parametrize("formato", ["ndjson", "csv"])
+async def test_sale_en_bloques(aplicacion, crear_usuario, monkeypatch, formato):
+    await crear_usuario("admin@example.com", rango="admin")
+    await _crear_reservas("admin@example.com", dias=5)
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 2)
+
+    bloques = [bloque async for bloque in export.stream_reservas(formato)]
+
+    # 5 filas de a 2: tres bloques, cada uno con solo sus filas (la cabecera CSV va en el primero)
+    assert len(bloques) == 3
+    lineas = [bloque.splitlines() for bloque in bloques]
+    if formato == "csv":
+        lineas[0] = lineas[0][1:]
+    assert [len(l) for l in lineas] == [2, 2, 1]
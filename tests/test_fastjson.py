@@ -0,0 +1,73 @@
+# tests/test_fastjson.py
+#
+# Ruta rápida de JSON: está apagada salvo que se active, serializa fechas, Decimal y None
+# igual que JSONResponse (con orjson y sin él), y un listado servido por ella devuelve el
+# mismo JSON que la ruta ORM + Pydantic.
+
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import fastjson
+from app.database.database import async_session_maker
+from app.fastjson import FastJSONResponse, fast_json
+from app.models.models import Elemento, Escenario
+
+pytestmark = pytest.mark.anyio
+
+
+def test_apagada_por_defecto():
+    assert "FAST_JSON" not in os.environ
+    assert fastjson.FAST_JSON is False
+    assert fast_json.enabled is False
+
+
+@pytest.mark.parametrize("valor", [
+    date(2031, 1, 6),
+    datetime(2031, 1, 6, 8, 30),
+    datetime(2031, 1, 6, 8, 30, 15, 123456),
+    time(8, 30),
+    Decimal("1500"),
+    Decimal("1500.00"),
+    Decimal("1500.50"),
+    None,
+    {"Precio_Total": None, "Fecha": date(2031, 1, 6), "Precio": Decimal("10"), "items": [1, "á"]},
+])
+@pytest.mark.parametrize("con_orjson", [True, False])
+def test_misma_salida_que_jsonresponse(valor, con_orjson, monkeypatch):
+    if not con_orjson:
+        monkeypatch.setattr(fastjson, "orjson", None) # Sin la dependencia opcional: json estándar
+    rapida = json.loads(FastJSONResponse(valor).body)
+    normal = json.loads(JSONResponse(jsonable_encoder(valor)).body)
+
+    assert rapida == normal
+    assert type(rapida) is type(normal) or {type(rapida), type(normal)} == {int, float}
+
+
+async def test_listado_igual_por_ambas_rutas(client, crear_usuario, monkeypatch):
+    cabecera = await crear_usuario("ana@example.com")
+    async with async_session_maker() as db:
+        escenario = Escenario(Direccion="Cancha", Capacidad=10, Precio=1000, Activo=True)
+        elemento = Elemento(Nombre="Balon", Precio=10, Stock=5)
+        db.add_all([escenario, elemento])
+        await db.commit()
+    for dia, elementos in ((6, [{"Codigo_Elemento": elemento.Codigo, "Cantidad": 2}]), (7, [])):
+        respuesta = await client.post("/reservas/", headers=cabecera, json={
+            "Fecha": f"2031-01-0{dia}", "ID_Escenario": escenario.ID_Escenario, "elementos_seleccionados": elementos,
+        })
+        assert respuesta.status_code == 201, respuesta.text
+
+    for params in ({}, {"cursor": ""}, {"skip": 1, "limit": 1}):
+        monkeypatch.setattr(fast_json, "enabled", False)
+        normal = await client.get("/reservas/me", params=params, headers=cabecera)
+        monkeypatch.setattr(fast_json, "enabled", True)
+        rapida = await client.get("/reservas/me", params=params, headers=cabecera)
+
+        assert normal.status_code == rapida.status_code == 200
+        assert rapida.headers["content-type"] == "application/json"
+        assert rapida.json() == normal.json(), params
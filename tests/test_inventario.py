@@ -0,0 +1,101 @@
+# tests/test_inventario.py
+#
+# Inventario por fecha: agregar, quitar y cancelar elementos de una reserva mueve
+# Inventario_Elementos.Reservado y Precio_Total en la misma cantidad, y las cantidades
+# cero o negativas se rechazan antes de tocar el inventario.
+
+from datetime import date
+
+import pytest
+from sqlalchemy.future import select
+
+from app.database.database import async_session_maker
+from app.models.models import Elemento, Escenario, InventarioElemento, Reserva
+
+pytestmark = pytest.mark.anyio
+
+FECHA = date(2031, 1, 6)
+
+
+async def _crear_catalogo():
+    async with async_session_maker() as db:
+        escenario = Escenario(Direccion="Cancha", Capacidad=10, Precio=1000, Activo=True)
+        balon = Elemento(Nombre="Balon", Precio=10, Stock=5)
+        red = Elemento(Nombre="Red", Precio=25, Stock=2)
+        db.add_all([escenario, balon, red])
+        await db.commit()
+        return escenario.ID_Escenario, balon.Codigo, red.Codigo
+
+
+async def _reservado() -> dict:
+    async with async_session_maker() as db:
+        filas = (await db.execute(
+            select(InventarioElemento.Codigo_Elemento, InventarioElemento.Reservado)
+            .where(InventarioElemento.Fecha == FECHA)
+        )).all()
+    return {codigo: reservado for codigo, reservado in filas if reservado}
+
+
+async def _precio_total(reserva_id: int) -> int:
+    async with async_session_maker() as db:
+        return (await db.execute(select(Reserva.Precio_Total).where(Reserva.ID_Reserva == reserva_id))).scalar_one()
+
+
+async def _reservar(client, cabecera, escenario: int, elementos: list):
+    return await client.post("/reservas/", headers=cabecera, json={
+        "Fecha": FECHA.isoformat(), "ID_Escenario": escenario, "elementos_seleccionados": elementos,
+    })
+
+
+async def test_agregar_quitar_y_cancelar_elementos(client, crear_usuario):
+    escenario, balon, red = await _crear_catalogo()
+    cabecera = await crear_usuario("ana@example.com")
+
+    respuesta = await _reservar(client, cabecera, escenario, [{"Codigo_Elemento": balon, "Cantidad": 2}])
+    assert respuesta.status_code == 201, respuesta.text
+    reserva_id = respuesta.json()["ID_Reserva"]
+    assert await _reservado() == {balon: 2}
+    assert await _precio_total(reserva_id) == 1000 + 2 * 10
+
+    # Agregar suma a un código existente y crea los nuevos
+    respuesta = await client.post(f"/reservas/{reserva_id}/elementos", headers=cabecera, json=[
+        {"Codigo_Elemento": balon, "Cantidad": 1}, {"Codigo_Elemento": red, "Cantidad": 2},
+    ])
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["Precio_Total"] == 1000 + 3 * 10 + 2 * 25
+    assert await _reservado() == {balon: 3, red: 2}
+    assert await _precio_total(reserva_id) == 1000 + 3 * 10 + 2 * 25
+
+    # Sin stock libre de la red en la fecha: no cambia nada
+    respuesta = await client.post(f"/reservas/{reserva_id}/elementos", headers=cabecera, json=[{"Codigo_Elemento": red, "Cantidad": 1}])
+    assert respuesta.status_code == 400, respuesta.text
+    assert await _reservado() == {balon: 3, red: 2}
+
+    # Quitar libera todo lo reservado de ese código
+    respuesta = await client.delete(f"/reservas/{reserva_id}/elementos/{balon}", headers=cabecera)
+    assert respuesta.status_code == 200, respuesta.text
+    assert await _reservado() == {red: 2}
+    assert await _precio_total(reserva_id) == 1000 + 2 * 25
+
+    # Cancelar devuelve el resto
+    respuesta = await client.delete(f"/reservas/{reserva_id}", headers=cabecera)
+    assert respuesta.status_code == 204, respuesta.text
+    assert await _reservado() == {}
+
+
+@pytest.mark.parametrize("cantidad", [0, -3])
+async def test_cantidades_no_positivas_se_rechazan(client, crear_usuario, cantidad):
+    escenario, balon, _ = await _crear_catalogo()
+    cabecera = await crear_usuario("ana@example.com")
+
+    respuesta = await _reservar(client, cabecera, escenario, [{"Codigo_Elemento": balon, "Cantidad": cantidad}])
+    assert respuesta.status_code == 422, respuesta.text
+
+    respuesta = await _reservar(client, cabecera, escenario, [{"Codigo_Elemento": balon, "Cantidad": 1}])
+    assert respuesta.status_code == 201, respuesta.text
+    reserva_id = respuesta.json()["ID_Reserva"]
+    respuesta = await client.post(f"/reservas/{reserva_id}/elementos", headers=cabecera, json=[{"Codigo_Elemento": balon, "Cantidad": cantidad}])
+    assert respuesta.status_code == 422, respuesta.text
+
+    assert await _reservado() == {balon: 1}
+    assert await _precio_total(reserva_id) == 1000 + 10
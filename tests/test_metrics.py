@@ -0,0 +1,91 @@
+# tests/test_metrics.py
+#
+# /metrics: las peticiones se etiquetan con la plantilla de la ruta (no con la URL
+# concreta, y "sin_ruta" para los 404 sin ruta), se cuentan sus consultas SQL, y los
+# colectores registrados (pool, bcrypt, límite de login, auditoría) aparecen en la salida.
+# Las peticiones que superan SLOW_REQUEST_MS se registran en app.slow_requests.
+
+import logging
+
+import pytest
+
+from app.database.database import async_session_maker
+from app.metrics import MetricsMiddleware, MetricsRegistry, metrics_registry
+from app.models.models import Escenario
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def registro_limpio():
+    metrics_registry.reset()
+    yield
+    metrics_registry.reset()
+
+
+def _muestras(texto: str) -> dict:
+    muestras = {}
+    for linea in texto.splitlines():
+        if linea and not linea.startswith("#"):
+            nombre, _, valor = linea.rpartition(" ")
+            muestras[nombre] = float(valor)
+    return muestras
+
+
+async def test_etiquetas_por_plantilla_de_ruta(client):
+    async with async_session_maker() as db:
+        escenarios = [Escenario(Direccion=f"Cancha {i}", Capacidad=10, Precio=1000, Activo=True) for i in range(2)]
+        db.add_all(escenarios)
+        await db.commit()
+    rango = {"desde": "2031-01-05", "hasta": "2031-01-06"}
+    for escenario in escenarios:
+        assert (await client.get(f"/escenarios/{escenario.ID_Escenario}/disponibilidad", params=rango)).status_code == 200
+    assert (await client.get("/escenarios/999/disponibilidad", params=rango)).status_code == 404
+    assert (await client.get("/no-existe")).status_code == 404
+
+    respuesta = await client.get("/metrics")
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("text/plain; version=0.0.4")
+    muestras = _muestras(respuesta.text)
+    ruta = 'method="GET",route="/escenarios/{escenario_id}/disponibilidad"'
+    assert muestras[f'http_requests_total{{{ruta},status="200"}}'] == 2
+    assert muestras[f'http_requests_total{{{ruta},status="404"}}'] == 1
+    assert muestras[f'http_requests_total{{method="GET",route="sin_ruta",status="404"}}'] == 1
+    assert muestras[f'http_request_duration_seconds_count{{{ruta}}}'] == 3
+    assert muestras[f'http_request_duration_seconds_bucket{{{ruta},le="+Inf"}}'] == 3
+    assert muestras[f'http_request_db_queries_total{{{ruta}}}'] >= 3
+    # Ninguna etiqueta con el ID concreto
+    assert "/escenarios/1/" not in respuesta.text and "/no-existe" not in respuesta.text
+
+
+async def test_colectores_registrados(client):
+    muestras = _muestras((await client.get("/metrics")).text)
+
+    for nombre in (
+        "db_pool_size", "db_pool_checkouts_total",
+        "bcrypt_completed_total", "bcrypt_queued",
+        "login_lockouts_total",
+        "audit_events_recorded_total", "audit_outbox_pending",
+    ):
+        assert nombre in muestras, nombre
+
+
+async def test_peticion_lenta_se_registra_con_su_sql(caplog):
+    registro = MetricsRegistry()
+
+    async def _app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = MetricsMiddleware(_app, registry=registro, slow_request_ms=0.000001)
+    enviados = []
+    async def _send(message):
+        enviados.append(message)
+
+    with caplog.at_level(logging.WARNING, logger="app.slow_requests"):
+        await middleware({"type": "http", "method": "POST", "path": "/x"}, None, _send)
+
+    assert [m["type"] for m in enviados] == ["http.response.start", "http.response.body"]
+    assert registro.requests == {("POST", "sin_ruta", 201): 1}
+    assert "Petición lenta POST sin_ruta" in caplog.text
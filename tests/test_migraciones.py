@@ -0,0 +1,185 @@
+# tests/test_migraciones.py
+#
+# Migraciones versionadas: una base nueva migrada hasta LATEST_VERSION debe quedar igual
+# que el esquema de los modelos, la restricción única de Reservas no se crea sobre
+# reservas dobles ya guardadas (la migración se detiene y las lista), las columnas que
+# sqldb.sql ya creó con otras mayúsculas no se vuelven a agregar, el relleno de
+# Precio_Total usa las tablas congeladas y el paso al inventario por fecha solo devuelve
+# a Stock lo que de verdad se había descontado.
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, inspect, insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import migrations
+from app.models.models import Base
+
+pytestmark = pytest.mark.anyio
+
+
+def _esquema(conn) -> dict:
+    inspector = inspect(conn)
+    esquema = {}
+    for tabla in inspector.get_table_names():
+        if tabla == migrations.schema_version_table.name:
+            continue
+        columnas = {c["name"]: (type(c["type"]).__name__, c["nullable"]) for c in inspector.get_columns(tabla)}
+        indices = {(ix["name"], tuple(ix["column_names"]), bool(ix.get("unique"))) for ix in inspector.get_indexes(tabla)}
+        indices |= {(uq["name"], tuple(uq["column_names"]), True) for uq in inspector.get_unique_constraints(tabla)}
+        claves = {(tuple(fk["constrained_columns"]), fk["referred_table"]) for fk in inspector.get_foreign_keys(tabla)}
+        esquema[tabla] = {
+            "columnas": columnas,
+            "pk": tuple(inspector.get_pk_constraint(tabla)["constrained_columns"]),
+            "indices": indices,
+            "claves_foraneas": claves,
+        }
+    return esquema
+
+
+@pytest.fixture
+async def engines(tmp_path):
+    creados = []
+    def _crear(nombre: str):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / nombre}")
+        creados.append(engine)
+        return engine
+    yield _crear
+    for engine in creados:
+        await engine.dispose()
+
+
+async def test_base_nueva_migrada_coincide_con_los_modelos(engines):
+    migrada, modelos = engines("migrada.db"), engines("modelos.db")
+    assert await migrations.upgrade(migrada) == list(range(1, migrations.LATEST_VERSION + 1))
+    async with modelos.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with migrada.connect() as conn:
+        esquema_migrado = await conn.run_sync(_esquema)
+    async with modelos.connect() as conn:
+        esquema_modelos = await conn.run_sync(_esquema)
+
+    assert esquema_migrado.keys() == esquema_modelos.keys()
+    for tabla in esquema_modelos:
+        assert esquema_migrado[tabla] == esquema_modelos[tabla], tabla
+
+
+async def test_reservas_dobles_detienen_la_restriccion_unica(engines):
+    engine = engines("duplicados.db")
+    reservas = migrations._v1_reservas
+    async with engine.begin() as conn:
+        # Una base de antes de las migraciones, con el mismo escenario reservado dos veces el mismo día
+        await conn.run_sync(migrations._m001_esquema_base)
+        await conn.execute(insert(reservas), [
+            {"ID_Reserva": 1, "ID_Escenario": 7, "Fecha": date(2026, 5, 1), "Lugar": "Cancha"},
+            {"ID_Reserva": 2, "ID_Escenario": 7, "Fecha": date(2026, 5, 1), "Lugar": "Cancha"},
+            {"ID_Reserva": 3, "ID_Escenario": 7, "Fecha": date(2026, 5, 2), "Lugar": "Cancha"},
+            {"ID_Reserva": 4, "ID_Escenario": 8, "Fecha": date(2026, 5, 1), "Lugar": "Cancha"},
+        ])
+
+    with pytest.raises(migrations.MigrationError) as error:
+        await migrations.upgrade(engine)
+
+    mensaje = str(error.value)
+    assert "escenario 7, fecha 2026-05-01: reservas 1, 2" in mensaje
+    assert "reservas 3" not in mensaje and "escenario 8" not in mensaje
+    assert "python -m app.database.migrations upgrade" in mensaje
+    # Las migraciones anteriores quedan aplicadas; la 3 se reintenta tras corregir los datos
+    assert await migrations.current_version(engine) == 2
+    async with engine.begin() as conn:
+        await conn.execute(reservas.delete().where(reservas.c.ID_Reserva == 2))
+    assert await migrations.upgrade(engine) == list(range(3, migrations.LATEST_VERSION + 1))
+
+
+async def test_columna_con_otras_mayusculas_no_se_duplica(engines):
+    engine = engines("sqldb.db")
+    async with engine.begin() as conn:
+        # sqldb.sql crea Usuarios.Token_version; la migración 2 agrega token_version
+        await conn.run_sync(migrations._m001_esquema_base)
+        await conn.execute(text("ALTER TABLE Usuarios ADD COLUMN Token_version INTEGER NOT NULL DEFAULT 0"))
+
+    assert await migrations.upgrade(engine) == list(range(1, migrations.LATEST_VERSION + 1))
+    async with engine.connect() as conn:
+        columnas = await conn.run_sync(lambda c: [col["name"] for col in inspect(c).get_columns("Usuarios")])
+    assert [nombre for nombre in columnas if nombre.lower() == "token_version"] == ["Token_version"]
+
+
+async def test_relleno_de_precio_total(engines):
+    engine = engines("precios.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(migrations._m001_esquema_base)
+        await conn.execute(insert(migrations._v1_escenario).values(ID_Escenario=1, Direccion="Cancha", Capacidad=10, Precio=100))
+        await conn.execute(insert(migrations._v1_elementos), [
+            {"Codigo": 1, "Nombre": "Balon", "Precio": 10, "Stock": 5},
+            {"Codigo": 2, "Nombre": "Red", "Precio": 25, "Stock": 5},
+        ])
+        await conn.execute(insert(migrations._v1_reservas), [
+            {"ID_Reserva": 1, "ID_Escenario": 1, "Fecha": date(2026, 5, 1)},
+            {"ID_Reserva": 2, "ID_Escenario": 1, "Fecha": date(2026, 5, 2)}, # Sin elementos
+        ])
+        await conn.execute(insert(migrations._v1_reservas_elementos), [
+            {"ID_Reserva": 1, "Codigo_Elemento": 1, "Cantidad": 3},
+            {"ID_Reserva": 1, "Codigo_Elemento": 2, "Cantidad": 1},
+        ])
+
+    await migrations.upgrade(engine)
+
+    reservas = migrations._v4_reservas
+    async with engine.connect() as conn:
+        precios = (await conn.execute(
+            select(reservas.c.ID_Reserva, reservas.c.Precio_Total).order_by(reservas.c.ID_Reserva)
+        )).all()
+    assert [tuple(fila) for fila in precios] == [(1, 100 + 3 * 10 + 25), (2, 100)]
+
+
+async def _stock_e_inventario(engine):
+    async with engine.connect() as conn:
+        stock = (await conn.execute(select(migrations._v1_elementos.c.Stock))).scalar_one()
+        inventario = (await conn.execute(
+            select(migrations._v10_inventario).order_by(migrations._v10_inventario.c.Fecha)
+        )).all()
+    return stock, [tuple(fila) for fila in inventario]
+
+
+async def test_inventario_desde_la_base_original_no_infla_el_stock(engines):
+    engine = engines("original.db")
+    async with engine.begin() as conn:
+        # Esquema original: las reservas nunca descontaron de Stock
+        await conn.run_sync(migrations._m001_esquema_base)
+        await conn.execute(insert(migrations._v1_elementos).values(Codigo=1, Nombre="Balon", Precio=10, Stock=5))
+        await conn.execute(insert(migrations._v1_reservas).values(
+            ID_Reserva=1, ID_Escenario=1, Fecha=date(2026, 5, 1), Fecha_creacion=datetime.utcnow() - timedelta(days=10)
+        ))
+        await conn.execute(insert(migrations._v1_reservas_elementos).values(ID_Reserva=1, Codigo_Elemento=1, Cantidad=3))
+
+    await migrations.upgrade(engine)
+
+    assert await _stock_e_inventario(engine) == (5, [(1, date(2026, 5, 1), 3)])
+
+
+async def test_inventario_devuelve_lo_descontado_desde_la_v1(engines):
+    engine = engines("v9.db")
+    await migrations.upgrade(engine)
+    async with engine.begin() as conn:
+        # Una base en la v9: las reservas hechas con migraciones descontaron sus cantidades de Stock
+        await conn.execute(delete(migrations.schema_version_table).where(migrations.schema_version_table.c.version == 10))
+        aplicada_v1 = (await conn.execute(
+            select(migrations.schema_version_table.c.aplicada).where(migrations.schema_version_table.c.version == 1)
+        )).scalar_one()
+        await conn.execute(insert(migrations._v1_elementos).values(Codigo=1, Nombre="Balon", Precio=10, Stock=2)) # 5 - 3
+        await conn.execute(insert(migrations._v1_reservas), [
+            # Anterior a la v1 (esquema original): no descontó
+            {"ID_Reserva": 1, "ID_Escenario": 1, "Fecha": date(2026, 5, 1), "Fecha_creacion": aplicada_v1 - timedelta(days=1)},
+            # Creada con las migraciones ya aplicadas: descontó 3
+            {"ID_Reserva": 2, "ID_Escenario": 1, "Fecha": date(2026, 5, 2), "Fecha_creacion": aplicada_v1 + timedelta(seconds=1)},
+        ])
+        await conn.execute(insert(migrations._v1_reservas_elementos), [
+            {"ID_Reserva": 1, "Codigo_Elemento": 1, "Cantidad": 1},
+            {"ID_Reserva": 2, "Codigo_Elemento": 1, "Cantidad": 3},
+        ])
+
+    assert await migrations.upgrade(engine) == [10]
+
+    assert await _stock_e_inventario(engine) == (5, [(1, date(2026, 5, 1), 1), (1, date(2026, 5, 2), 3)])
@@ -0,0 +1,72 @@
+# tests/test_nplusone.py
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.nplusone import NPlusOneDetector, NPlusOneError, NPlusOneMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'n1.db'}")
+    yield engine
+    await engine.dispose()
+
+
+def _app(engine, detector: NPlusOneDetector) -> FastAPI:
+    detector.instrument_engine(engine.sync_engine)
+    app = FastAPI()
+    app.add_middleware(NPlusOneMiddleware, detector=detector)
+
+    @app.get("/items/{n}")
+    async def items(n: int):
+        async with engine.connect() as conn:
+            for i in range(n): # Una consulta por elemento: el patrón N+1
+                await conn.execute(text("SELECT :i"), {"i": i})
+        return {"n": n}
+
+    return app
+
+
+async def _get(app: FastAPI, ruta: str) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(ruta)
+
+
+async def test_modo_raise_responde_500_antes_de_enviar_la_respuesta(engine):
+    detector = NPlusOneDetector(mode="raise", threshold=3)
+    app = _app(engine, detector)
+
+    r = await _get(app, "/items/10")
+
+    assert r.status_code == 500 # No el 200 del endpoint
+    assert "Posible N+1 en GET /items/{n}" in r.json()["detail"]
+    assert detector.report()["GET /items/{n}"]["offenders"][0]["max_repeats"] == 10
+    with pytest.raises(NPlusOneError):
+        detector.assert_clean()
+
+
+async def test_bajo_el_umbral_la_respuesta_no_cambia(engine):
+    detector = NPlusOneDetector(mode="raise", threshold=3)
+    app = _app(engine, detector)
+
+    r = await _get(app, "/items/3")
+
+    assert r.status_code == 200
+    assert r.json() == {"n": 3}
+    detector.assert_clean()
+
+
+async def test_modo_warn_solo_registra(engine):
+    detector = NPlusOneDetector(mode="warn", threshold=3)
+    app = _app(engine, detector)
+
+    r = await _get(app, "/items/10")
+
+    assert r.status_code == 200
+    assert "GET /items/{n}" in detector.report()
@@ -0,0 +1,60 @@
+# tests/test_paginacion.py
+
+import pytest
+from sqlalchemy.future import select
+
+from app.database.database import async_session_maker
+from app.models.models import Elemento, Escenario
+from app.pagination import MAX_PAGE_SIZE, keyset_page_ordered
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_limit_mayor_que_el_maximo_se_recorta(client):
+    async with async_session_maker() as db:
+        db.add_all([Elemento(Nombre=f"Elemento {i}", Precio=1, Stock=1) for i in range(MAX_PAGE_SIZE + 5)])
+        await db.commit()
+
+    r = await client.get("/elementos/", params={"limit": MAX_PAGE_SIZE + 500})
+    assert r.status_code == 200 # Antes del máximo no había límite: no se rechaza
+    assert len(r.json()) == MAX_PAGE_SIZE
+
+    r = await client.get("/elementos/", params={"limit": 5000, "cursor": ""})
+    assert r.status_code == 200
+    assert len(r.json()["items"]) == MAX_PAGE_SIZE
+    assert r.json()["next_cursor"] is not None
+
+
+async def test_limit_menor_que_uno_sigue_siendo_invalido(client):
+    assert (await client.get("/elementos/", params={"limit": 0})).status_code == 422
+
+
+
+async def _recorrer(stmt, columnas, descendente: bool) -> list:
+    ids, cursor = [], ""
+    async with async_session_maker() as db:
+        while cursor is not None:
+            filas, cursor = await keyset_page_ordered(db, stmt, columnas, cursor, 2, descending=descendente)
+            ids += [e.ID_Escenario for e in filas]
+    return ids
+
+
+@pytest.mark.parametrize("orden", ["Precio", "Capacidad"])
+@pytest.mark.parametrize("descendente", [False, True])
+async def test_cursor_con_nulls_no_pierde_ni_repite_filas(aplicacion, orden, descendente):
+    valores = [300, None, 100, None, 300, 200, None]
+    async with async_session_maker() as db:
+        escenarios = [
+            Escenario(Direccion=f"Cancha {i}", Capacidad=v, Precio=v, Activo=True) for i, v in enumerate(valores)
+        ]
+        db.add_all(escenarios)
+        await db.commit()
+        filas = [(e.Precio, e.ID_Escenario) for e in escenarios]
+
+    # NULL al final en ambos sentidos; ID_Escenario desempata en el mismo sentido
+    con_valor = sorted((f for f in filas if f[0] is not None), reverse=descendente)
+    sin_valor = sorted((f for f in filas if f[0] is None), reverse=descendente)
+    esperado = [id_escenario for _, id_escenario in con_valor + sin_valor]
+
+    columnas = (getattr(Escenario, orden), Escenario.ID_Escenario)
+    assert await _recorrer(select(Escenario), columnas, descendente) == esperado
@@ -0,0 +1,113 @@
+# tests/test_precios.py
+#
+# Precio_Total persistido de las reservas al actualizar un escenario: solo un cambio de
+# precio lo propaga; un PUT que no toca el precio no debe reescribir las reservas. El
+# cálculo en lote (una consulta agregada) da lo mismo que el cálculo reserva por reserva.
+
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from app.database.database import async_session_maker, get_engine
+from app.models.models import Elemento, Escenario, Reserva, ReservaElemento
+from app.pricing import _precio_en_memoria, calculate_total_prices, reconcile_total_prices
+
+pytestmark = pytest.mark.anyio
+
+
+async def _reserva_con_escenario(crear_usuario):
+    cabeceras = await crear_usuario("cliente@example.com")
+    async with async_session_maker() as db:
+        escenario = Escenario(Direccion="Cancha 1", Capacidad=10, Precio=1000, Activo=True)
+        db.add(escenario)
+        await db.commit()
+        escenario_id = escenario.ID_Escenario
+    return escenario_id, cabeceras
+
+
+async def _precios_totales():
+    async with async_session_maker() as db:
+        return (await db.execute(select(Reserva.Precio_Total))).scalars().all()
+
+
+async def test_put_sin_cambio_de_precio_no_toca_las_reservas(client, crear_usuario):
+    escenario_id, cabeceras = await _reserva_con_escenario(crear_usuario)
+    fecha = (date.today() + timedelta(days=10)).isoformat()
+    respuesta = await client.post("/reservas/", json={"Fecha": fecha, "ID_Escenario": escenario_id}, headers=cabeceras)
+    assert respuesta.status_code == 201, respuesta.text
+    admin = await crear_usuario("admin@example.com", rango="admin")
+
+    sentencias = []
+    def _capturar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+    event.listen(get_engine().sync_engine, "before_cursor_execute", _capturar)
+    try:
+        respuesta = await client.put(f"/escenarios/{escenario_id}", json={"Direccion": "Cancha 1B", "Precio": 1000}, headers=admin)
+    finally:
+        event.remove(get_engine().sync_engine, "before_cursor_execute", _capturar)
+
+    assert respuesta.status_code == 200, respuesta.text
+    assert not [s for s in sentencias if s.lstrip().upper().startswith("UPDATE RESERVAS")]
+    assert await _precios_totales() == [1000]
+
+
+async def test_cambio_de_precio_se_propaga(client, crear_usuario):
+    escenario_id, cabeceras = await _reserva_con_escenario(crear_usuario)
+    fecha = (date.today() + timedelta(days=10)).isoformat()
+    respuesta = await client.post("/reservas/", json={"Fecha": fecha, "ID_Escenario": escenario_id}, headers=cabeceras)
+    assert respuesta.status_code == 201, respuesta.text
+    admin = await crear_usuario("admin@example.com", rango="admin")
+
+    respuesta = await client.put(f"/escenarios/{escenario_id}", json={"Precio": 1500}, headers=admin)
+
+    assert respuesta.status_code == 200, respuesta.text
+    assert await _precios_totales() == [1500]
+
+
+async def test_precio_en_lote_igual_al_de_cada_reserva(aplicacion):
+    async with async_session_maker() as db:
+        escenarios = [Escenario(Direccion=f"Cancha {i}", Capacidad=10, Precio=precio, Activo=True) for i, precio in enumerate((1000, 1500))]
+        elementos = [Elemento(Nombre="Balon", Precio=10, Stock=5), Elemento(Nombre="Red", Precio=25, Stock=5)]
+        db.add_all(escenarios + elementos)
+        await db.flush()
+        # Sin Precio_Total persistido (como las filas anteriores a la columna); la última sin elementos
+        reservas = [
+            Reserva(Correo_Usuario="cliente@example.com", Lugar=e.Direccion, Precio=e.Precio, Fecha=date(2031, 1, dia),
+                    ID_Escenario=e.ID_Escenario, Estado="Pendiente")
+            for dia, e in ((1, escenarios[0]), (2, escenarios[1]), (3, escenarios[1]))
+        ]
+        db.add_all(reservas)
+        await db.flush()
+        db.add_all([
+            ReservaElemento(ID_Reserva=reservas[0].ID_Reserva, Codigo_Elemento=elementos[0].Codigo, Cantidad=2),
+            ReservaElemento(ID_Reserva=reservas[0].ID_Reserva, Codigo_Elemento=elementos[1].Codigo, Cantidad=1),
+            ReservaElemento(ID_Reserva=reservas[1].ID_Reserva, Codigo_Elemento=elementos[1].Codigo, Cantidad=3),
+        ])
+        await db.commit()
+        ids = [r.ID_Reserva for r in reservas]
+    esperados = {ids[0]: 1000 + 2 * 10 + 25, ids[1]: 1500 + 3 * 25, ids[2]: 1500}
+
+    async with async_session_maker() as db:
+        # Sin relaciones cargadas: una consulta agregada para todas
+        sin_cargar = (await db.execute(select(Reserva))).scalars().all()
+        en_lote = await calculate_total_prices(sin_cargar, db)
+    async with async_session_maker() as db:
+        cargadas = (await db.execute(
+            select(Reserva).options(
+                selectinload(Reserva.escenario),
+                selectinload(Reserva.reservas_elementos).selectinload(ReservaElemento.elemento),
+            )
+        )).scalars().all()
+        por_reserva = {reserva.ID_Reserva: _precio_en_memoria(reserva) for reserva in cargadas}
+
+    assert en_lote == por_reserva == esperados
+
+    # La reconciliación (UPDATE con la expresión SQL) persiste los mismos valores
+    async with async_session_maker() as db:
+        assert (await reconcile_total_prices(db))["corregidas"] == 3
+    async with async_session_maker() as db:
+        persistidos = dict((await db.execute(select(Reserva.ID_Reserva, Reserva.Precio_Total))).all())
+    assert persistidos == esperados
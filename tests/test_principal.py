@@ -0,0 +1,51 @@
+# tests/test_principal.py
+
+import fakeredis.aioredis
+import pytest
+
+from app.cache import RedisCacheBackend
+from app.principal import Principal, PrincipalCache
+
+pytestmark = pytest.mark.anyio
+
+
+def _principal(rango: str = "admin") -> Principal:
+    return Principal(correo="ana@example.com", rango=rango, bloqueado=False, token_version=0)
+
+
+async def test_invalidar_en_un_worker_revoca_en_los_demas():
+    # Dos workers con su propia memoria y el mismo Redis para las revocaciones
+    redis = fakeredis.aioredis.FakeRedis()
+    worker_a = PrincipalCache(revocaciones=RedisCacheBackend(redis, prefix="reservas:principal:"))
+    worker_b = PrincipalCache(revocaciones=RedisCacheBackend(redis, prefix="reservas:principal:"))
+    for worker in (worker_a, worker_b):
+        worker.put(_principal(), await worker.generacion("ana@example.com"))
+        assert await worker.get("ana@example.com") == _principal()
+
+    await worker_a.invalidate("ana@example.com")
+
+    assert await worker_a.get("ana@example.com") is None
+    assert await worker_b.get("ana@example.com") is None
+    assert worker_b.snapshot()["revocados"] == 1
+
+
+async def test_carga_concurrente_con_una_invalidacion_nace_vencida():
+    redis = fakeredis.aioredis.FakeRedis()
+    cache = PrincipalCache(revocaciones=RedisCacheBackend(redis, prefix="reservas:principal:"))
+    generacion = await cache.generacion("ana@example.com") # Antes de leer Usuarios
+    await PrincipalCache(revocaciones=RedisCacheBackend(redis, prefix="reservas:principal:")).invalidate("ana@example.com")
+    cache.put(_principal(), generacion)
+
+    assert await cache.get("ana@example.com") is None
+
+
+async def test_sin_backend_compartido_la_invalidacion_es_local():
+    worker_a, worker_b = PrincipalCache(), PrincipalCache()
+    worker_a.put(_principal())
+    worker_b.put(_principal())
+
+    await worker_a.invalidate("ana@example.com")
+
+    assert await worker_a.get("ana@example.com") is None
+    assert await worker_b.get("ana@example.com") == _principal() # Hasta PRINCIPAL_CACHE_TTL
+    assert worker_a.snapshot()["revocacion"] == "por_proceso"
@@ -0,0 +1,136 @@
+# tests/test_ratelimit.py
+#
+# Limitador de intentos de login: el backend de Redis (contra fakeredis) debe comportarse
+# como el de memoria (ventana deslizante, bloqueo por cuenta, reinicio tras un login
+# correcto) y además compartir los fallos entre workers.
+
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from sqlalchemy import update
+
+from app.database.database import async_session_maker
+from app.models.models import User
+from app.ratelimit import LoginLimiter, MemoryLimiterBackend, RedisLimiterBackend, login_limiter
+from app.routers.auth import MAX_LOGIN_ATTEMPTS
+from app.security import get_password_hash
+
+pytestmark = pytest.mark.anyio
+
+VENTANA = 0.5 # segundos
+
+
+@pytest.fixture
+def servidor():
+    return fakeredis.FakeServer() # Un "Redis" compartido por todos los clientes del test
+
+
+def _redis(servidor):
+    return fakeredis.aioredis.FakeRedis(server=servidor)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request, servidor):
+    if request.param == "memory":
+        return MemoryLimiterBackend(window=VENTANA)
+    return RedisLimiterBackend(_redis(servidor), window=VENTANA)
+
+
+async def test_ventana_deslizante(backend):
+    assert await backend.count("cuenta:a@example.com") == (0, 0.0)
+    assert [await backend.hit("cuenta:a@example.com") for _ in range(3)] == [1, 2, 3]
+    fallos, espera = await backend.count("cuenta:a@example.com")
+    assert fallos == 3 and 0 < espera <= VENTANA
+    assert (await backend.count("cuenta:b@example.com"))[0] == 0 # Cada clave por separado
+
+    await asyncio.sleep(VENTANA / 2)
+    await backend.hit("cuenta:a@example.com")
+    await asyncio.sleep(VENTANA / 2 + 0.05)
+    # Los tres primeros salieron de la ventana; el cuarto sigue dentro
+    assert (await backend.count("cuenta:a@example.com"))[0] == 1
+
+
+async def test_reset_borra_la_clave(backend):
+    await backend.hit("cuenta:a@example.com")
+    await backend.hit("ip:10.0.0.1")
+    await backend.reset("cuenta:a@example.com")
+    assert (await backend.count("cuenta:a@example.com"))[0] == 0
+    assert (await backend.count("ip:10.0.0.1"))[0] == 1
+
+
+async def test_redis_expira_las_claves_y_comparte_fallos_entre_workers(servidor):
+    cliente = _redis(servidor)
+    worker_1 = LoginLimiter(RedisLimiterBackend(cliente, window=60), per_account=3, per_ip=100)
+    worker_2 = LoginLimiter(RedisLimiterBackend(_redis(servidor), window=60), per_account=3, per_ip=100)
+
+    for _ in range(2):
+        await worker_1.register_failure("A@example.com", "10.0.0.1")
+    assert await worker_2.register_failure("a@example.com", "10.0.0.2") == 3 # Cuenta sin distinguir mayúsculas
+    assert (await worker_1.check("a@example.com", "10.0.0.3")).permitido # Aún no cruzó el umbral
+
+    await worker_1.register_failure("a@example.com", "10.0.0.1")
+    decision = await worker_2.check("a@example.com", "10.0.0.3")
+    assert (decision.permitido, decision.motivo) == (False, "cuenta")
+    assert 1 <= decision.retry_after <= 61
+    assert 0 < await cliente.ttl("reservas:login:cuenta:a@example.com") <= 60 # Sin claves huérfanas
+
+
+async def test_limite_por_ip(backend):
+    limiter = LoginLimiter(backend, per_account=100, per_ip=3)
+    for i in range(3):
+        await limiter.register_failure(f"u{i}@example.com", "10.0.0.1")
+
+    decision = await limiter.check("otro@example.com", "10.0.0.1")
+    assert (decision.permitido, decision.motivo) == (False, "ip")
+    assert (await limiter.check("otro@example.com", "10.0.0.2")).permitido
+    assert limiter.rechazos_ip == 1
+
+
+async def test_reset_account_tras_login_correcto(backend):
+    limiter = LoginLimiter(backend, per_account=3, per_ip=100)
+    for _ in range(3):
+        await limiter.register_failure("a@example.com", "10.0.0.1")
+    await limiter.reset_account("a@example.com")
+
+    assert await limiter.register_failure("a@example.com", "10.0.0.1") == 1
+    assert (await backend.count("ip:10.0.0.1"))[0] == 4 # La IP no se reinicia con la cuenta
+
+
+# --- Por la API, con el limitador global sobre Redis ---
+async def _login(client, correo: str, contrasenia: str):
+    return await client.post("/login/", data={"username": correo, "password": contrasenia})
+
+
+@pytest.fixture
+async def usuario_con_contrasenia(crear_usuario):
+    await crear_usuario("login@example.com")
+    async with async_session_maker() as db:
+        await db.execute(update(User).where(User.correo == "login@example.com").values(contrasenia=get_password_hash("secreta")))
+        await db.commit()
+    return "login@example.com"
+
+
+async def test_api_bloquea_la_cuenta_y_un_login_correcto_reinicia(client, servidor, usuario_con_contrasenia):
+    correo = usuario_con_contrasenia
+    redis = _redis(servidor)
+    login_limiter.backend = RedisLimiterBackend(redis, window=60)
+
+    # Un login correcto a mitad de camino reinicia el contador de la cuenta
+    for _ in range(3):
+        assert (await _login(client, correo, "mala")).status_code == 400
+    assert (await _login(client, correo, "secreta")).status_code == 200
+    assert not await redis.exists(f"reservas:login:cuenta:{correo}")
+
+    for intento in range(1, MAX_LOGIN_ATTEMPTS + 1):
+        respuesta = await _login(client, correo, "mala")
+        assert respuesta.status_code == 400, respuesta.text
+        assert f"Intentos restantes antes del bloqueo: {MAX_LOGIN_ATTEMPTS - intento}" in respuesta.json()["detail"]
+    respuesta = await _login(client, correo, "mala")
+    assert respuesta.status_code == 403 # Cruza el umbral: queda bloqueada en la base
+
+    # Ya bloqueada, el limitador rechaza incluso la contraseña correcta sin llegar a bcrypt
+    assert (await _login(client, correo, "secreta")).status_code == 403
+    async with async_session_maker() as db:
+        assert (await db.get(User, correo)).bloqueado
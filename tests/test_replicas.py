@@ -0,0 +1,152 @@
+# tests/test_replicas.py
+#
+# Enrutamiento a réplicas con dos archivos SQLite: la "réplica" es una copia con los
+# mismos usuarios pero otro nombre en el elemento 1, así cada respuesta dice de qué base
+# leyó. GET va a la réplica, las escrituras a la primaria, el mismo cliente lee de la
+# primaria justo después de escribir y, sin réplicas sanas, las lecturas van a la primaria.
+
+from datetime import timedelta
+
+import httpx
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.cache import catalog_cache
+from app.database.database import get_replica_set
+from app.database.migrations import upgrade
+from app.main import create_app
+from app.models.models import Elemento, User
+from app.routers.auth import build_token_claims, create_access_token
+from app.settings import Settings
+
+pytestmark = pytest.mark.anyio
+
+USUARIOS = {"usuario@example.com": "usuario", "admin@example.com": "admin"}
+
+
+@pytest.fixture(autouse=True)
+def sin_cache_de_catalogo(monkeypatch):
+    # Cada GET /elementos/ debe llegar a la base para ver a cuál fue
+    monkeypatch.setattr(catalog_cache, "backend", None)
+
+
+async def _preparar(url: str, nombre_elemento: str) -> None:
+    engine = create_async_engine(url)
+    try:
+        await upgrade(engine)
+        async with AsyncSession(engine) as db:
+            db.add_all([
+                User(correo=correo, nombres="Prueba", apellidos=correo, contrasenia="x", rango=rango,
+                     intentos_login=0, bloqueado=False, token_version=0)
+                for correo, rango in USUARIOS.items()
+            ])
+            db.add(Elemento(Codigo=1, Nombre=nombre_elemento, Precio=10, Stock=5))
+            await db.commit()
+    finally:
+        await engine.dispose()
+
+
+async def _nombres(url: str) -> list:
+    engine = create_async_engine(url)
+    try:
+        async with AsyncSession(engine) as db:
+            return (await db.execute(select(Elemento.Nombre).order_by(Elemento.Codigo))).scalars().all()
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture
+async def urls(tmp_path):
+    primaria = f"sqlite+aiosqlite:///{tmp_path / 'primaria.db'}"
+    replica = f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"
+    await _preparar(primaria, "Balon (primaria)")
+    await _preparar(replica, "Balon (replica)")
+    return primaria, replica
+
+
+@pytest.fixture
+def settings(urls):
+    primaria, replica = urls
+    return Settings(database_url=primaria, replica_urls=[replica], replica_sticky_seconds=30, schema_mode="verify")
+
+
+_TOKENS: dict = {}
+
+
+def _cabeceras(correo: str) -> dict:
+    # Un token por usuario, como un cliente real entre dos refrescos
+    if correo not in _TOKENS:
+        user = User(correo=correo, rango=USUARIOS[correo], bloqueado=False, token_version=0)
+        _TOKENS[correo] = create_access_token(build_token_claims(user))
+    return {"Authorization": f"Bearer {_TOKENS[correo]}"}
+
+
+async def _leido(client, correo: str) -> list:
+    respuesta = await client.get("/elementos/", headers=_cabeceras(correo))
+    assert respuesta.status_code == 200, respuesta.text
+    return [e["Nombre"] for e in respuesta.json()]
+
+
+async def test_get_lee_de_la_replica_y_las_escrituras_van_a_la_primaria(client, urls):
+    primaria, replica = urls
+    assert await _leido(client, "usuario@example.com") == ["Balon (replica)"]
+    assert get_replica_set().snapshot()["replicas"][0]["lecturas"] >= 1
+
+    respuesta = await client.post(
+        "/elementos/", json={"Nombre": "Raqueta", "Precio": 20, "Stock": 3}, headers=_cabeceras("admin@example.com")
+    )
+    assert respuesta.status_code == 201, respuesta.text
+    assert await _nombres(primaria) == ["Balon (primaria)", "Raqueta"]
+    assert await _nombres(replica) == ["Balon (replica)"]
+
+
+async def test_tras_escribir_el_mismo_cliente_lee_de_la_primaria(client):
+    respuesta = await client.post(
+        "/elementos/", json={"Nombre": "Raqueta", "Precio": 20, "Stock": 3}, headers=_cabeceras("admin@example.com")
+    )
+    assert respuesta.status_code == 201, respuesta.text
+
+    # Read-your-writes: quien escribió ve su cambio aunque la réplica aún no lo tenga...
+    assert await _leido(client, "admin@example.com") == ["Balon (primaria)", "Raqueta"]
+    # ...y los demás clientes siguen leyendo de la réplica
+    assert await _leido(client, "usuario@example.com") == ["Balon (replica)"]
+
+
+async def test_la_marca_de_escritura_sobrevive_al_refresco_del_token(client):
+    respuesta = await client.post(
+        "/elementos/", json={"Nombre": "Raqueta", "Precio": 20, "Stock": 3}, headers=_cabeceras("admin@example.com")
+    )
+    assert respuesta.status_code == 201, respuesta.text
+
+    # Mismo usuario con un token recién emitido (otro exp): sigue leyendo de la primaria
+    user = User(correo="admin@example.com", rango="admin", bloqueado=False, token_version=0)
+    nuevo = create_access_token(build_token_claims(user), expires_delta=timedelta(minutes=5))
+    assert nuevo != _TOKENS["admin@example.com"]
+    respuesta = await client.get("/elementos/", headers={"Authorization": f"Bearer {nuevo}"})
+    assert [e["Nombre"] for e in respuesta.json()] == ["Balon (primaria)", "Raqueta"]
+
+
+async def test_failover_a_la_primaria_con_la_replica_fuera_de_servicio(client):
+    replica_set = get_replica_set()
+    replica_set._marcar(replica_set.replicas[0], False, "caída simulada")
+
+    assert await _leido(client, "usuario@example.com") == ["Balon (primaria)"]
+    snapshot = replica_set.snapshot()
+    assert snapshot["lecturas_en_primaria_por_failover"] >= 1
+    assert snapshot["replicas"][0]["ultimo_error"] == "caída simulada"
+
+    # La siguiente revisión de salud la encuentra sana y vuelve a recibir lecturas
+    await replica_set.revisar()
+    assert await _leido(client, "usuario@example.com") == ["Balon (replica)"]
+
+
+async def test_replica_inaccesible_al_arrancar(urls, tmp_path, nplusone):
+    primaria, _ = urls
+    inaccesible = f"sqlite+aiosqlite:///{tmp_path / 'no-existe' / 'replica.db'}"
+    app = create_app(Settings(database_url=primaria, replica_urls=[inaccesible], schema_mode="verify"))
+    async with app.router.lifespan_context(app):
+        # La revisión inicial del lifespan ya la sacó de servicio: ninguna lectura falla
+        assert not get_replica_set().replicas[0].sana
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            assert await _leido(client, "usuario@example.com") == ["Balon (primaria)"]
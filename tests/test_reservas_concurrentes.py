@@ -0,0 +1,86 @@
+# tests/test_reservas_concurrentes.py
+#
+# Reservas simultáneas sobre el mismo escenario y fecha (y sobre el mismo stock): la
+# restricción única y el UPDATE condicional del inventario deben dejar pasar exactamente
+# las que caben, sin reservas dobles ni más unidades reservadas que el stock.
+
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app.database.database import async_session_maker
+from app.models.models import Elemento, Escenario, InventarioElemento, Reserva
+
+pytestmark = pytest.mark.anyio
+
+CONCURRENTES = 20
+FECHA = date.today() + timedelta(days=30)
+
+
+async def _crear_catalogo(escenarios: int, stock: int):
+    async with async_session_maker() as db:
+        lista = [Escenario(Direccion=f"Cancha {i}", Capacidad=10, Precio=1000, Activo=True) for i in range(escenarios)]
+        elemento = Elemento(Nombre="Balon", Precio=10, Stock=stock)
+        db.add_all(lista + [elemento])
+        await db.commit()
+        return [e.ID_Escenario for e in lista], elemento.Codigo
+
+
+async def _estado(codigo: int):
+    async with async_session_maker() as db:
+        reservas = (await db.execute(select(Reserva.ID_Escenario, Reserva.Fecha))).all()
+        stock = (await db.execute(select(Elemento.Stock).where(Elemento.Codigo == codigo))).scalar_one()
+        reservado = (await db.execute(
+            select(func.coalesce(func.sum(InventarioElemento.Reservado), 0))
+            .where(InventarioElemento.Codigo_Elemento == codigo, InventarioElemento.Fecha == FECHA)
+        )).scalar_one()
+    return reservas, stock, reservado
+
+
+async def test_mismo_escenario_y_fecha_solo_una_reserva(client, crear_usuario):
+    (escenario,), codigo = await _crear_catalogo(escenarios=1, stock=100)
+    cabeceras = [await crear_usuario(f"u{i}@example.com") for i in range(CONCURRENTES)]
+    payload = {
+        "Fecha": FECHA.isoformat(),
+        "ID_Escenario": escenario,
+        "elementos_seleccionados": [{"Codigo_Elemento": codigo, "Cantidad": 2}],
+    }
+
+    respuestas = await asyncio.gather(*(client.post("/reservas/", json=payload, headers=h) for h in cabeceras))
+
+    codigos = sorted(r.status_code for r in respuestas)
+    assert codigos == [201] + [400] * (CONCURRENTES - 1), [r.text for r in respuestas if r.status_code not in (201, 400)]
+    reservas, stock, reservado = await _estado(codigo)
+    assert reservas == [(escenario, FECHA)]
+    assert stock == 100 # Stock es la cantidad total: lo comprometido va al inventario por fecha
+    assert reservado == 2
+
+
+async def test_stock_de_la_fecha_no_se_sobrepasa(client, crear_usuario):
+    escenarios, codigo = await _crear_catalogo(escenarios=CONCURRENTES, stock=3)
+    cabecera = await crear_usuario("ana@example.com")
+
+    respuestas = await asyncio.gather(*(
+        client.post("/reservas/", headers=cabecera, json={
+            "Fecha": FECHA.isoformat(),
+            "ID_Escenario": escenario,
+            "elementos_seleccionados": [{"Codigo_Elemento": codigo, "Cantidad": 1}],
+        })
+        for escenario in escenarios
+    ))
+
+    codigos = sorted(r.status_code for r in respuestas)
+    assert codigos == [201] * 3 + [400] * (CONCURRENTES - 3), [r.text for r in respuestas if r.status_code not in (201, 400)]
+    reservas, stock, reservado = await _estado(codigo)
+    assert len(reservas) == 3
+    assert stock == 3
+    assert reservado == 3
+
+    # Cancelar una libera su unidad en la fecha
+    creada = next(r.json() for r in respuestas if r.status_code == 201)
+    assert (await client.delete(f"/reservas/{creada['ID_Reserva']}", headers=cabecera)).status_code == 204
+    _, _, reservado = await _estado(codigo)
+    assert reservado == 2
@@ -0,0 +1,73 @@
+# tests/test_security.py
+#
+# Pool de bcrypt: hash y verificación corren en los hilos del pool, un hash con otro coste
+# se re-hashea al verificar, y hashing_stats refleja la cola (en espera, en curso y
+# completados) mientras el pool está lleno.
+
+import asyncio
+import threading
+
+import pytest
+
+from app import security
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_hash_y_verificacion_en_el_pool():
+    hilos = []
+    def _hash(password):
+        hilos.append(threading.current_thread().name)
+        return security.pwd_context.hash(password)
+    antes = security.hashing_stats.snapshot()["completed"]
+
+    hashed = await security._run_in_bcrypt_pool(_hash, "secreta")
+
+    assert hilos and hilos[0].startswith("bcrypt")
+    assert await security.verify_password_async("secreta", hashed)
+    assert not await security.verify_password_async("otra", hashed)
+    assert security.verify_password("secreta", await security.get_password_hash_async("secreta"))
+    snapshot = security.hashing_stats.snapshot()
+    assert snapshot["completed"] == antes + 4
+    assert (snapshot["queued"], snapshot["running"]) == (0, 0)
+    assert snapshot["rounds"] == security.BCRYPT_ROUNDS
+
+
+async def test_rehash_al_verificar_con_otro_coste(monkeypatch):
+    monkeypatch.setattr(security, "BCRYPT_REHASH_ON_LOGIN", True)
+    antiguo = security.pwd_context.hash("secreta", rounds=security.BCRYPT_ROUNDS + 1)
+
+    valido, nuevo = await security.verify_and_update_password_async("secreta", antiguo)
+    assert valido and nuevo is not None
+    assert security.pwd_context.identify(nuevo) == "bcrypt" and f"${security.BCRYPT_ROUNDS:02d}$" in nuevo
+
+    # Con el coste configurado no hace falta re-hashear
+    assert await security.verify_and_update_password_async("secreta", nuevo) == (True, None)
+    assert await security.verify_and_update_password_async("otra", antiguo) == (False, None)
+
+
+async def test_metricas_de_la_cola():
+    liberar = threading.Event()
+    def _bloquear():
+        liberar.wait(5)
+    trabajos = security.BCRYPT_MAX_WORKERS + 2
+    antes = security.hashing_stats.snapshot()
+
+    tareas = [asyncio.ensure_future(security._run_in_bcrypt_pool(_bloquear)) for _ in range(trabajos)]
+    try:
+        for _ in range(200):
+            snapshot = security.hashing_stats.snapshot()
+            if snapshot["running"] == security.BCRYPT_MAX_WORKERS:
+                break
+            await asyncio.sleep(0.01)
+        # El pool está lleno: lo que no cabe espera en la cola
+        assert (snapshot["running"], snapshot["queued"]) == (security.BCRYPT_MAX_WORKERS, 2)
+    finally:
+        liberar.set()
+        await asyncio.gather(*tareas)
+
+    despues = security.hashing_stats.snapshot()
+    assert despues["completed"] == antes["completed"] + trabajos
+    assert (despues["queued"], despues["running"]) == (0, 0)
+    assert despues["queue_wait_max_ms"] > 0
+    assert despues["hash_time_total_ms"] > antes["hash_time_total_ms"]
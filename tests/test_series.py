@@ -0,0 +1,118 @@
+# tests/test_series.py
+#
+# Series de reservas: la regla de recurrencia se expande a las fechas esperadas (diaria,
+# semanal y mensual, saltando los meses sin el día), las fechas ocupadas se informan o
+# detienen toda la serie según todo_o_nada, y un intervalo fuera de rango da 4xx y no 500.
+
+from datetime import date
+
+import pytest
+from sqlalchemy.future import select
+
+from app.database.database import async_session_maker
+from app.models.models import Elemento, Escenario, Reserva
+
+pytestmark = pytest.mark.anyio
+
+LUNES = date(2031, 1, 6)
+
+
+async def _crear_catalogo():
+    async with async_session_maker() as db:
+        escenario = Escenario(Direccion="Cancha", Capacidad=10, Precio=1000, Activo=True)
+        elemento = Elemento(Nombre="Balon", Precio=10, Stock=5)
+        db.add_all([escenario, elemento])
+        await db.commit()
+        return escenario.ID_Escenario, elemento.Codigo
+
+
+async def _fechas_reservadas(escenario: int) -> list:
+    async with async_session_maker() as db:
+        return (await db.execute(
+            select(Reserva.Fecha).where(Reserva.ID_Escenario == escenario).order_by(Reserva.Fecha)
+        )).scalars().all()
+
+
+async def _serie(client, cabecera, escenario: int, **campos):
+    return await client.post("/reservas/serie", headers=cabecera, json={"ID_Escenario": escenario, **campos})
+
+
+@pytest.mark.parametrize("recurrencia, esperadas", [
+    ({"frecuencia": "diaria", "intervalo": 2, "desde": "2031-01-06", "repeticiones": 3},
+     [date(2031, 1, 6), date(2031, 1, 8), date(2031, 1, 10)]),
+    # Lunes y miércoles durante dos semanas
+    ({"frecuencia": "semanal", "desde": "2031-01-06", "hasta": "2031-01-19", "dias_semana": [2, 0]},
+     [date(2031, 1, 6), date(2031, 1, 8), date(2031, 1, 13), date(2031, 1, 15)]),
+    # Día 31: febrero y abril no lo tienen
+    ({"frecuencia": "mensual", "desde": "2031-01-31", "repeticiones": 3},
+     [date(2031, 1, 31), date(2031, 3, 31), date(2031, 5, 31)]),
+])
+async def test_expansion_de_la_recurrencia(client, crear_usuario, recurrencia, esperadas):
+    escenario, codigo = await _crear_catalogo()
+    cabecera = await crear_usuario("ana@example.com")
+
+    respuesta = await _serie(
+        client, cabecera, escenario, recurrencia=recurrencia,
+        elementos_seleccionados=[{"Codigo_Elemento": codigo, "Cantidad": 2}],
+    )
+
+    assert respuesta.status_code == 201, respuesta.text
+    cuerpo = respuesta.json()
+    assert [date.fromisoformat(r["Fecha"]) for r in cuerpo["resultados"]] == esperadas
+    assert cuerpo["creadas"] == len(esperadas) and cuerpo["conflictos"] == 0
+    assert cuerpo["Precio_Total"] == (1000 + 2 * 10) * len(esperadas)
+    assert await _fechas_reservadas(escenario) == esperadas
+
+
+async def test_fechas_excluidas(client, crear_usuario):
+    escenario, _ = await _crear_catalogo()
+    cabecera = await crear_usuario("ana@example.com")
+
+    respuesta = await _serie(
+        client, cabecera, escenario,
+        recurrencia={"frecuencia": "diaria", "desde": "2031-01-06", "repeticiones": 3},
+        excluir=["2031-01-07"],
+    )
+
+    assert respuesta.status_code == 201, respuesta.text
+    assert await _fechas_reservadas(escenario) == [date(2031, 1, 6), date(2031, 1, 8)]
+
+
+async def test_conflictos_parciales_y_todo_o_nada(client, crear_usuario):
+    escenario, _ = await _crear_catalogo()
+    cabecera = await crear_usuario("ana@example.com")
+    ocupada = await client.post("/reservas/", headers=cabecera, json={"Fecha": "2031-01-07", "ID_Escenario": escenario})
+    assert ocupada.status_code == 201, ocupada.text
+    recurrencia = {"frecuencia": "diaria", "desde": "2031-01-06", "repeticiones": 3}
+
+    # todo_o_nada: la fecha ocupada detiene toda la serie
+    respuesta = await _serie(client, cabecera, escenario, recurrencia=recurrencia, todo_o_nada=True)
+    assert respuesta.status_code == 409, respuesta.text
+    assert [c["Fecha"] for c in respuesta.json()["detail"]["conflictos"]] == ["2031-01-07"]
+    assert await _fechas_reservadas(escenario) == [date(2031, 1, 7)]
+
+    # Por defecto se reservan las libres y se informa la ocupada
+    respuesta = await _serie(client, cabecera, escenario, recurrencia=recurrencia)
+    assert respuesta.status_code == 201, respuesta.text
+    cuerpo = respuesta.json()
+    assert (cuerpo["solicitadas"], cuerpo["creadas"], cuerpo["conflictos"]) == (3, 2, 1)
+    assert [r["ok"] for r in cuerpo["resultados"]] == [True, False, True]
+    assert cuerpo["resultados"][1]["error"]
+    assert await _fechas_reservadas(escenario) == [date(2031, 1, 6), date(2031, 1, 7), date(2031, 1, 8)]
+
+
+@pytest.mark.parametrize("recurrencia, codigo", [
+    # Fuera del límite del esquema
+    ({"frecuencia": "diaria", "intervalo": 10 ** 9, "desde": "2031-01-06", "repeticiones": 2}, 422),
+    # Dentro del límite, pero la serie pasa del año 9999
+    ({"frecuencia": "mensual", "intervalo": 366, "desde": "2031-01-06", "repeticiones": 300}, 400),
+    ({"frecuencia": "diaria", "desde": "9999-12-30", "repeticiones": 5}, 400),
+])
+async def test_intervalo_fuera_de_rango(client, crear_usuario, recurrencia, codigo):
+    escenario, _ = await _crear_catalogo()
+    cabecera = await crear_usuario("ana@example.com")
+
+    respuesta = await _serie(client, cabecera, escenario, recurrencia=recurrencia)
+
+    assert respuesta.status_code == codigo, respuesta.text
+    assert await _fechas_reservadas(escenario) == []